@@ -1,6 +1,7 @@
 package main
 
 import (
+	"flag"
 	"fmt"
 	"net/http"
 	"os"
@@ -14,12 +15,23 @@ import (
 )
 
 func main() {
+	// -agent host:port runs tests for a coordinator instead (distributed tests)
+	agent := flag.String("agent", "", "run as an agent of distributed tests, listening on host:port (AGENT_TOKEN is required unless host is a loopback address)")
+	flag.Parse()
+
 	// load environment variables
 	err := godotenv.Load()
 	if err != nil {
 		panic(err)
 	}
 
+	if *agent != "" {
+		if err := httpbenchmark.ServeAgent(*agent); err != nil {
+			panic(err)
+		}
+		return
+	}
+
 	testsFilePath := os.Getenv("TESTS_FILE_PATH")
 	port := os.Getenv("PORT")
 
@@ -28,7 +40,10 @@ func main() {
 	if err != nil {
 		fmt.Println("Could not load tests from file: ", err)
 
-	} else { // if tests are loaded successfully
+	} else if anyLiveAnalysis(tests) { // if tests are loaded successfully
+		// run benchmarks while the server is up, so /benchmarks/{id}/live can be followed
+		go httpbenchmark.RunTests(tests)
+	} else {
 		// run benchmarks, generate reports and save results.
 		httpbenchmark.RunTests(tests)
 	}
@@ -37,16 +52,28 @@ func main() {
 
 }
 
+func anyLiveAnalysis(tests []models.Test) bool {
+	for _, test := range tests {
+		if test.LiveAnalysis {
+			return true
+		}
+	}
+	return false
+}
+
 // TODO move this to a separate package
 func startServer(port string) {
 	// create router
 	router := mux.NewRouter()
 	// register handlers
-	router.HandleFunc("/benchmarks", handlers.ListBenchmarksHandler).Methods("GET")                 // return list of completed benchmarks
-	router.HandleFunc("/benchmarks/{id}", handlers.GetBenchmarkByIdHandler).Methods("GET")          // return benchmark report
-	router.HandleFunc("/compare", handlers.CompareHandler).Methods("GET")                           // a form to compare two benchmarks
-	router.HandleFunc("/compare", handlers.CompareHandler).Methods("POST")                          // redirect to comparison report
-	router.HandleFunc("/compare/{folder1}/{folder2}", handlers.GetComparisonHandler).Methods("GET") // return comparison report
+	router.HandleFunc("/benchmarks", handlers.ListBenchmarksHandler).Methods("GET")                        // return list of completed benchmarks
+	router.HandleFunc("/benchmarks/{id}", handlers.GetBenchmarkByIdHandler).Methods("GET")                 // return benchmark report
+	router.HandleFunc("/benchmarks/{id}/live", handlers.GetBenchmarkLiveHandler).Methods("GET")            // return live summary of a running benchmark
+	router.HandleFunc("/benchmarks/{id}/series/{name}", handlers.GetBenchmarkSeriesHandler).Methods("GET") // return full resolution series of a chart
+	router.HandleFunc("/trends/{name}", handlers.GetTrendHandler).Methods("GET")                           // return statistic of a metric over the runs of a test
+	router.HandleFunc("/compare", handlers.CompareHandler).Methods("GET")                                  // a form to compare two benchmarks
+	router.HandleFunc("/compare", handlers.CompareHandler).Methods("POST")                                 // redirect to comparison report
+	router.HandleFunc("/compare/{folders:.+}", handlers.GetComparisonHandler).Methods("GET")               // return comparison report of two or more benchmarks
 
 	err := http.ListenAndServe(":"+port, router)
 	if err != nil {
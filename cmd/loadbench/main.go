@@ -0,0 +1,238 @@
+package main
+
+import (
+	"encoding/json"
+	"flag"
+	"fmt"
+	"io"
+	"net"
+	"net/http"
+	"net/http/httptest"
+	"os"
+	"os/exec"
+	"runtime"
+	"strings"
+	"sync"
+	"sync/atomic"
+	"time"
+
+	"github.com/GHLabidi/api-performance-tester/internal/httpbenchmark"
+	"github.com/GHLabidi/api-performance-tester/internal/models"
+)
+
+// Measures how fast the load generator itself is: a concurrent test is run against a
+// local server answering {"QueryDuration": ...} immediately, and the requests per
+// second, allocations per request and connections opened are printed. The server runs
+// in a child process so its allocations are not counted.
+// -legacy runs the previous request path (new client per request, full JSON decode,
+// body never closed) for comparison. -json prints the results as one JSON object
+// (used by python/selfbench.py).
+// usage: go run cmd/loadbench/main.go [-concurrency 50] [-duration 5] [-legacy] [-json]
+
+const serveFlag = "-serve"
+
+func main() {
+	if len(os.Args) == 2 && os.Args[1] == serveFlag {
+		serve()
+		return
+	}
+	concurrency := flag.Int("concurrency", 50, "concurrent requests")
+	duration := flag.Int("duration", 5, "test duration in seconds")
+	legacy := flag.Bool("legacy", false, "use the previous request path")
+	url := flag.String("url", "", "target URL instead of the local server")
+	jsonOutput := flag.Bool("json", false, "print the results as JSON")
+	flag.Parse()
+
+	target := *url
+	if target == "" {
+		server, addr, err := startServer()
+		if err != nil {
+			fmt.Println("Error starting the server:", err)
+			os.Exit(1)
+		}
+		defer server.Process.Kill()
+		target = "http://" + addr + "/"
+	}
+	test := models.Test{
+		TestUniqueName:     "loadbench",
+		RequestURL:         target,
+		RequestType:        "GET",
+		TestMode:           "concurrent",
+		ConcurrentRequests: *concurrency,
+		TestDuration:       *duration,
+	}
+
+	var before, after runtime.MemStats
+	runtime.GC()
+	runtime.ReadMemStats(&before)
+	start := time.Now()
+	var requests, failed int
+	if *legacy {
+		requests, failed = legacyConcurrentTest(test)
+	} else {
+		// samples are recorded like in a real test, into a scratch folder
+		folder, err := os.MkdirTemp("", "loadbench")
+		if err != nil {
+			fmt.Println("Error creating the data folder:", err)
+			os.Exit(1)
+		}
+		defer os.RemoveAll(folder)
+		recorder, err := models.NewRecorder(test, folder+"/")
+		if err != nil {
+			fmt.Println("Error creating the recorder:", err)
+			os.Exit(1)
+		}
+		httpbenchmark.TestStartTime = start.UnixNano()
+		failed = httpbenchmark.PerformConcurrentTest(test, recorder)
+		recorder.Stop()
+		requests = recorder.Rows()
+	}
+	elapsed := time.Since(start)
+	gcStats := models.GCStatsSince(&before)
+	runtime.ReadMemStats(&after)
+
+	mode := "shared transport"
+	if *legacy {
+		mode = "legacy"
+	}
+	total := requests + failed
+	if total == 0 {
+		total = 1
+	}
+	connections := "unknown"
+	if *url == "" {
+		connections = connectionsOpened(target)
+	}
+	if *jsonOutput {
+		json.NewEncoder(os.Stdout).Encode(map[string]interface{}{
+			"mode":                mode,
+			"concurrency":         *concurrency,
+			"duration":            *duration,
+			"requests":            requests,
+			"failed":              failed,
+			"requests_per_second": float64(requests) / elapsed.Seconds(),
+			"allocs_per_request":  float64(after.Mallocs-before.Mallocs) / float64(total),
+			"bytes_per_request":   float64(after.TotalAlloc-before.TotalAlloc) / float64(total),
+			"gc_collections":      gcStats.NumGC,
+			"gc_pause_total_ms":   float64(gcStats.PauseTotalNs) / 1e6,
+			"gc_pause_max_ms":     float64(gcStats.PauseMaxNs) / 1e6,
+			"connections":         connections,
+		})
+		return
+	}
+	fmt.Printf("mode: %s, concurrency: %d\n", mode, *concurrency)
+	fmt.Printf("requests: %d (%d failed)\n", requests, failed)
+	fmt.Printf("requests per second: %.0f\n", float64(requests)/elapsed.Seconds())
+	// includes recording the samples, as in a real test
+	fmt.Printf("allocations per request: %.1f (%.0f bytes)\n", float64(after.Mallocs-before.Mallocs)/float64(total), float64(after.TotalAlloc-before.TotalAlloc)/float64(total))
+	fmt.Printf("GC: %d collections, %.2fms paused (longest %.2fms)\n", gcStats.NumGC, float64(gcStats.PauseTotalNs)/1e6, float64(gcStats.PauseMaxNs)/1e6)
+	if *url == "" {
+		fmt.Printf("connections opened: %s\n", connections)
+	}
+}
+
+// start this program as the server, it prints its address on the first line
+func startServer() (*exec.Cmd, string, error) {
+	cmd := exec.Command(os.Args[0], serveFlag)
+	stdout, err := cmd.StdoutPipe()
+	if err != nil {
+		return nil, "", err
+	}
+	cmd.Stderr = os.Stderr
+	if err := cmd.Start(); err != nil {
+		return nil, "", err
+	}
+	var addr string
+	if _, err := fmt.Fscanln(stdout, &addr); err != nil {
+		cmd.Process.Kill()
+		return nil, "", err
+	}
+	return cmd, addr, nil
+}
+
+func serve() {
+	var connections int64
+	server := httptest.NewUnstartedServer(http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		if r.URL.Path == "/connections" {
+			fmt.Fprint(w, atomic.LoadInt64(&connections))
+			return
+		}
+		w.Header().Set("Content-Type", "application/json")
+		w.Write([]byte(`{"word":"amazing","count":1,"QueryDuration":1250}`))
+	}))
+	server.Config.ConnState = func(conn net.Conn, state http.ConnState) {
+		if state == http.StateNew {
+			atomic.AddInt64(&connections, 1)
+		}
+	}
+	server.Start()
+	fmt.Println(strings.TrimPrefix(server.URL, "http://"))
+	// until killed
+	select {}
+}
+
+func connectionsOpened(target string) string {
+	resp, err := http.Get(strings.TrimSuffix(target, "/") + "/connections")
+	if err != nil {
+		return "unknown"
+	}
+	defer resp.Body.Close()
+	body, _ := io.ReadAll(resp.Body)
+	return string(body)
+}
+
+// the request path used before the shared transport and the recorder (every sample kept
+// in a growing slice), kept as the baseline
+func legacyConcurrentTest(test models.Test) (int, int) {
+	deadline := time.Now().Add(time.Duration(test.TestDuration) * time.Second)
+	var mu sync.Mutex
+	var all []models.StatData
+	failed := 0
+	wg := &sync.WaitGroup{}
+	for i := 0; i < test.ConcurrentRequests; i++ {
+		wg.Add(1)
+		go func() {
+			defer wg.Done()
+			stats := []models.StatData{}
+			failedRequests := 0
+			for time.Now().Before(deadline) {
+				client := &http.Client{}
+				req, err := http.NewRequest(test.RequestType, test.RequestURL, nil)
+				if err != nil {
+					failedRequests++
+					continue
+				}
+				req.Header.Set("Content-Type", "application/json")
+				startTime := time.Now()
+				resp, err := client.Do(req)
+				if err != nil {
+					failedRequests++
+					continue
+				}
+				elapsed := time.Since(startTime)
+				var responseData map[string]interface{}
+				if err := json.NewDecoder(resp.Body).Decode(&responseData); err != nil {
+					failedRequests++
+					continue
+				}
+				value, ok := responseData["QueryDuration"].(float64)
+				if !ok {
+					failedRequests++
+					continue
+				}
+				stats = append(stats, models.StatData{
+					StartTimestamp:  startTime.UnixNano(),
+					EndTimestamp:    time.Now().UnixNano(),
+					QueryDuration:   int64(value),
+					RequestDuration: elapsed.Nanoseconds(),
+				})
+			}
+			mu.Lock()
+			all = append(all, stats...)
+			failed += failedRequests
+			mu.Unlock()
+		}()
+	}
+	wg.Wait()
+	return len(all), failed
+}
@@ -0,0 +1,75 @@
+package analysis
+
+import (
+	"encoding/json"
+	"fmt"
+	"os"
+	"os/exec"
+	"strconv"
+)
+
+// the catalog of every run (python/catalog.py), an SQLite database in the data folder
+// queried through the analysis worker
+const catalogScript = "python/catalog.py"
+
+// RunSummary is the latest run of a test in the catalog
+type RunSummary struct {
+	RunID             string  `json:"run_id"`
+	TestName          string  `json:"test_name"`
+	DisplayName       string  `json:"display_name"`
+	StartTime         int64   `json:"start_time"`
+	TestMode          string  `json:"test_mode"`
+	TotalRequests     int     `json:"total_requests"`
+	FailedRequests    int     `json:"failed_requests"`
+	RequestsPerSecond float64 `json:"requests_per_second"`
+	// runs of the test in the catalog
+	Runs int `json:"runs"`
+}
+
+// TrendPoint is a statistic of one run
+type TrendPoint struct {
+	RunID     string  `json:"run_id"`
+	StartTime int64   `json:"start_time"`
+	Value     float64 `json:"value"`
+	Unit      string  `json:"unit"`
+}
+
+// run a job on the shared worker and decode what it returned into result, or run
+// script as a separate python process, which prints it, if the worker cannot be started
+func query(job string, script string, args []string, result interface{}) error {
+	var output []byte
+	w, err := DefaultWorker()
+	if err == nil {
+		output, err = w.Query(job, args, nil)
+	} else {
+		fmt.Println("Analysis worker unavailable, running", script, ":", err)
+		cmd := exec.Command("python", append([]string{script}, args...)...)
+		// get working directory
+		cmd.Dir = os.Getenv("PWD")
+		output, err = cmd.Output()
+	}
+	if err != nil {
+		return err
+	}
+	return json.Unmarshal(output, result)
+}
+
+// AddToCatalog adds the run saved in data/<testName>/ to the catalog, or replaces it
+func AddToCatalog(testName string) error {
+	return run("catalog", catalogScript, []string{"index", testName})
+}
+
+// LatestRuns are the latest run of every test in the catalog, by test name
+func LatestRuns() ([]RunSummary, error) {
+	runs := []RunSummary{}
+	err := query("catalog", catalogScript, []string{"list"}, &runs)
+	return runs, err
+}
+
+// Trend is statistic (avg, p50, p99, ...) of metric over the last limit runs of
+// testName, oldest first
+func Trend(testName string, metric string, statistic string, limit int) ([]TrendPoint, error) {
+	points := []TrendPoint{}
+	err := query("catalog", catalogScript, []string{"trend", testName, metric, statistic, "--limit", strconv.Itoa(limit)}, &points)
+	return points, err
+}
@@ -0,0 +1,213 @@
+package analysis
+
+import (
+	"bufio"
+	"encoding/json"
+	"errors"
+	"fmt"
+	"io"
+	"os"
+	"os/exec"
+	"sync"
+)
+
+// Worker is a long lived python/worker.py process. Jobs are sent as JSON lines on
+// its stdin and answered on its stdout, so the interpreter, pandas, numpy and plotly
+// are only loaded once. The worker runs independent jobs in parallel, one process
+// per core.
+type Worker struct {
+	cmd   *exec.Cmd
+	stdin io.WriteCloser
+
+	mu      sync.Mutex
+	nextID  int64
+	pending map[int64]chan jobResult
+	// set once the worker exited, every later job fails with it
+	err error
+
+	// seconds spent importing each module when the worker started
+	ImportSeconds map[string]float64
+}
+
+type request struct {
+	ID      int64                  `json:"id"`
+	Job     string                 `json:"job"`
+	Args    []string               `json:"args"`
+	Options map[string]interface{} `json:"options,omitempty"`
+}
+
+type response struct {
+	ID            int64              `json:"id"`
+	Error         *string            `json:"error"`
+	Seconds       float64            `json:"seconds"`
+	Result        json.RawMessage    `json:"result"`
+	Ready         bool               `json:"ready"`
+	ImportSeconds map[string]float64 `json:"import_seconds"`
+}
+
+// what a job returned, or why it failed
+type jobResult struct {
+	result json.RawMessage
+	err    error
+}
+
+const workerScript = "python/worker.py"
+
+// StartWorker starts python/worker.py and waits until it has imported everything
+func StartWorker() (*Worker, error) {
+	cmd := exec.Command("python", workerScript)
+	// get working directory
+	cmd.Dir = os.Getenv("PWD")
+	// output of the analysis itself, the protocol uses stdout only
+	cmd.Stderr = os.Stderr
+	stdin, err := cmd.StdinPipe()
+	if err != nil {
+		return nil, err
+	}
+	stdout, err := cmd.StdoutPipe()
+	if err != nil {
+		return nil, err
+	}
+	if err := cmd.Start(); err != nil {
+		return nil, err
+	}
+	w := &Worker{cmd: cmd, stdin: stdin, pending: map[int64]chan jobResult{}}
+
+	scanner := bufio.NewScanner(stdout)
+	scanner.Buffer(make([]byte, 64*1024), 16*1024*1024)
+	// first line: the worker is ready
+	var ready response
+	if !scanner.Scan() || json.Unmarshal(scanner.Bytes(), &ready) != nil || !ready.Ready {
+		stdin.Close()
+		cmd.Wait()
+		return nil, errors.New("analysis worker did not start")
+	}
+	w.ImportSeconds = ready.ImportSeconds
+	go w.readResponses(scanner)
+	return w, nil
+}
+
+func (w *Worker) readResponses(scanner *bufio.Scanner) {
+	for scanner.Scan() {
+		var resp response
+		if err := json.Unmarshal(scanner.Bytes(), &resp); err != nil {
+			continue
+		}
+		w.mu.Lock()
+		done, ok := w.pending[resp.ID]
+		delete(w.pending, resp.ID)
+		w.mu.Unlock()
+		if !ok {
+			continue
+		}
+		if resp.Error != nil {
+			done <- jobResult{err: errors.New(*resp.Error)}
+		} else {
+			done <- jobResult{result: resp.Result}
+		}
+	}
+	// the worker exited, fail everything still waiting
+	err := w.cmd.Wait()
+	if err == nil {
+		err = errors.New("analysis worker exited")
+	}
+	w.mu.Lock()
+	w.err = err
+	for id, done := range w.pending {
+		done <- jobResult{err: err}
+		delete(w.pending, id)
+	}
+	w.mu.Unlock()
+}
+
+// Run sends a job to the worker and waits for it to finish; safe for concurrent use
+func (w *Worker) Run(job string, args []string, options map[string]interface{}) error {
+	_, err := w.Query(job, args, options)
+	return err
+}
+
+// Query sends a job to the worker and returns what it returned, as JSON
+func (w *Worker) Query(job string, args []string, options map[string]interface{}) (json.RawMessage, error) {
+	done := make(chan jobResult, 1)
+	w.mu.Lock()
+	if w.err != nil {
+		w.mu.Unlock()
+		return nil, w.err
+	}
+	w.nextID++
+	id := w.nextID
+	w.pending[id] = done
+	line, err := json.Marshal(request{ID: id, Job: job, Args: args, Options: options})
+	if err == nil {
+		_, err = w.stdin.Write(append(line, '\n'))
+	}
+	if err != nil {
+		delete(w.pending, id)
+		w.mu.Unlock()
+		return nil, err
+	}
+	w.mu.Unlock()
+	result := <-done
+	return result.result, result.err
+}
+
+// Close lets the worker finish its running jobs and exit
+func (w *Worker) Close() error {
+	return w.stdin.Close()
+}
+
+func (w *Worker) alive() bool {
+	w.mu.Lock()
+	defer w.mu.Unlock()
+	return w.err == nil
+}
+
+var (
+	defaultWorker   *Worker
+	defaultWorkerMu sync.Mutex
+)
+
+// DefaultWorker returns the shared worker, (re)starting it when needed
+func DefaultWorker() (*Worker, error) {
+	defaultWorkerMu.Lock()
+	defer defaultWorkerMu.Unlock()
+	if defaultWorker != nil && defaultWorker.alive() {
+		return defaultWorker, nil
+	}
+	w, err := StartWorker()
+	if err != nil {
+		return nil, err
+	}
+	defaultWorker = w
+	return w, nil
+}
+
+// run a job on the shared worker, or as a separate python process if the worker
+// cannot be started
+func run(job string, script string, args []string) error {
+	w, err := DefaultWorker()
+	if err == nil {
+		return w.Run(job, args, nil)
+	}
+	fmt.Println("Analysis worker unavailable, running", script, ":", err)
+	cmd := exec.Command("python", append([]string{script}, args...)...)
+	// get working directory
+	cmd.Dir = os.Getenv("PWD")
+	return cmd.Run()
+}
+
+// GenerateReport writes data/<testName>/report.html
+func GenerateReport(testName string) error {
+	return run("report", "python/generate_report.py", []string{testName})
+}
+
+// Compare writes the comparison report of two or more tests
+func Compare(testNames []string) error {
+	return run("compare", "python/compare.py", testNames)
+}
+
+// FollowLive keeps data/<testName>/live.json up to date while the test is running,
+// it returns once the test's benchmark.json is saved
+func FollowLive(testName string) error {
+	return run("live", "python/live.py", []string{testName})
+}
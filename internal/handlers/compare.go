@@ -4,9 +4,6 @@ import (
 	"fmt"
 	"html/template"
 	"net/http"
-	"os"
-
-	"github.com/joho/godotenv"
 )
 
 func CompareHandler(w http.ResponseWriter, r *http.Request) {
@@ -22,21 +19,15 @@ func CompareHandler(w http.ResponseWriter, r *http.Request) {
 	}
 	// request is GET
 
-	// load environment variables
-	err := godotenv.Load()
-	if err != nil {
-		panic(err)
-	}
-
-	dataFolder := os.Getenv("DATA_FOLDER")
-	comparisonFolder := os.Getenv("COMPARISON_FOLDER")
+	dataFolder := getenv("DATA_FOLDER")
+	comparisonFolder := getenv("COMPARISON_FOLDER")
 
 	if dataFolder == "" || comparisonFolder == "" {
 		panic("DATA_FOLDER or COMPARISON_FOLDER environment variable not set")
 	}
 
-	// get list of folders in data folder
-	folders, err := os.ReadDir(dataFolder)
+	// the tests of the catalog
+	runs, err := latestRuns(dataFolder)
 	if err != nil {
 		http.Error(w, "Error reading data folder", http.StatusInternalServerError)
 		return
@@ -44,10 +35,8 @@ func CompareHandler(w http.ResponseWriter, r *http.Request) {
 
 	// generate HTML template with select options for folders
 	var options []string
-	for _, folder := range folders {
-		if folder.IsDir() {
-			options = append(options, folder.Name())
-		}
+	for _, run := range runs {
+		options = append(options, run.TestName)
 	}
 	// parse template
 	tmpl, err := template.ParseFiles("templates/compare.html")
@@ -0,0 +1,22 @@
+package handlers
+
+import (
+	"os"
+	"sync"
+
+	"github.com/joho/godotenv"
+)
+
+var loadEnvOnce sync.Once
+
+// environment variable name, .env is loaded on the first request instead of on every one
+func getenv(name string) string {
+	loadEnvOnce.Do(func() {
+		// load environment variables
+		err := godotenv.Load()
+		if err != nil {
+			panic(err)
+		}
+	})
+	return os.Getenv(name)
+}
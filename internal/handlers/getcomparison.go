@@ -3,70 +3,69 @@ package handlers
 import (
 	"net/http"
 	"os"
-	"os/exec"
+	"path/filepath"
+	"strings"
 
+	"github.com/GHLabidi/api-performance-tester/internal/analysis"
 	"github.com/gorilla/mux"
-	"github.com/joho/godotenv"
 )
 
 func GetComparisonHandler(w http.ResponseWriter, r *http.Request) {
-
-	// load environment variables
-	err := godotenv.Load()
-	if err != nil {
-		panic(err)
-	}
 	// comparison folder is where comparison reports are saved
-	comparisonFolder := os.Getenv("COMPARISON_FOLDER")
+	comparisonFolder := getenv("COMPARISON_FOLDER")
 
-	// get folder names from URL
+	// get folder names from URL, two or more separated by "/"
 	vars := mux.Vars(r)
-	folder1 := vars["folder1"]
-	folder2 := vars["folder2"]
-
-	// check if comparison file exists either for folder1 vs folder2 or folder2 vs folder1
-	comparisonFile1 := folder1 + "_vs_" + folder2 + "_comparison_report.html"
-	comparisonFile2 := folder2 + "_vs_" + folder1 + "_comparison_report.html"
-	comparisonPath1 := comparisonFolder + "/" + comparisonFile1
-	comparisonPath2 := comparisonFolder + "/" + comparisonFile2
-	// check if comparison file exists
-	if _, err := os.Stat(comparisonPath1); err == nil {
-		// read comparison file and return it
-		comparisonReport, err := os.ReadFile(comparisonPath1)
-		if err != nil {
-			http.Error(w, "Error reading comparison report", http.StatusInternalServerError)
-		}
-
-		w.Header().Set("Content-Type", "text/html")
-
-		w.Write(comparisonReport)
+	folders := strings.Split(strings.Trim(vars["folders"], "/"), "/")
+	if len(folders) < 2 {
+		http.Error(w, "At least two benchmarks are needed for a comparison", http.StatusBadRequest)
 		return
 	}
-	if _, err := os.Stat(comparisonPath2); err == nil {
-		// read comparison file and return it
-		comparisonReport, err := os.ReadFile(comparisonPath2)
-		if err != nil {
-			http.Error(w, "Error reading comparison report", http.StatusInternalServerError)
+	// only plain names of existing benchmarks, before any path is built from them
+	dataFolder := getenv("DATA_FOLDER")
+	for _, folder := range folders {
+		if folder == "" || folder == "." || folder == ".." || filepath.Base(folder) != folder {
+			http.Error(w, "Invalid benchmark name", http.StatusBadRequest)
+			return
 		}
-		w.Header().Set("Content-Type", "text/html")
-		w.Write(comparisonReport)
+		if _, err := os.Stat(dataFolder + "/" + folder + "/benchmark.json"); err != nil {
+			http.Error(w, "Benchmark not found: "+folder, http.StatusNotFound)
+			return
+		}
+	}
 
-		return
+	// check if comparison file exists either for folder1 vs folder2 or folder2 vs folder1
+	comparisonPaths := []string{comparisonFolder + "/" + strings.Join(folders, "_vs_") + "_comparison_report.html"}
+	if len(folders) == 2 {
+		comparisonPaths = append(comparisonPaths, comparisonFolder+"/"+folders[1]+"_vs_"+folders[0]+"_comparison_report.html")
+	}
+	for _, comparisonPath := range comparisonPaths {
+		if _, err := os.Stat(comparisonPath); err == nil {
+			// read comparison file and return it
+			comparisonReport, err := os.ReadFile(comparisonPath)
+			if err != nil {
+				http.Error(w, "Error reading comparison report", http.StatusInternalServerError)
+				return
+			}
+			w.Header().Set("Content-Type", "text/html")
+			w.Write(comparisonReport)
+			return
+		}
 	}
 
 	// comparison file does not exist
 	// create it by calling the compare.py script
-	cmd := exec.Command("python", "python/compare.py", folder1, folder2)
-	err = cmd.Run()
+	err := analysis.Compare(folders)
 	if err != nil {
-		http.Error(w, "Error running Python script", http.StatusInternalServerError)
+		http.Error(w, "Error creating comparison report", http.StatusInternalServerError)
 		return
 	}
 
 	// return comparison file
-	comparisonReport, err := os.ReadFile(comparisonPath1)
+	comparisonReport, err := os.ReadFile(comparisonPaths[0])
 	if err != nil {
 		http.Error(w, "Error reading comparison report", http.StatusInternalServerError)
+		return
 	}
 	w.Header().Set("Content-Type", "text/html")
 	w.Write(comparisonReport)
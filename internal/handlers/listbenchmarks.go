@@ -1,56 +1,64 @@
 package handlers
 
 import (
+	"fmt"
 	"html/template"
 	"net/http"
 	"os"
 
-	"github.com/joho/godotenv"
+	"github.com/GHLabidi/api-performance-tester/internal/analysis"
 )
 
 func ListBenchmarksHandler(w http.ResponseWriter, r *http.Request) {
-	// load environment variables
-	err := godotenv.Load()
-	if err != nil {
-		panic(err)
-	}
-
-	dataFolder := os.Getenv("DATA_FOLDER")
+	dataFolder := getenv("DATA_FOLDER")
 
 	if dataFolder == "" {
 		panic("DATA_FOLDER environment variable not set")
 	}
 
-	// get list of folders in data folder
-	folders, err := os.ReadDir(dataFolder)
+	// the latest run of every test, from the catalog
+	runs, err := latestRuns(dataFolder)
 	if err != nil {
 		http.Error(w, "Error reading data folder", http.StatusInternalServerError)
 		return
 	}
 
-	// generate HTML template with links to benchmarks
-	var benchmarkNames []string
-	for _, folder := range folders {
-		if folder.IsDir() {
-			// check that folder contains report.html
-			_, err := os.Stat(dataFolder + "/" + folder.Name() + "/report.html")
-			if err != nil {
-				continue
-			}
-			// valid benchmark folder, add to list
-			benchmarkNames = append(benchmarkNames, folder.Name())
-		}
-	}
-
 	tmpl, err := template.ParseFiles("templates/listbenchmarks.html")
 	if err != nil {
 		http.Error(w, "Error loading template", http.StatusInternalServerError)
 		return
 	}
 
-	err = tmpl.Execute(w, benchmarkNames)
+	err = tmpl.Execute(w, runs)
 	if err != nil {
 		http.Error(w, "Error executing template", http.StatusInternalServerError)
 		return
 	}
 }
+
+// the latest run of every test from the catalog, or the folders of dataFolder with a
+// report.html when the catalog cannot be queried
+func latestRuns(dataFolder string) ([]analysis.RunSummary, error) {
+	runs, err := analysis.LatestRuns()
+	if err == nil {
+		return runs, nil
+	}
+	fmt.Println("Could not query the catalog, reading the data folder:", err)
+	// get list of folders in data folder
+	folders, err := os.ReadDir(dataFolder)
+	if err != nil {
+		return nil, err
+	}
+	for _, folder := range folders {
+		if folder.IsDir() {
+			// check that folder contains report.html
+			_, err := os.Stat(dataFolder + "/" + folder.Name() + "/report.html")
+			if err != nil {
+				continue
+			}
+			// valid benchmark folder, add to list
+			runs = append(runs, analysis.RunSummary{TestName: folder.Name(), DisplayName: folder.Name(), Runs: 1})
+		}
+	}
+	return runs, nil
+}
@@ -4,19 +4,19 @@ import (
 	"fmt"
 	"net/http"
 	"os"
+	"path/filepath"
 
 	"github.com/gorilla/mux"
-	"github.com/joho/godotenv"
 )
 
-func GetBenchmarkByIdHandler(w http.ResponseWriter, r *http.Request) {
-	// load environment variables
-	err := godotenv.Load()
-	if err != nil {
-		panic(err)
-	}
+// full resolution series written by the analyzer next to the downsampled <name>.json
+const seriesFileSuffix = ".series.json"
 
-	dataFolder := os.Getenv("DATA_FOLDER")
+// live summary written by python/live.py while a test is running
+const liveFileName = "live.json"
+
+func GetBenchmarkByIdHandler(w http.ResponseWriter, r *http.Request) {
+	dataFolder := getenv("DATA_FOLDER")
 
 	if dataFolder == "" {
 		panic("DATA_FOLDER environment variable not set")
@@ -54,3 +54,46 @@ func GetBenchmarkByIdHandler(w http.ResponseWriter, r *http.Request) {
 	w.Header().Set("Content-Type", "text/html")
 	w.Write(reportData)
 }
+
+// full resolution series of a chart that was downsampled in report.html
+func GetBenchmarkSeriesHandler(w http.ResponseWriter, r *http.Request) {
+	vars := mux.Vars(r)
+	name := vars["name"]
+	// only plain names, the file must be inside the test data folder
+	if name == "" || filepath.Base(name) != name {
+		http.Error(w, "Invalid series name", http.StatusBadRequest)
+		return
+	}
+	serveTestJSON(w, vars["id"], name+seriesFileSuffix, "Series not found")
+}
+
+// summary of a running test, updated by python/live.py
+func GetBenchmarkLiveHandler(w http.ResponseWriter, r *http.Request) {
+	serveTestJSON(w, mux.Vars(r)["id"], liveFileName, "Live summary not found")
+}
+
+// write DATA_FOLDER/<id>/<fileName> as the json response
+func serveTestJSON(w http.ResponseWriter, id string, fileName string, notFound string) {
+	dataFolder := getenv("DATA_FOLDER")
+
+	if dataFolder == "" {
+		panic("DATA_FOLDER environment variable not set")
+	}
+
+	if id == "" || filepath.Base(id) != id {
+		http.Error(w, "Invalid test id", http.StatusBadRequest)
+		return
+	}
+
+	data, err := os.ReadFile(fmt.Sprintf("%s/%s/%s", dataFolder, id, fileName))
+	if os.IsNotExist(err) {
+		http.Error(w, notFound, http.StatusNotFound)
+		return
+	}
+	if err != nil {
+		http.Error(w, "Error reading "+fileName, http.StatusInternalServerError)
+		return
+	}
+	w.Header().Set("Content-Type", "application/json")
+	w.Write(data)
+}
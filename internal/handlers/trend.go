@@ -0,0 +1,106 @@
+package handlers
+
+import (
+	"html/template"
+	"net/http"
+	"strconv"
+	"time"
+
+	"github.com/GHLabidi/api-performance-tester/internal/analysis"
+	"github.com/gorilla/mux"
+)
+
+// runs shown by /trends/{name} without a limit query parameter
+const defaultTrendLimit = 200
+
+// statistics saved in the catalog for every metric (DurationStats), mean for RequestsPerSecond
+var trendStatistics = []string{"avg", "min", "p25", "p50", "p75", "p90", "p95", "p99", "max", "std", "mean"}
+
+type trendPoint struct {
+	RunID string
+	Time  string
+	Value float64
+	// the run whose data and report are in the data folder of the test, the folder
+	// holds the latest run only, older runs are known by their catalog summary
+	Latest bool
+}
+
+// statistic of a metric over the last runs of a test, from the catalog:
+// /trends/{name}?metric=RequestDuration&statistic=p99&limit=200
+func GetTrendHandler(w http.ResponseWriter, r *http.Request) {
+	name := mux.Vars(r)["name"]
+	metric := r.URL.Query().Get("metric")
+	if metric == "" {
+		metric = "RequestDuration"
+	}
+	statistic := r.URL.Query().Get("statistic")
+	if statistic == "" {
+		statistic = "p99"
+	}
+	limit := defaultTrendLimit
+	if value := r.URL.Query().Get("limit"); value != "" {
+		var err error
+		limit, err = strconv.Atoi(value)
+		if err != nil || limit <= 0 {
+			http.Error(w, "Invalid limit", http.StatusBadRequest)
+			return
+		}
+	}
+
+	points, err := analysis.Trend(name, metric, statistic, limit)
+	if err != nil {
+		http.Error(w, "Error querying the catalog", http.StatusInternalServerError)
+		return
+	}
+	if len(points) == 0 {
+		http.Error(w, "No runs of this test with this metric", http.StatusNotFound)
+		return
+	}
+
+	latest := ""
+	runs, err := analysis.LatestRuns()
+	if err != nil {
+		http.Error(w, "Error querying the catalog", http.StatusInternalServerError)
+		return
+	}
+	for _, run := range runs {
+		if run.TestName == name {
+			latest = run.RunID
+		}
+	}
+
+	// durations are saved in nanoseconds, shown in milliseconds like the reports
+	unit := points[0].Unit
+	scale := 1.0
+	if unit == "ns" {
+		unit, scale = "ms", 1e6
+	}
+	data := struct {
+		Name       string
+		Metric     string
+		Statistic  string
+		Statistics []string
+		Unit       string
+		Points     []trendPoint
+	}{name, metric, statistic, trendStatistics, unit, nil}
+	for _, point := range points {
+		data.Points = append(data.Points, trendPoint{
+			RunID:  point.RunID,
+			Time:   time.Unix(0, point.StartTime).Format("2006-01-02 15:04:05"),
+			Value:  point.Value / scale,
+			Latest: point.RunID == latest,
+		})
+	}
+
+	tmpl, err := template.ParseFiles("templates/trend.html")
+	if err != nil {
+		http.Error(w, "Error loading template", http.StatusInternalServerError)
+		return
+	}
+
+	err = tmpl.Execute(w, data)
+	if err != nil {
+		http.Error(w, "Error executing template", http.StatusInternalServerError)
+		return
+	}
+}
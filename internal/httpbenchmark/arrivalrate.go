@@ -0,0 +1,155 @@
+package httpbenchmark
+
+import (
+	"fmt"
+	"math"
+	"sync"
+	"time"
+
+	"github.com/GHLabidi/api-performance-tester/internal/models"
+)
+
+// default bound on the requests in flight of an arrival-rate test
+const defaultMaxInFlight = 1000
+
+// a period of an arrival-rate test during which the rate goes linearly from startRPS
+// to endRPS
+type rateSegment struct {
+	start    float64
+	duration float64
+	startRPS float64
+	endRPS   float64
+}
+
+// the rate of test over time: StartRPS to TargetRPS during RampDuration, then
+// TargetRPS until the end; or one segment per stage of staged tests
+func rateSegments(test models.Test) []rateSegment {
+	if len(test.Stages) == 0 {
+		return []rateSegment{
+			{start: 0, duration: test.RampDuration, startRPS: test.StartRPS, endRPS: test.TargetRPS},
+			{start: test.RampDuration, duration: math.Inf(1), startRPS: test.TargetRPS, endRPS: test.TargetRPS},
+		}
+	}
+	segments := []rateSegment{}
+	start, previous := 0.0, 0.0
+	for _, stage := range test.Stages {
+		segment := rateSegment{start: start, duration: stage.Duration, startRPS: stage.TargetRPS, endRPS: stage.TargetRPS}
+		if stage.Ramp {
+			segment.startRPS = previous
+		}
+		segments = append(segments, segment)
+		start += stage.Duration
+		previous = stage.TargetRPS
+	}
+	return segments
+}
+
+// seconds after the start of the test at which request i (0 based) is meant to be
+// sent, +Inf after the last segment. Solves "requests started by t = i" exactly, so
+// the schedule does not drift however long the test is.
+func intendedOffset(segments []rateSegment, i int64) float64 {
+	n := float64(i)
+	for _, segment := range segments {
+		// requests started during the segment: startRPS*t + (endRPS-startRPS)*t^2/(2*duration)
+		requests := (segment.startRPS + segment.endRPS) * segment.duration / 2
+		if segment.startRPS == segment.endRPS {
+			// also for the last, endless segment
+			requests = segment.startRPS * segment.duration
+		}
+		if n < requests {
+			a := (segment.endRPS - segment.startRPS) / (2 * segment.duration)
+			b := segment.startRPS
+			if n == 0 {
+				return segment.start
+			}
+			// root of a*t^2 + b*t = n, written so it also holds for a = 0 and a < 0
+			return segment.start + 2*n/(b+math.Sqrt(b*b+4*a*n))
+		}
+		n -= requests
+	}
+	return math.Inf(1)
+}
+
+// PerformArrivalRateTest is an open-loop test: requests are started on a fixed
+// schedule (TargetRPS, optionally ramped from StartRPS, or the rates of the stages) from one timer, whether or
+// not earlier requests have returned, so a stalled server does not slow the load
+// down (no coordinated omission). Every sample records the intended start time
+// besides the actual one; when all ConcurrentRequests workers are busy, requests
+// wait and that wait is part of their response time.
+func PerformArrivalRateTest(test models.Test, recorder *models.Recorder) int {
+	if test.TargetRPS <= 0 {
+		fmt.Println("TargetRPS is not specified. Defaulting to 100.")
+		test.TargetRPS = 100
+	}
+	if test.ConcurrentRequests <= 0 {
+		test.ConcurrentRequests = defaultMaxInFlight
+	}
+	if test.SleepBetweenRequests > 0 {
+		fmt.Println("SleepBetweenRequests is ignored: the schedule sets when requests are sent.")
+	}
+	maxInFlight := test.ConcurrentRequests
+	// one connection pool shared by all workers
+	client, err := newLoadClient(test)
+	if err != nil {
+		fmt.Println("Error creating request.")
+		fmt.Println(err)
+		return 0
+	}
+
+	// intended start times, buffered so the scheduler is never held up by busy workers
+	schedule := make(chan int64, 1<<16)
+	ch := make(chan int, maxInFlight)
+	wg := &sync.WaitGroup{}
+	for i := 0; i < maxInFlight; i++ {
+		wg.Add(1)
+		go func() {
+			defer wg.Done()
+			failedRequests := 0
+			worker := client.worker()
+			shard := recorder.Shard()
+			defer shard.Close()
+			for intended := range schedule {
+				stat, err := worker.do()
+				if err != nil {
+					failedRequests++
+				}
+				stat.IntendedStartTimestamp = intended
+				shard.Add(stat)
+			}
+			ch <- failedRequests
+		}()
+	}
+
+	// scheduler: release every request whose intended time has come, then sleep
+	// until the next one
+	duration := float64(test.TestDuration)
+	segments := rateSegments(test)
+	lateRequests := 0
+	for i := int64(0); ; i++ {
+		offset := intendedOffset(segments, i)
+		if offset >= duration {
+			break
+		}
+		intended := TestStartTime + int64(offset*float64(time.Second))
+		if wait := intended - time.Now().UnixNano(); wait > 0 {
+			time.Sleep(time.Duration(wait))
+		} else if wait < -int64(time.Millisecond) {
+			lateRequests++
+		}
+		schedule <- intended
+	}
+	close(schedule)
+	if lateRequests > 0 {
+		fmt.Println("Requests released more than 1ms late by the scheduler:", lateRequests)
+	}
+
+	// wait for all workers to finish
+	wg.Wait()
+	close(ch)
+
+	var failedRequests int = 0
+	for failed := range ch {
+		failedRequests += failed
+	}
+	return failedRequests
+}
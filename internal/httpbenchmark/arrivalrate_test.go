@@ -0,0 +1,155 @@
+package httpbenchmark
+
+import (
+	"encoding/binary"
+	"math"
+	"net/http"
+	"net/http/httptest"
+	"os"
+	"sort"
+	"strings"
+	"sync/atomic"
+	"testing"
+	"time"
+
+	"github.com/GHLabidi/api-performance-tester/internal/models"
+)
+
+// checks that requests 0 to last-1 are sent when started(offset), the requests
+// started by then, reaches their index, and that request last is sent at end
+func checkOffsets(t *testing.T, segments []rateSegment, started func(offset float64) float64, last int64, end float64) {
+	t.Helper()
+	for i := int64(0); i < last; i++ {
+		offset := intendedOffset(segments, i)
+		if math.Abs(started(offset)-float64(i)) > 1e-6 {
+			t.Fatalf("request %d at %gs, %g requests started by then", i, offset, started(offset))
+		}
+		if i > 0 && offset <= intendedOffset(segments, i-1) {
+			t.Fatalf("request %d at %gs, not after the one before", i, offset)
+		}
+	}
+	if offset := intendedOffset(segments, last); offset != end {
+		t.Errorf("request %d at %gs, want %gs", last, offset, end)
+	}
+}
+
+func TestIntendedOffsetConstantRate(t *testing.T) {
+	segments := rateSegments(models.Test{TargetRPS: 40})
+	checkOffsets(t, segments, func(offset float64) float64 { return 40 * offset }, 100000, 2500)
+}
+
+func TestIntendedOffsetRamp(t *testing.T) {
+	// 2 to 10 requests per second in 4 seconds: 2t + t^2 requests started by t, 24 in all
+	segments := rateSegments(models.Test{StartRPS: 2, TargetRPS: 10, RampDuration: 4})
+	checkOffsets(t, segments, func(offset float64) float64 {
+		if offset <= 4 {
+			return 2*offset + offset*offset
+		}
+		return 24 + 10*(offset-4)
+	}, 124, 14)
+}
+
+func TestIntendedOffsetStages(t *testing.T) {
+	// 20 requests per second for 10 seconds, then down to 0 in 10 seconds: 20t - t^2
+	// requests started during the second stage, 100 in all
+	test := models.Test{Stages: []models.Stage{{Duration: 10, TargetRPS: 20}, {Duration: 10, Ramp: true}}}
+	checkOffsets(t, rateSegments(test), func(offset float64) float64 {
+		if offset <= 10 {
+			return 20 * offset
+		}
+		return 200 + 20*(offset-10) - (offset-10)*(offset-10)
+	}, 299, 19)
+	if offset := intendedOffset(rateSegments(test), 300); !math.IsInf(offset, 1) {
+		t.Errorf("request after the stages at %gs", offset)
+	}
+}
+
+// columns of a data.bin by name
+func readRawData(t *testing.T, path string) map[string][]int64 {
+	data, err := os.ReadFile(path)
+	if err != nil {
+		t.Fatal(err)
+	}
+	count := int(binary.LittleEndian.Uint32(data[8:]))
+	names := make([]string, count)
+	columns := map[string][]int64{}
+	for i := range names {
+		names[i] = strings.TrimRight(string(data[16+32*i:16+32*(i+1)]), "\x00")
+	}
+	for offset := 16 + 32*count; offset < len(data); {
+		rows := int(binary.LittleEndian.Uint64(data[offset:]))
+		offset += 8
+		for _, name := range names {
+			for i := 0; i < rows; i++ {
+				columns[name] = append(columns[name], int64(binary.LittleEndian.Uint64(data[offset:])))
+				offset += 8
+			}
+		}
+	}
+	return columns
+}
+
+func TestArrivalRateSchedule(t *testing.T) {
+	// a server taking 100ms per request, 40 requests per second and at most 3 in flight:
+	// the requests queue, the last ones wait for about 300ms before being sent
+	var inFlight, maxInFlight int64
+	server := httptest.NewServer(http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		current := atomic.AddInt64(&inFlight, 1)
+		defer atomic.AddInt64(&inFlight, -1)
+		for {
+			highest := atomic.LoadInt64(&maxInFlight)
+			if current <= highest || atomic.CompareAndSwapInt64(&maxInFlight, highest, current) {
+				break
+			}
+		}
+		time.Sleep(100 * time.Millisecond)
+		w.Write([]byte(`{"QueryDuration":1}`))
+	}))
+	defer server.Close()
+	test := models.Test{TestMode: "arrival-rate", RequestURL: server.URL, RequestType: "GET", TestDuration: 1, TargetRPS: 40, ConcurrentRequests: 3}
+	folder := t.TempDir() + "/"
+	recorder, err := models.NewRecorder(test, folder)
+	if err != nil {
+		t.Fatal(err)
+	}
+	TestStartTime = time.Now().UnixNano()
+	failed := PerformArrivalRateTest(test, recorder)
+	if err := recorder.Stop(); err != nil {
+		t.Fatal(err)
+	}
+	if failed != 0 || maxInFlight != 3 {
+		t.Fatalf("%d failed requests, %d in flight at most, want 0 and 3", failed, maxInFlight)
+	}
+
+	columns := readRawData(t, folder+models.RawDataFileName)
+	intended := append([]int64{}, columns["IntendedStartTime"]...)
+	sort.Slice(intended, func(i, j int) bool { return intended[i] < intended[j] })
+	if len(intended) != 40 {
+		t.Fatalf("%d requests, want 40", len(intended))
+	}
+	// the schedule, whenever the requests could be sent
+	for i, start := range intended {
+		if want := TestStartTime + int64(i)*int64(time.Second)/40; start != want {
+			t.Fatalf("request %d intended at %d, want %d", i, start, want)
+		}
+	}
+	// the response time of a request is measured from its intended start: the last
+	// ones waited for the workers and took far more than the 100ms of their request
+	waited := 0
+	for i := range columns["StartTime"] {
+		wait := columns["StartTime"][i] - columns["IntendedStartTime"][i]
+		if wait < 0 {
+			t.Fatalf("request %d sent %dns before its intended start", i, -wait)
+		}
+		stat := models.StatData{IntendedStartTimestamp: columns["IntendedStartTime"][i], EndTimestamp: columns["EndTime"][i]}
+		if stat.ResponseTime() != wait+columns["RequestDuration"][i] {
+			t.Fatalf("request %d: response time %d, waited %d for a request of %d", i, stat.ResponseTime(), wait, columns["RequestDuration"][i])
+		}
+		if wait > int64(200*time.Millisecond) {
+			waited++
+		}
+	}
+	if waited == 0 {
+		t.Error("no request waited for a worker")
+	}
+}
@@ -0,0 +1,361 @@
+package httpbenchmark
+
+import (
+	"bytes"
+	"encoding/json"
+	"errors"
+	"fmt"
+	"net"
+	"net/http"
+	"strconv"
+	"strings"
+	"time"
+
+	"github.com/GHLabidi/api-performance-tester/internal/models"
+)
+
+// idle keep-alive connections kept per host when MaxIdleConnsPerHost is not set and
+// the test mode has no ConcurrentRequests
+const defaultMaxIdleConnsPerHost = 100
+
+// loadClient holds the transport of one test, shared by every worker of the test so
+// connections are kept alive and reused instead of opening a new one per request.
+type loadClient struct {
+	client  *http.Client
+	request *http.Request
+	metrics []responseMetric
+	// some metric has a nested JSON path, the bodies are decoded
+	decode bool
+	// values of the extra metrics, in column order
+	extraMetrics int
+}
+
+// responseMetric reads one of the test's metrics from the responses
+type responseMetric struct {
+	name   string
+	header string
+	// `"key"` of single key JSON paths, searched for in the bodies without decoding them
+	key []byte
+	// segments of nested JSON paths
+	path []string
+	// applied before truncating to an integer: nanoseconds per unit, 1 for other units
+	scale int64
+	// index in StatData.Metrics, -1 for QueryDuration
+	column int
+}
+
+// loadWorker sends requests one after the other. Its request is built once and reused:
+// the transport tracks requests in flight by pointer, so each worker needs its own.
+type loadWorker struct {
+	*loadClient
+	request *http.Request
+	// response bodies are read into this buffer, reused from one request to the next
+	body bytes.Buffer
+	// StatData.Metrics of every sample, recorded before the next request
+	values []int64
+}
+
+func newTransport(test models.Test) *http.Transport {
+	maxIdleConnsPerHost := test.MaxIdleConnsPerHost
+	if maxIdleConnsPerHost <= 0 {
+		// one idle connection per worker, so no worker ever has to dial
+		maxIdleConnsPerHost = test.ConcurrentRequests
+		if maxIdleConnsPerHost <= 0 {
+			maxIdleConnsPerHost = defaultMaxIdleConnsPerHost
+		}
+	}
+	maxIdleConns := test.MaxIdleConns
+	if maxIdleConns <= 0 {
+		maxIdleConns = maxIdleConnsPerHost
+	}
+	dialer := &net.Dialer{
+		Timeout:   30 * time.Second,
+		KeepAlive: 30 * time.Second,
+	}
+	return &http.Transport{
+		Proxy:                 http.ProxyFromEnvironment,
+		DialContext:           dialer.DialContext,
+		MaxIdleConns:          maxIdleConns,
+		MaxIdleConnsPerHost:   maxIdleConnsPerHost,
+		IdleConnTimeout:       90 * time.Second,
+		TLSHandshakeTimeout:   10 * time.Second,
+		ExpectContinueTimeout: 1 * time.Second,
+		// HTTP/2 multiplexes the requests over a few connections, only when the server supports it
+		ForceAttemptHTTP2: test.HTTP2,
+	}
+}
+
+func newLoadClient(test models.Test) (*loadClient, error) {
+	if err := test.ValidateMetrics(); err != nil {
+		return nil, err
+	}
+	req, err := http.NewRequest(test.RequestType, test.RequestURL, nil)
+	if err != nil {
+		return nil, err
+	}
+	req.Header.Set("Content-Type", "application/json")
+	c := &loadClient{
+		client:  &http.Client{Transport: newTransport(test)},
+		request: req,
+	}
+	for _, metric := range test.ResponseMetrics() {
+		m := responseMetric{name: metric.Name, header: metric.Header, scale: metric.Scale(), column: -1}
+		if m.scale == 0 {
+			m.scale = 1
+		}
+		if metric.Name != models.QueryDurationColumn {
+			m.column = c.extraMetrics
+			c.extraMetrics++
+		}
+		if metric.Header == "" {
+			path := strings.Split(strings.TrimPrefix(metric.JSONPath, "$."), ".")
+			if len(path) == 1 {
+				m.key = []byte(`"` + path[0] + `"`)
+			} else {
+				m.path = path
+				c.decode = true
+			}
+		}
+		c.metrics = append(c.metrics, m)
+	}
+	return c, nil
+}
+
+func (c *loadClient) worker() *loadWorker {
+	return &loadWorker{
+		loadClient: c,
+		request:    c.request.Clone(c.request.Context()),
+		values:     make([]int64, c.extraMetrics),
+	}
+}
+
+// do sends the worker's request once. The response body is always read to the end and
+// closed so the connection goes back to the pool. Failed requests are returned as well,
+// with their ErrorClass, so they can be recorded with their time. The returned Metrics
+// are only valid until the next call.
+func (w *loadWorker) do() (models.StatData, error) {
+	for i := range w.values {
+		w.values[i] = 0
+	}
+	startTime := time.Now()
+	stat := models.StatData{
+		StartTimestamp:         startTime.UnixNano(),
+		IntendedStartTimestamp: startTime.UnixNano(),
+		Metrics:                w.values,
+	}
+	resp, err := w.client.Do(w.request)
+	if err != nil {
+		fmt.Println("Error sending request.")
+		fmt.Println(err)
+		stat.ErrorClass = errorClass(err)
+		w.finish(&stat, startTime)
+		return stat, err
+	}
+	// Do returns once the response headers are read
+	stat.TimeToFirstByte = time.Since(startTime).Nanoseconds()
+	stat.StatusCode = int64(resp.StatusCode)
+	w.body.Reset()
+	_, err = w.body.ReadFrom(resp.Body)
+	resp.Body.Close()
+	w.finish(&stat, startTime)
+	stat.ResponseBytes = int64(w.body.Len())
+	if err != nil {
+		fmt.Println("Error reading response.")
+		fmt.Println(err)
+		stat.ErrorClass = models.ReadError
+		return stat, err
+	}
+	if resp.StatusCode >= 400 {
+		err = fmt.Errorf("response status %s", resp.Status)
+		fmt.Println("Error response status.")
+		fmt.Println(err)
+		stat.ErrorClass = models.ClientError
+		if resp.StatusCode >= 500 {
+			stat.ErrorClass = models.ServerError
+		}
+		return stat, err
+	}
+	if err := w.readMetrics(resp.Header, &stat); err != nil {
+		fmt.Println("Error extracting metric.")
+		fmt.Println(err)
+		stat.ErrorClass = models.MetricError
+		return stat, err
+	}
+	return stat, nil
+}
+
+func (w *loadWorker) finish(stat *models.StatData, startTime time.Time) {
+	stat.RequestDuration = time.Since(startTime).Nanoseconds()
+	stat.EndTimestamp = startTime.UnixNano() + stat.RequestDuration
+}
+
+// class of a request that got no response
+func errorClass(err error) int64 {
+	var netErr net.Error
+	if errors.As(err, &netErr) && netErr.Timeout() {
+		return models.TimeoutError
+	}
+	return models.ConnectionError
+}
+
+// read the metrics of the test from the response in the worker's body buffer
+func (w *loadWorker) readMetrics(header http.Header, stat *models.StatData) error {
+	body := w.body.Bytes()
+	var decoded interface{}
+	if w.decode {
+		decoder := json.NewDecoder(bytes.NewReader(body))
+		decoder.UseNumber()
+		if err := decoder.Decode(&decoded); err != nil {
+			return err
+		}
+	}
+	for _, metric := range w.loadClient.metrics {
+		var value int64
+		var err error
+		switch {
+		case metric.header != "":
+			value, err = parseNumber([]byte(strings.TrimSpace(header.Get(metric.header))), metric.scale)
+		case metric.key != nil:
+			value, err = extractNumber(body, metric.key, metric.scale)
+		default:
+			value, err = lookupNumber(decoded, metric.path, metric.scale)
+		}
+		if err != nil {
+			return fmt.Errorf("%s: %v", metric.name, err)
+		}
+		if metric.column < 0 {
+			stat.QueryDuration = value
+		} else {
+			stat.Metrics[metric.column] = value
+		}
+	}
+	return nil
+}
+
+// the number at path in a body decoded with UseNumber, array elements by index
+func lookupNumber(value interface{}, path []string, scale int64) (int64, error) {
+	for _, segment := range path {
+		switch v := value.(type) {
+		case map[string]interface{}:
+			value = v[segment]
+		case []interface{}:
+			i, err := strconv.Atoi(segment)
+			if err != nil || i < 0 || i >= len(v) {
+				return 0, fmt.Errorf("no element %s", segment)
+			}
+			value = v[i]
+		default:
+			return 0, fmt.Errorf("no field %s", segment)
+		}
+	}
+	number, ok := value.(json.Number)
+	if !ok {
+		return 0, fmt.Errorf("not a number")
+	}
+	return parseNumber([]byte(number), scale)
+}
+
+// extractNumber reads the number of key (a quoted JSON key) in the top-level object
+// of a JSON body without decoding it, multiplied by scale. Strings are skipped and
+// nested objects and arrays are only counted, the same key inside them is not read.
+func extractNumber(body []byte, key []byte, scale int64) (int64, error) {
+	depth := 0
+	for i := 0; i < len(body); i++ {
+		switch body[i] {
+		case '{', '[':
+			depth++
+		case '}', ']':
+			depth--
+		case '"':
+			end := stringEnd(body, i)
+			if end < 0 {
+				return 0, fmt.Errorf("Error extracting field %s", key)
+			}
+			// a key is followed by a colon, anything else is the same text as a value
+			if depth == 1 && bytes.Equal(body[i:end], key) {
+				if pos := skipSpaces(body, end); pos < len(body) && body[pos] == ':' {
+					return numberAt(body, skipSpaces(body, pos+1), key, scale)
+				}
+			}
+			i = end - 1
+		}
+	}
+	return 0, fmt.Errorf("Error extracting field %s", key)
+}
+
+// position after the closing quote of the string starting at body[start], -1 when
+// the body ends first
+func stringEnd(body []byte, start int) int {
+	for i := start + 1; i < len(body); i++ {
+		switch body[i] {
+		case '\\':
+			i++
+		case '"':
+			return i + 1
+		}
+	}
+	return -1
+}
+
+// the number starting at body[start], multiplied by scale
+func numberAt(body []byte, start int, key []byte, scale int64) (int64, error) {
+	end := start
+	for end < len(body) {
+		b := body[end]
+		if b >= '0' && b <= '9' || b == '-' || b == '.' || b == 'e' || b == 'E' || b == '+' {
+			end++
+		} else {
+			break
+		}
+	}
+	if end == start {
+		return 0, fmt.Errorf("Error converting value of field %s", key)
+	}
+	return parseNumber(body[start:end], scale)
+}
+
+// parseNumber converts a JSON number multiplied by scale to an integer. Integers are
+// parsed directly, other numbers the way encoding/json would (float64, then truncated).
+func parseNumber(number []byte, scale int64) (int64, error) {
+	if len(number) == 0 {
+		return 0, fmt.Errorf("no value")
+	}
+	if value, err := parseInt(number); err == nil {
+		return value * scale, nil
+	}
+	value, err := strconv.ParseFloat(string(number), 64)
+	if err != nil {
+		return 0, fmt.Errorf("Error converting value %s", number)
+	}
+	return int64(value * float64(scale)), nil
+}
+
+func skipSpaces(body []byte, i int) int {
+	for i < len(body) && (body[i] == ' ' || body[i] == '\t' || body[i] == '\n' || body[i] == '\r') {
+		i++
+	}
+	return i
+}
+
+// strconv.ParseInt without converting the bytes to a string
+func parseInt(number []byte) (int64, error) {
+	negative := number[0] == '-'
+	if negative {
+		number = number[1:]
+	}
+	// 18 digits always fit in an int64, longer numbers go through ParseFloat
+	if len(number) == 0 || len(number) > 18 {
+		return 0, strconv.ErrRange
+	}
+	var value int64
+	for _, b := range number {
+		if b < '0' || b > '9' {
+			return 0, strconv.ErrSyntax
+		}
+		value = value*10 + int64(b-'0')
+	}
+	if negative {
+		value = -value
+	}
+	return value, nil
+}
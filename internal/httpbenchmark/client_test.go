@@ -0,0 +1,303 @@
+package httpbenchmark
+
+import (
+	"encoding/json"
+	"net/http"
+	"net/http/httptest"
+	"strings"
+	"sync"
+	"sync/atomic"
+	"testing"
+	"time"
+
+	"github.com/GHLabidi/api-performance-tester/internal/models"
+)
+
+const benchmarkBody = `{"word":"amazing","count":1,"QueryDuration":1250}`
+
+func TestExtractNumber(t *testing.T) {
+	cases := []struct {
+		body  string
+		scale int64
+		want  int64
+	}{
+		{`{"QueryDuration":1250}`, 1, 1250},
+		{`{"QueryDuration" :	 -7, "other": 1}`, 1, -7},
+		{"{\n  \"QueryDuration\":\n  12.9\n}", 1, 12},
+		{`{"QueryDuration":1.5e3}`, 1, 1500},
+		{`{"QueryDuration":2}`, 1000000, 2000000},
+		{`{"QueryDuration":0.25}`, 1000, 250},
+		// the key inside a value comes first, then the real one
+		{`{"name":"QueryDuration","QueryDuration":5}`, 1, 5},
+		{`{"note":"say \"QueryDuration\": 9 \\","QueryDuration":6}`, 1, 6},
+		{`{"sql":"select \"QueryDuration\" from t","QueryDuration":3}`, 1, 3},
+		// only keys of the top-level object count
+		{`{"debug":{"QueryDuration":1},"QueryDuration":250}`, 1, 250},
+		{`{"items":[{"QueryDuration":1},["QueryDuration",2]],"QueryDuration":251}`, 1, 251},
+		{`{"a":"}","b":{"c":"{"},"QueryDuration":252}`, 1, 252},
+		// more than 18 digits go through ParseFloat
+		{`{"QueryDuration":1234567890123456789}`, 1, 1234567890123456768},
+	}
+	for _, c := range cases {
+		got, err := extractNumber([]byte(c.body), []byte(`"QueryDuration"`), c.scale)
+		if err != nil || got != c.want {
+			t.Errorf("%s: got %d, %v, want %d", c.body, got, err, c.want)
+		}
+	}
+}
+
+func TestExtractNumberMalformed(t *testing.T) {
+	for _, body := range []string{
+		``,
+		`{"count":1}`,
+		`{"name":"QueryDuration"}`,
+		`{"QueryDuration":"12"}`,
+		`{"QueryDuration":null}`,
+		`{"QueryDuration":`,
+		`{"QueryDuration":-}`,
+		`{"QueryDuration":1.2.3}`,
+		`{"QueryDuration":1e}`,
+		`{"timings":{"QueryDuration":42}}`,
+		`[{"QueryDuration":42}]`,
+		`{"note":"QueryDuration\":1`,
+	} {
+		if got, err := extractNumber([]byte(body), []byte(`"QueryDuration"`), 1); err == nil {
+			t.Errorf("%s: got %d, want an error", body, got)
+		}
+	}
+}
+
+func TestParseNumber(t *testing.T) {
+	cases := []struct {
+		number string
+		scale  int64
+		want   int64
+	}{
+		{"0", 1, 0},
+		{"-0", 1, 0},
+		{"123456789012345678", 1, 123456789012345678},
+		{"-42", 1000, -42000},
+		{"1.999", 1, 1},
+		{"-1.5", 1000, -1500},
+		{"5E2", 1, 500},
+		{"1e-3", 1000000000, 1000000},
+	}
+	for _, c := range cases {
+		if got, err := parseNumber([]byte(c.number), c.scale); err != nil || got != c.want {
+			t.Errorf("%s: got %d, %v, want %d", c.number, got, err, c.want)
+		}
+	}
+	for _, number := range []string{"", "-", "abc", "12a", "--1", "1..2"} {
+		if got, err := parseNumber([]byte(number), 1); err == nil {
+			t.Errorf("%q: got %d, want an error", number, got)
+		}
+	}
+}
+
+func TestLookupNumber(t *testing.T) {
+	var body interface{}
+	decoder := json.NewDecoder(strings.NewReader(`{"timings":{"db":12,"items":[{"ms":1.5},{"ms":3}]},"a.b":7,"text":"x"}`))
+	decoder.UseNumber()
+	if err := decoder.Decode(&body); err != nil {
+		t.Fatal(err)
+	}
+	for _, c := range []struct {
+		path  []string
+		scale int64
+		want  int64
+	}{
+		{[]string{"timings", "db"}, 1, 12},
+		{[]string{"timings", "items", "1", "ms"}, 1, 3},
+		{[]string{"timings", "items", "0", "ms"}, 1000000, 1500000},
+	} {
+		if got, err := lookupNumber(body, c.path, c.scale); err != nil || got != c.want {
+			t.Errorf("%v: got %d, %v, want %d", c.path, got, err, c.want)
+		}
+	}
+	for _, path := range [][]string{
+		{"timings", "missing"},
+		{"timings", "items", "2", "ms"},
+		{"timings", "items", "-1", "ms"},
+		{"timings", "items", "first"},
+		{"timings", "db", "deeper"},
+		{"timings"},
+		{"text"},
+		{"a", "b"},
+	} {
+		if got, err := lookupNumber(body, path, 1); err == nil {
+			t.Errorf("%v: got %d, want an error", path, got)
+		}
+	}
+}
+
+func TestWorkerReadsMetrics(t *testing.T) {
+	server := httptest.NewServer(http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		w.Header().Set("X-Rows", "31")
+		w.Write([]byte(`{"QueryDuration":1250,"timings":{"db":{"ms":2.5}},"note":"\"db\": 9"}`))
+	}))
+	defer server.Close()
+	test := models.Test{
+		RequestURL:  server.URL,
+		RequestType: "GET",
+		Metrics: []models.Metric{
+			{Name: "QueryDuration", JSONPath: "QueryDuration"},
+			{Name: "Database", JSONPath: "$.timings.db.ms", Unit: "ms"},
+			{Name: "Rows", Header: "X-Rows"},
+		},
+	}
+	client, err := newLoadClient(test)
+	if err != nil {
+		t.Fatal(err)
+	}
+	stat, err := client.worker().do()
+	if err != nil {
+		t.Fatal(err)
+	}
+	if stat.QueryDuration != 1250 || stat.ErrorClass != 0 || stat.StatusCode != 200 {
+		t.Errorf("got %+v", stat)
+	}
+	if len(stat.Metrics) != 2 || stat.Metrics[0] != 2500000 || stat.Metrics[1] != 31 {
+		t.Errorf("extra metrics %v, want [2500000 31]", stat.Metrics)
+	}
+}
+
+func TestWorkerMalformedBody(t *testing.T) {
+	server := httptest.NewServer(http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		w.Write([]byte(`{"QueryDuration":`))
+	}))
+	defer server.Close()
+	client, err := newLoadClient(models.Test{RequestURL: server.URL, RequestType: "GET"})
+	if err != nil {
+		t.Fatal(err)
+	}
+	stat, err := client.worker().do()
+	if err == nil || stat.ErrorClass != models.MetricError {
+		t.Errorf("got %v, error class %d, want a metric error", err, stat.ErrorClass)
+	}
+}
+
+// the load of a concurrent test on a local server: b.N requests sent by concurrency
+// workers, each recorded into data.bin
+func BenchmarkConcurrentLoad(b *testing.B) {
+	server := httptest.NewServer(http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		w.Write([]byte(benchmarkBody))
+	}))
+	defer server.Close()
+	test := models.Test{
+		TestUniqueName:     "benchmark",
+		RequestURL:         server.URL,
+		RequestType:        "GET",
+		TestMode:           "concurrent",
+		ConcurrentRequests: 50,
+	}
+	client, err := newLoadClient(test)
+	if err != nil {
+		b.Fatal(err)
+	}
+	recorder, err := models.NewRecorder(test, b.TempDir()+"/")
+	if err != nil {
+		b.Fatal(err)
+	}
+	b.ReportAllocs()
+	b.ResetTimer()
+	start := time.Now()
+	runConcurrently(b, test.ConcurrentRequests, func(next func() bool) int {
+		worker := client.worker()
+		shard := recorder.Shard()
+		defer shard.Close()
+		failed := 0
+		for next() {
+			stat, err := worker.do()
+			if err != nil {
+				failed++
+			}
+			shard.Add(stat)
+		}
+		return failed
+	})
+	elapsed := time.Since(start)
+	b.StopTimer()
+	if err := recorder.Stop(); err != nil {
+		b.Fatal(err)
+	}
+	b.ReportMetric(float64(b.N)/elapsed.Seconds(), "req/s")
+}
+
+// the same load sent the way it was before the load client (cmd/loadbench
+// legacyConcurrentTest): a client per request, the whole body decoded into a map
+// and the samples kept in memory
+func BenchmarkConcurrentLoadBaseline(b *testing.B) {
+	server := httptest.NewServer(http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		w.Write([]byte(benchmarkBody))
+	}))
+	defer server.Close()
+	var mu sync.Mutex
+	var all []models.StatData
+	b.ReportAllocs()
+	b.ResetTimer()
+	start := time.Now()
+	runConcurrently(b, 50, func(next func() bool) int {
+		stats := []models.StatData{}
+		failed := 0
+		for next() {
+			client := &http.Client{}
+			req, err := http.NewRequest("GET", server.URL, nil)
+			if err != nil {
+				failed++
+				continue
+			}
+			req.Header.Set("Content-Type", "application/json")
+			startTime := time.Now()
+			resp, err := client.Do(req)
+			if err != nil {
+				failed++
+				continue
+			}
+			elapsed := time.Since(startTime)
+			var responseData map[string]interface{}
+			err = json.NewDecoder(resp.Body).Decode(&responseData)
+			// closed here, unlike before, so that b.N requests do not run out of ports
+			resp.Body.Close()
+			value, ok := responseData["QueryDuration"].(float64)
+			if err != nil || !ok {
+				failed++
+				continue
+			}
+			stats = append(stats, models.StatData{
+				StartTimestamp:  startTime.UnixNano(),
+				EndTimestamp:    time.Now().UnixNano(),
+				QueryDuration:   int64(value),
+				RequestDuration: elapsed.Nanoseconds(),
+			})
+		}
+		mu.Lock()
+		all = append(all, stats...)
+		mu.Unlock()
+		return failed
+	})
+	elapsed := time.Since(start)
+	b.StopTimer()
+	b.ReportMetric(float64(b.N)/elapsed.Seconds(), "req/s")
+}
+
+// runs work in concurrency goroutines until they sent b.N requests between them,
+// next reserves the next request, work returns how many failed
+func runConcurrently(b *testing.B, concurrency int, work func(next func() bool) int) {
+	var sent int64
+	var failed int64
+	next := func() bool {
+		return atomic.AddInt64(&sent, 1) <= int64(b.N)
+	}
+	wg := &sync.WaitGroup{}
+	for i := 0; i < concurrency; i++ {
+		wg.Add(1)
+		go func() {
+			defer wg.Done()
+			atomic.AddInt64(&failed, int64(work(next)))
+		}()
+	}
+	wg.Wait()
+	if failed > 0 {
+		b.Errorf("%d of %d requests failed", failed, b.N)
+	}
+}
@@ -0,0 +1,342 @@
+package httpbenchmark
+
+import (
+	"bufio"
+	"bytes"
+	"crypto/subtle"
+	"encoding/json"
+	"fmt"
+	"io"
+	"net"
+	"net/http"
+	"os"
+	"os/exec"
+	"path/filepath"
+	"strconv"
+	"sync"
+	"time"
+
+	"github.com/GHLabidi/api-performance-tester/internal/models"
+	"github.com/gorilla/mux"
+)
+
+// Distributed tests. The runner (coordinator) starts Processes local agents and
+// uses the test's Agents (started elsewhere with -agent host:port), and asks every
+// agent to run the same test in the same time window. Each agent records its share
+// like a single process test would, in DATA_FOLDER/<test>/parts/<part>/ (data.bin,
+// data.csv, histograms and its own benchmark.json). The coordinator downloads the
+// parts written on other machines, merges the histograms into the test's
+// benchmark.json and histograms, and the analyzer reads the parts one after the
+// other instead of a single data.bin.
+//
+// An agent runs whatever test it is sent, against any URL, so agents listening on
+// other than a loopback address require AGENT_TOKEN to be set. The coordinator sends
+// its own AGENT_TOKEN with every request, agents reject requests without the same one.
+
+// time given to every agent to receive the run before the window opens
+const agentStartDelay = 2 * time.Second
+
+// files of a part, fetched from agents that do not share the coordinator's data folder
+func partFiles(test models.Test) []string {
+	files := []string{models.RawDataFileName, "data.csv", "benchmark.json"}
+	for _, metric := range models.NewRawDataSchema(test).Metrics {
+		files = append(files, metric.Name+models.HistogramFileSuffix)
+	}
+	return files
+}
+
+type agentRun struct {
+	Test models.Test `json:"test"`
+	// unix nanoseconds, the same for every agent
+	StartTime int64  `json:"start_time"`
+	Part      string `json:"part"`
+}
+
+type agentResult struct {
+	Part models.BenchmarkPart `json:"part"`
+	// size of every file of the part
+	Files map[string]int64 `json:"files"`
+	Error string           `json:"error"`
+}
+
+// ServeAgent runs tests for a coordinator, one at a time, until the process is stopped.
+// The address it listens on is printed on the first line of the output.
+func ServeAgent(addr string) error {
+	listener, err := net.Listen("tcp", addr)
+	if err != nil {
+		return err
+	}
+	token := os.Getenv(agentTokenVariable)
+	if err := checkAgentAddress(listener.Addr(), token); err != nil {
+		listener.Close()
+		return err
+	}
+	fmt.Println(listener.Addr().String())
+	return http.Serve(listener, agentHandler(token))
+}
+
+// environment variable holding the token shared by the coordinator and its agents
+const agentTokenVariable = "AGENT_TOKEN"
+
+// agents reachable from other machines need a token
+func checkAgentAddress(addr net.Addr, token string) error {
+	if tcp, ok := addr.(*net.TCPAddr); ok && tcp.IP.IsLoopback() || token != "" {
+		return nil
+	}
+	return fmt.Errorf("set %s to listen on %s, without it agents only listen on loopback addresses", agentTokenVariable, addr)
+}
+
+// the routes of an agent
+func agentHandler(token string) http.Handler {
+	runMu := &sync.Mutex{}
+	router := mux.NewRouter()
+	router.HandleFunc("/run", func(w http.ResponseWriter, r *http.Request) {
+		var run agentRun
+		if err := json.NewDecoder(r.Body).Decode(&run); err != nil {
+			http.Error(w, err.Error(), http.StatusBadRequest)
+			return
+		}
+		// TestStartTime is shared by the test modes
+		runMu.Lock()
+		result := runAgentPart(run)
+		runMu.Unlock()
+		w.Header().Set("Content-Type", "application/json")
+		json.NewEncoder(w).Encode(result)
+	}).Methods("POST")
+	router.HandleFunc("/parts/{test}/{part}/{file}", func(w http.ResponseWriter, r *http.Request) {
+		vars := mux.Vars(r)
+		folder := partFolder(models.Test{TestUniqueName: filepath.Base(vars["test"])}, filepath.Base(vars["part"]))
+		http.ServeFile(w, r, folder+filepath.Base(vars["file"]))
+	}).Methods("GET")
+	return requireToken(token, router)
+}
+
+// next, for the requests carrying token when one is set
+func requireToken(token string, next http.Handler) http.Handler {
+	return http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		if token != "" && subtle.ConstantTimeCompare([]byte(r.Header.Get("Authorization")), []byte("Bearer "+token)) != 1 {
+			http.Error(w, "invalid agent token", http.StatusUnauthorized)
+			return
+		}
+		next.ServeHTTP(w, r)
+	})
+}
+
+// request to an agent, with the coordinator's token
+func agentRequest(method string, url string, body io.Reader) (*http.Response, error) {
+	req, err := http.NewRequest(method, url, body)
+	if err != nil {
+		return nil, err
+	}
+	req.Header.Set("Authorization", "Bearer "+os.Getenv(agentTokenVariable))
+	if body != nil {
+		req.Header.Set("Content-Type", "application/json")
+	}
+	return http.DefaultClient.Do(req)
+}
+
+func partFolder(test models.Test, part string) string {
+	return models.TestDataFolder(test) + models.PartsFolder + part + "/"
+}
+
+// run the agent's share of a test and save it in its part folder
+func runAgentPart(run agentRun) agentResult {
+	test := run.Test
+	folder := partFolder(test, run.Part)
+	fmt.Println("Test:", test.TestUniqueName, "part:", run.Part)
+	recorder, err := models.NewRecorder(test, folder)
+	if err != nil {
+		return agentResult{Error: err.Error()}
+	}
+	time.Sleep(time.Until(time.Unix(0, run.StartTime)))
+	failedRequests, gcStats := runLoad(test, recorder, run.StartTime)
+	if err := recorder.Stop(); err != nil {
+		return agentResult{Error: err.Error()}
+	}
+	benchmark := models.NewBenchmarkData(test, recorder, failedRequests, run.StartTime)
+	benchmark.DataFolder = folder
+	benchmark.GCStats = gcStats
+	if err := benchmark.Save(); err != nil {
+		return agentResult{Error: err.Error()}
+	}
+	if err := benchmark.SaveHistograms(); err != nil {
+		return agentResult{Error: err.Error()}
+	}
+	result := agentResult{
+		Part: models.BenchmarkPart{
+			Name:               run.Part,
+			SuccessfulRequests: benchmark.SuccessfulRequests,
+			FailedRequests:     failedRequests,
+			ErrorsByClass:      benchmark.ErrorsByClass,
+			GCStats:            gcStats,
+			RecorderStalls:     benchmark.RecorderStalls,
+		},
+		Files: map[string]int64{},
+	}
+	for _, name := range partFiles(test) {
+		if info, err := os.Stat(folder + name); err == nil {
+			result.Files[name] = info.Size()
+		}
+	}
+	return result
+}
+
+// start this program as a local agent, it prints its address on the first line
+func startLocalAgent() (*exec.Cmd, string, error) {
+	cmd := exec.Command(os.Args[0], "-agent", "127.0.0.1:0")
+	cmd.Stderr = os.Stderr
+	stdout, err := cmd.StdoutPipe()
+	if err != nil {
+		return nil, "", err
+	}
+	if err := cmd.Start(); err != nil {
+		return nil, "", err
+	}
+	reader := bufio.NewReader(stdout)
+	addr, err := reader.ReadString('\n')
+	if err != nil {
+		cmd.Process.Kill()
+		cmd.Wait()
+		return nil, "", err
+	}
+	// keep forwarding the agent's output, it would block once the pipe is full
+	go io.Copy(os.Stdout, reader)
+	return cmd, string(bytes.TrimSpace([]byte(addr))), nil
+}
+
+// ask the agent at addr to run its share and fetch the part if it was written elsewhere
+func runOnAgent(addr string, run agentRun) (models.BenchmarkPart, error) {
+	body, err := json.Marshal(run)
+	if err != nil {
+		return models.BenchmarkPart{}, err
+	}
+	resp, err := agentRequest("POST", "http://"+addr+"/run", bytes.NewReader(body))
+	if err != nil {
+		return models.BenchmarkPart{}, err
+	}
+	defer resp.Body.Close()
+	if resp.StatusCode != http.StatusOK {
+		return models.BenchmarkPart{}, fmt.Errorf("agent %s: %s", addr, resp.Status)
+	}
+	var result agentResult
+	if err := json.NewDecoder(resp.Body).Decode(&result); err != nil {
+		return models.BenchmarkPart{}, err
+	}
+	if result.Error != "" {
+		return models.BenchmarkPart{}, fmt.Errorf("agent %s: %s", addr, result.Error)
+	}
+	result.Part.Agent = addr
+	folder := partFolder(run.Test, run.Part)
+	os.MkdirAll(folder, 0755)
+	for name, size := range result.Files {
+		// agents on this machine wrote the part in place
+		if info, err := os.Stat(folder + name); err == nil && info.Size() == size {
+			continue
+		}
+		if err := downloadFile("http://"+addr+"/parts/"+run.Test.TestUniqueName+"/"+run.Part+"/"+name, folder+name); err != nil {
+			return models.BenchmarkPart{}, err
+		}
+	}
+	return result.Part, nil
+}
+
+// stream url to path, without holding the file in memory
+func downloadFile(url string, path string) error {
+	resp, err := agentRequest("GET", url, nil)
+	if err != nil {
+		return err
+	}
+	defer resp.Body.Close()
+	if resp.StatusCode != http.StatusOK {
+		return fmt.Errorf("downloading %s: %s", url, resp.Status)
+	}
+	file, err := os.Create(path)
+	if err != nil {
+		return err
+	}
+	if _, err := io.Copy(file, resp.Body); err != nil {
+		file.Close()
+		return err
+	}
+	return file.Close()
+}
+
+// run test on every agent at once and merge their results
+func runDistributedTest(test models.Test) (models.BenchmarkData, error) {
+	if test.LiveAnalysis {
+		fmt.Println("Live analysis is not available for distributed tests.")
+	}
+	addrs := append([]string{}, test.Agents...)
+	for i := 0; i < test.Processes; i++ {
+		cmd, addr, err := startLocalAgent()
+		if err != nil {
+			fmt.Println("Error starting a local agent.")
+			fmt.Println(err)
+			return models.BenchmarkData{}, err
+		}
+		defer cmd.Wait()
+		defer cmd.Process.Kill()
+		addrs = append(addrs, addr)
+	}
+	// a single process run of the same test may have left its raw data in the folder
+	folder := models.TestDataFolder(test)
+	os.RemoveAll(folder + models.PartsFolder)
+	os.Remove(folder + models.RawDataFileName)
+	os.Remove(folder + "data.csv")
+
+	// every agent runs the whole test, rates are split so their sum is the test's
+	share := test
+	share.Processes = 0
+	share.Agents = nil
+	share.LiveAnalysis = false
+	share.TargetRPS = test.TargetRPS / float64(len(addrs))
+	share.StartRPS = test.StartRPS / float64(len(addrs))
+	share.Stages = append([]models.Stage{}, test.Stages...)
+	for i := range share.Stages {
+		share.Stages[i].TargetRPS = test.Stages[i].TargetRPS / float64(len(addrs))
+	}
+	startTime := time.Now().Add(agentStartDelay).UnixNano()
+	fmt.Println("Running on", len(addrs), "agents:", addrs)
+
+	parts := make([]models.BenchmarkPart, len(addrs))
+	errs := make([]error, len(addrs))
+	wg := &sync.WaitGroup{}
+	for i, addr := range addrs {
+		wg.Add(1)
+		go func(i int, addr string) {
+			defer wg.Done()
+			parts[i], errs[i] = runOnAgent(addr, agentRun{Test: share, StartTime: startTime, Part: "agent-" + strconv.Itoa(i)})
+		}(i, addr)
+	}
+	wg.Wait()
+	for _, err := range errs {
+		if err != nil {
+			fmt.Println("Error running the test on an agent.")
+			fmt.Println(err)
+			return models.BenchmarkData{}, err
+		}
+	}
+
+	fmt.Println("Merging the results of the agents.")
+	benchmark, err := models.NewDistributedBenchmarkData(test, parts, startTime)
+	if err != nil {
+		fmt.Println("Error merging the results of the agents.")
+		fmt.Println(err)
+		return models.BenchmarkData{}, err
+	}
+	fmt.Println("Total requests:", benchmark.TotalRequests)
+	fmt.Println("Failed requests:", benchmark.FailedRequests)
+	fmt.Println("Saving benchmark data.")
+	if err := benchmark.Save(); err != nil {
+		fmt.Println("Error saving benchmark data.")
+		fmt.Println(err)
+		return models.BenchmarkData{}, err
+	}
+	fmt.Println("Saving histograms.")
+	if err := benchmark.SaveHistograms(); err != nil {
+		fmt.Println("Error saving histograms.")
+		fmt.Println(err)
+		return models.BenchmarkData{}, err
+	}
+	return benchmark, nil
+}
@@ -0,0 +1,40 @@
+package httpbenchmark
+
+import (
+	"net"
+	"net/http"
+	"net/http/httptest"
+	"testing"
+)
+
+func TestAgentToken(t *testing.T) {
+	server := httptest.NewServer(requireToken("secret", http.NotFoundHandler()))
+	defer server.Close()
+	url := server.URL + "/parts/missing/agent-0/data.bin"
+	t.Setenv(agentTokenVariable, "")
+	if resp, err := agentRequest("GET", url, nil); err != nil || resp.StatusCode != http.StatusUnauthorized {
+		t.Errorf("request without the token: %v %v", resp, err)
+	}
+	t.Setenv(agentTokenVariable, "wrong")
+	if resp, err := agentRequest("POST", server.URL+"/run", nil); err != nil || resp.StatusCode != http.StatusUnauthorized {
+		t.Errorf("run with a wrong token: %v %v", resp, err)
+	}
+	t.Setenv(agentTokenVariable, "secret")
+	if resp, err := agentRequest("GET", url, nil); err != nil || resp.StatusCode != http.StatusNotFound {
+		t.Errorf("request with the token: %v %v", resp, err)
+	}
+}
+
+func TestAgentAddress(t *testing.T) {
+	loopback := &net.TCPAddr{IP: net.ParseIP("127.0.0.1"), Port: 9000}
+	any := &net.TCPAddr{IP: net.IPv4zero, Port: 9000}
+	if err := checkAgentAddress(loopback, ""); err != nil {
+		t.Error(err)
+	}
+	if err := checkAgentAddress(any, ""); err == nil {
+		t.Error("agent listening on every address without a token")
+	}
+	if err := checkAgentAddress(any, "secret"); err != nil {
+		t.Error(err)
+	}
+}
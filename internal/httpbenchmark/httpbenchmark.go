@@ -1,12 +1,14 @@
 package httpbenchmark
 
 import (
-	"encoding/json"
 	"fmt"
-	"net/http"
+	"os"
+	"runtime"
 	"sync"
+	"sync/atomic"
 	"time"
 
+	"github.com/GHLabidi/api-performance-tester/internal/analysis"
 	"github.com/GHLabidi/api-performance-tester/internal/models"
 )
 
@@ -16,154 +18,331 @@ var (
 )
 
 func RunSingleTest(test models.Test) error {
-	TestStartTime = time.Now().UnixNano()
-	stats := []models.StatData{}
-	failedRequests := 0
+	benchmark, err := runTest(test)
+	if err != nil {
+		return err
+	}
+	fmt.Println("Generating Report.")
+	if benchmark.GenerateReport() == nil {
+		benchmark.AddToCatalog()
+	}
+	fmt.Println("Done. You can now view the results in: http://localhost:8081/benchmarks/" + test.TestUniqueName) // TODO make the link dynamic
+
+	return nil
+}
 
+// run the test and save its results, without generating the report
+func runTest(test models.Test) (models.BenchmarkData, error) {
 	// print test info
 	fmt.Println("Test:", test.TestUniqueName)
+	if err := test.ValidateMetrics(); err != nil {
+		fmt.Println("Error in the metrics of the test.")
+		fmt.Println(err)
+		return models.BenchmarkData{}, err
+	}
+	test, err := test.WithStages()
+	if err != nil {
+		fmt.Println("Error in the stages of the test.")
+		fmt.Println(err)
+		return models.BenchmarkData{}, err
+	}
+	if len(test.Stages) > 0 {
+		fmt.Println("Stages:", len(test.Stages), "over", test.TestDuration, "seconds")
+	}
+	if test.Processes > 0 || len(test.Agents) > 0 {
+		return runDistributedTest(test)
+	}
+
+	// parts of an earlier distributed run would be read instead of this run's data
+	os.RemoveAll(models.TestDataFolder(test) + models.PartsFolder)
+	// samples are written to data.bin and data.csv while the test runs, so it can be followed live
+	recorder, err := models.NewRecorder(test, models.TestDataFolder(test))
+	if err != nil {
+		fmt.Println("Error creating the raw data files.")
+		fmt.Println(err)
+		return models.BenchmarkData{}, err
+	}
+	liveDone := make(chan struct{})
+	close(liveDone)
+	if test.LiveAnalysis {
+		liveDone = make(chan struct{})
+		go func() {
+			defer close(liveDone)
+			if err := analysis.FollowLive(test.TestUniqueName); err != nil {
+				fmt.Println("Error in live analysis:", err)
+			}
+		}()
+		fmt.Println("Live summary: " + models.TestDataFolder(test) + "live.json")
+	}
+
+	failedRequests, gcStats := runLoad(test, recorder, time.Now().UnixNano())
+
+	// create benchmark data, save it and generate report
+	fmt.Println("Saving raw data.")
+	if err := recorder.Stop(); err != nil {
+		fmt.Println("Error writing raw data.")
+		fmt.Println(err)
+	}
+	fmt.Println("Creating benchmark data.")
+	benchmark := models.NewBenchmarkData(test, recorder, failedRequests, TestStartTime)
+	benchmark.GCStats = gcStats
+	fmt.Println("Saving benchmark data.")
+	if err := benchmark.Save(); err != nil {
+		fmt.Println("Error saving benchmark data.")
+		fmt.Println(err)
+		// without benchmark.json the live analysis does not stop, it is not waited for
+		return models.BenchmarkData{}, err
+	}
+	fmt.Println("Saving histograms.")
+	err = benchmark.SaveHistograms()
+	// the live analysis stops once benchmark.json is saved
+	<-liveDone
+	if err != nil {
+		fmt.Println("Error saving histograms.")
+		fmt.Println(err)
+		return models.BenchmarkData{}, err
+	}
+
+	return benchmark, nil
+}
 
+// send the test's requests from startTime on, recording them with recorder. Returns
+// the failed requests and the garbage collections of the load generator meanwhile
+func runLoad(test models.Test, recorder *models.Recorder, startTime int64) (int, models.GCStats) {
+	failedRequests := 0
+	// collections of the load generator during the test go to benchmark.json
+	var memStats runtime.MemStats
+	runtime.ReadMemStats(&memStats)
+	TestStartTime = startTime
 	// check test mode
 	switch test.TestMode {
 	case "continious":
 		fmt.Println("Starting continuous test.")
 		// run continuous test
-		stats, failedRequests = PerformContiniusTest(test)
+		failedRequests = PerformContiniusTest(test, recorder)
 		break
 	case "concurrent":
 		fmt.Println("Starting concurrent test.")
 		// run concurrent test
-		stats, failedRequests = PerformConcurrentTest(test)
+		failedRequests = PerformConcurrentTest(test, recorder)
+		break
+	case models.ArrivalRateTestMode:
+		fmt.Println("Starting arrival-rate test.")
+		// run open-loop test
+		failedRequests = PerformArrivalRateTest(test, recorder)
 		break
 	default:
 		fmt.Println("Test mode not specified. Defaulting to continuous")
 		// run continuous test
-		stats, failedRequests = PerformContiniusTest(test)
+		failedRequests = PerformContiniusTest(test, recorder)
 	}
+	gcStats := models.GCStatsSince(&memStats)
 	fmt.Println("Test finished.")
-	fmt.Println("Total requests:", len(stats)+failedRequests)
+	fmt.Println("Total requests:", recorder.Rows()+failedRequests)
 	fmt.Println("Failed requests:", failedRequests)
-
-	// create benchmark data, save it and generate report
-	fmt.Println("Creating benchmark data.")
-	benchmark := models.NewBenchmarkData(test, stats, failedRequests, TestStartTime)
-	fmt.Println("Saving benchmark data.")
-	benchmark.Save()
-	fmt.Println("Saving raw data.")
-	benchmark.SaveRawData()
-	fmt.Println("Generating Report.")
-	benchmark.GenerateReport()
-	fmt.Println("Done. You can now view the results in: http://localhost:8081/benchmarks/" + test.TestUniqueName) // TODO make the link dynamic
-
-	return nil
+	fmt.Printf("Load generator GC: %d collections, %.2fms paused\n", gcStats.NumGC, float64(gcStats.PauseTotalNs)/1e6)
+	if stalls := recorder.Stalls(); stalls > 0 {
+		fmt.Println("Sample buffers not queued at once, the disk was behind:", stalls)
+	}
+	return failedRequests, gcStats
 }
 
-// RunTests runs a list of tests
+// RunTests runs a list of tests one after the other, then generates their reports
+// in parallel on the analysis worker, so the analysis never competes with a running test
 func RunTests(tests []models.Test) error {
+	benchmarks := []models.BenchmarkData{}
 	for _, test := range tests {
-		RunSingleTest(test)
+		benchmark, err := runTest(test)
+		if err != nil {
+			continue
+		}
+		benchmarks = append(benchmarks, benchmark)
 	}
 
+	fmt.Println("Generating Reports.")
+	wg := &sync.WaitGroup{}
+	for _, benchmark := range benchmarks {
+		wg.Add(1)
+		go func(benchmark models.BenchmarkData) {
+			defer wg.Done()
+			if benchmark.GenerateReport() == nil {
+				benchmark.AddToCatalog()
+				fmt.Println("Done. You can now view the results in: http://localhost:8081/benchmarks/" + benchmark.TestUniqueName) // TODO make the link dynamic
+			}
+		}(benchmark)
+	}
+	wg.Wait()
+
 	return nil
 }
 
-func PerformContiniusTest(test models.Test) ([]models.StatData, int) {
+// stageGate holds back the workers of a staged closed-loop test left out of the
+// current stage: workers with an id below workers send, the others wait for
+// changed, which is closed and replaced whenever workers changes
+type stageGate struct {
+	workers int64
+	mu      sync.Mutex
+	changed chan struct{}
+}
+
+func newStageGate() *stageGate {
+	return &stageGate{changed: make(chan struct{})}
+}
+
+func (g *stageGate) set(workers int) {
+	g.mu.Lock()
+	defer g.mu.Unlock()
+	if int64(workers) == atomic.LoadInt64(&g.workers) {
+		return
+	}
+	atomic.StoreInt64(&g.workers, int64(workers))
+	close(g.changed)
+	g.changed = make(chan struct{})
+}
+
+// wait blocks worker id until it may send, false when done was closed first
+func (g *stageGate) wait(id int, done <-chan struct{}) bool {
+	for {
+		// changed is read before workers, a later set closes it
+		g.mu.Lock()
+		changed := g.changed
+		g.mu.Unlock()
+		if int64(id) < atomic.LoadInt64(&g.workers) {
+			return true
+		}
+		select {
+		case <-changed:
+		case <-done:
+			return false
+		}
+	}
+}
+
+// runStages sets the gate to the number of workers of the test at every change,
+// until the last one or until done is closed
+func runStages(test models.Test, gate *stageGate, done <-chan struct{}) {
+	for _, change := range test.WorkerChanges() {
+		wait := time.Until(time.Unix(0, TestStartTime+int64(change.Offset*float64(time.Second))))
+		if wait > 0 {
+			timer := time.NewTimer(wait)
+			select {
+			case <-timer.C:
+			case <-done:
+				timer.Stop()
+				return
+			}
+		}
+		gate.set(change.Workers)
+	}
+}
+
+// think time of the closed-loop workers, between a response and their next request
+func sleepBetweenRequests(test models.Test) time.Duration {
+	return time.Duration(test.SleepBetweenRequests * float64(time.Second))
+}
+
+func PerformContiniusTest(test models.Test, recorder *models.Recorder) int {
 
-	var stats []models.StatData
 	var failedRequests int = 0
-	client := &http.Client{}
+	// prepare the request
+	client, err := newLoadClient(test)
+	if err != nil {
+		fmt.Println("Error creating request.")
+		fmt.Println(err)
+		return failedRequests
+	}
+	worker := client.worker()
+	shard := recorder.Shard()
+	defer shard.Close()
+	sleep := sleepBetweenRequests(test)
 	// keep sending requests until test duration is reached
 	for {
 		// check if test duration is reached
 		if time.Now().UnixNano()-TestStartTime > int64(test.TestDuration)*int64(time.Second) {
 			break
 		}
-		// prepare the request
-		req, err := http.NewRequest(test.RequestType, test.RequestURL, nil)
+		// send request and extract duration from response
+		stat, err := worker.do()
 		if err != nil {
-			fmt.Println("Error creating request.")
-			fmt.Println(err)
 			failedRequests++
-			continue
 		}
-		req.Header.Set("Content-Type", "application/json")
-
-		startTime := time.Now()
-		// send request
-		resp, err := client.Do(req)
-		if err != nil {
-			fmt.Println("Error sending request.")
-			fmt.Println(err)
-			failedRequests++
-			continue
-		}
-		elapsed := time.Since(startTime)
-		// extract duration from response
-		fieldToExtract := "QueryDuration" // TODO make this configurable
-		query_duration, err := extractDurationFromResponse(resp, fieldToExtract)
-		if err != nil {
-			fmt.Println("Error extracting duration.")
-			fmt.Println(err)
-			failedRequests++
-			continue
+		// record stats, failed requests with their error class
+		shard.Add(stat)
+		if sleep > 0 {
+			time.Sleep(sleep)
 		}
-		// append stats
-		stats = append(stats, models.StatData{
-			StartTimestamp:  startTime.UnixNano(),
-			EndTimestamp:    time.Now().UnixNano(),
-			QueryDuration:   query_duration,
-			RequestDuration: elapsed.Nanoseconds(),
-		})
 
 	}
 
-	return stats, failedRequests
+	return failedRequests
 
 }
 
-func PerformConcurrentTest(test models.Test) ([]models.StatData, int) {
+func PerformConcurrentTest(test models.Test, recorder *models.Recorder) int {
 	if test.ConcurrentRequests == 0 {
 		fmt.Println("Concurrent requests number is not specified. Defaulting to 10.")
 		test.ConcurrentRequests = 10
 	}
-	type ChannelResult struct {
-		Stats          []models.StatData
-		FailedRequests int
+	// one connection pool shared by all goroutines
+	client, err := newLoadClient(test)
+	if err != nil {
+		fmt.Println("Error creating request.")
+		fmt.Println(err)
+		return 0
 	}
-	// create a buffered channel to receive results from goroutines
-	ch := make(chan ChannelResult, test.ConcurrentRequests)
+	// create a buffered channel to receive the failed requests of each goroutine
+	ch := make(chan int, test.ConcurrentRequests)
 	// create a wait group to wait for all goroutines to finish
 	wg := &sync.WaitGroup{}
 
-	// start test.ConcurrentRequests goroutines
+	sleep := sleepBetweenRequests(test)
+
+	// staged tests: the workers above the level of the stage wait at the gate until
+	// it reaches them or the test is over
+	var gate *stageGate
+	done := make(chan struct{})
+	if len(test.Stages) > 0 {
+		gate = newStageGate()
+		end := time.AfterFunc(time.Until(time.Unix(0, TestStartTime+int64(test.TestDuration)*int64(time.Second))), func() { close(done) })
+		defer end.Stop()
+		go runStages(test, gate, done)
+	}
+
+	// start test.ConcurrentRequests goroutines, the highest level of staged tests
 	for i := 0; i < test.ConcurrentRequests; i++ {
 		wg.Add(1)
 		// start a goroutine
-		go func() {
+		go func(id int) {
 			defer wg.Done()
 
-			tmpStats := []models.StatData{}
 			failedRequests := 0
+			worker := client.worker()
+			// each goroutine records into its own buffers, without locking
+			shard := recorder.Shard()
+			defer shard.Close()
 			// keep sending requests until test duration is reached
 			for {
 				if time.Now().UnixNano()-TestStartTime > int64(test.TestDuration)*int64(time.Second) {
 					break
 				}
-				stat, err := performSingleRequest(test)
+				// staged tests: worker id only sends while the stage has more workers
+				if gate != nil && !gate.wait(id, done) {
+					break
+				}
+				stat, err := worker.do()
 				if err != nil {
 					failedRequests++
-					continue
 				}
-				tmpStats = append(tmpStats, stat)
+				shard.Add(stat)
+				if sleep > 0 {
+					time.Sleep(sleep)
+				}
 
 			}
 			// send results to channel
-			ch <- ChannelResult{
-				Stats:          tmpStats,
-				FailedRequests: failedRequests,
-			}
+			ch <- failedRequests
 
-		}()
+		}(i)
 
 	}
 	// wait for all goroutines to finish
@@ -173,69 +352,10 @@ func PerformConcurrentTest(test models.Test) ([]models.StatData, int) {
 	close(ch)
 
 	// collect results from channel
-	var stats []models.StatData
 	var failedRequests int = 0
-	for duration := range ch {
-		stats = append(stats, duration.Stats...)
-		failedRequests += duration.FailedRequests
-	}
-	return stats, failedRequests
-
-}
-
-func performSingleRequest(test models.Test) (models.StatData, error) {
-	client := &http.Client{}
-	req, err := http.NewRequest(test.RequestType, test.RequestURL, nil)
-	if err != nil {
-		fmt.Println("Error creating request.")
-		fmt.Println(err)
-		return models.StatData{}, err
-	}
-	req.Header.Set("Content-Type", "application/json")
-	startTime := time.Now()
-	resp, err := client.Do(req)
-	if err != nil {
-		fmt.Println("Error sending request.")
-		fmt.Println(err)
-		return models.StatData{}, err
-	}
-	elapsed := time.Since(startTime)
-	fieldToExtract := "QueryDuration"
-	query_duration, err := extractDurationFromResponse(resp, fieldToExtract)
-	if err != nil {
-		fmt.Println("Error extracting duration.")
-		fmt.Println(err)
-		return models.StatData{}, err
-	}
-	return models.StatData{
-		StartTimestamp:  startTime.UnixNano(),
-		EndTimestamp:    time.Now().UnixNano(),
-		QueryDuration:   query_duration,
-		RequestDuration: elapsed.Nanoseconds(),
-	}, nil
-}
-
-func extractDurationFromResponse(resp *http.Response, fieldToExtract string) (int64, error) {
-	var query_duration int64
-	// get the response body
-	var responseData map[string]interface{}
-	if err := json.NewDecoder(resp.Body).Decode(&responseData); err != nil {
-		fmt.Println("Error decoding response.")
-		fmt.Println(err)
-		return 0, err
-	}
-	// check if the field exists
-	if responseData[fieldToExtract] == nil {
-		fmt.Println("Error extracting field.")
-		return 0, fmt.Errorf("Error extracting field %s", fieldToExtract)
-	}
-	// convert the value to int64 and check if it's valid
-	if value, ok := responseData[fieldToExtract].(float64); ok {
-		query_duration = int64(value)
-	} else {
-		fmt.Println("Error converting value.")
-		return 0, fmt.Errorf("Error converting value %v", responseData[fieldToExtract])
+	for failed := range ch {
+		failedRequests += failed
 	}
+	return failedRequests
 
-	return query_duration, nil
 }
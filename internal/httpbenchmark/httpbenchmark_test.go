@@ -0,0 +1,43 @@
+package httpbenchmark
+
+import (
+	"testing"
+	"time"
+)
+
+func TestStageGate(t *testing.T) {
+	gate := newStageGate()
+	done := make(chan struct{})
+	released := make(chan int, 3)
+	for id := 0; id < 3; id++ {
+		go func(id int) {
+			if gate.wait(id, done) {
+				released <- id
+			} else {
+				released <- -1
+			}
+		}(id)
+	}
+	expect := func(want int) {
+		select {
+		case id := <-released:
+			if id != want {
+				t.Fatalf("released %d, want %d", id, want)
+			}
+		case <-time.After(5 * time.Second):
+			t.Fatalf("%d was not released", want)
+		}
+	}
+	gate.set(1)
+	expect(0)
+	gate.set(2)
+	expect(1)
+	select {
+	case id := <-released:
+		t.Fatalf("released %d above the level", id)
+	case <-time.After(20 * time.Millisecond):
+	}
+	// the end of the test releases the others without letting them send
+	close(done)
+	expect(-1)
+}
@@ -4,8 +4,8 @@ import (
 	"encoding/json"
 	"fmt"
 	"os"
-	"os/exec"
 
+	"github.com/GHLabidi/api-performance-tester/internal/analysis"
 	"github.com/joho/godotenv"
 )
 
@@ -18,7 +18,7 @@ type BenchmarkData struct {
 	TestMode             string        `json:"test_mode"`
 	RequestURL           string        `json:"request_url"`
 	ConcurrentRequests   int           `json:"concurrent_requests"`
-	SleepBetweenRequests float64       `yaml:"SleepBetweenRequests"`
+	SleepBetweenRequests float64       `json:"sleep_between_requests"`
 	TestDuration         int           `json:"test_duration"`
 	TotalRequests        int           `json:"total_requests"`
 	SuccessfulRequests   int           `json:"successful_requests"`
@@ -26,43 +26,159 @@ type BenchmarkData struct {
 	RequestsPerSecond    float64       `json:"requests_per_second"`
 	QueryDurationStats   DurationStats `json:"query_duration_stats"`
 	RequestDurationStats DurationStats `json:"request_duration_stats"`
+	// arrival-rate tests: schedule and latency from the intended start of each request
+	TargetRPS         float64        `json:"target_rps,omitempty"`
+	StartRPS          float64        `json:"start_rps,omitempty"`
+	RampDuration      float64        `json:"ramp_duration,omitempty"`
+	ResponseTimeStats *DurationStats `json:"response_time_stats,omitempty"`
+	// staged tests: the load levels in order, from test_start_time on
+	Stages []Stage `json:"stages,omitempty"`
+	// every analyzed column by name: the metrics read from the responses, the durations
+	// measured by the runner and the response sizes
+	MetricStats map[string]DurationStats `json:"metric_stats"`
+	// failed requests by error class, they are in data.bin with their ErrorClass
+	ErrorsByClass map[string]int `json:"errors_by_class"`
+	// columns of data.bin and how they were measured
+	RawDataSchema RawDataSchema `json:"raw_data_schema"`
+	// precision of the histograms saved next to benchmark.json
+	HistogramSignificantDigits int `json:"histogram_significant_digits"`
+
+	// collections of the load generator while the test ran, summed over the agents
+	GCStats GCStats `json:"gc_stats"`
+	// full sample buffers the recorder could not queue for writing at once, summed over the agents
+	RecorderStalls int64 `json:"recorder_stalls"`
+	// distributed runs: the agents' shares, raw data in DataFolder/parts/<name>/
+	Parts []BenchmarkPart `json:"parts,omitempty"`
+
+	// by column name, saved as <name>.histogram.json
+	histograms map[string]*Histogram
 }
 
-var (
-	rawData []StatData
-)
+// BenchmarkPart is the share of a distributed test run by one agent
+type BenchmarkPart struct {
+	Name               string         `json:"name"`
+	Agent              string         `json:"agent"`
+	SuccessfulRequests int            `json:"successful_requests"`
+	FailedRequests     int            `json:"failed_requests"`
+	ErrorsByClass      map[string]int `json:"errors_by_class,omitempty"`
+	GCStats            GCStats        `json:"gc_stats"`
+	RecorderStalls     int64          `json:"recorder_stalls"`
+}
 
-// function to create a new BenchmarkData struct and calculate the stats
-func NewBenchmarkData(test Test, stats []StatData, failedRequests int, testStartTime int64) BenchmarkData {
-	rawData = stats
-	// load environment variables
-	err := godotenv.Load()
-	if err != nil {
-		panic(err)
+// folder of the parts of distributed runs, inside the test's data folder
+const PartsFolder = "parts/"
+
+// function to create a new BenchmarkData struct from the stats computed by the recorder
+func NewBenchmarkData(test Test, recorder *Recorder, failedRequests int, testStartTime int64) BenchmarkData {
+	// the histograms were filled while the test ran
+	histograms := map[string]*Histogram{}
+	for i, name := range recorder.schema.histogramColumns() {
+		histograms[name] = recorder.histograms[i]
 	}
+	benchmarkData := newBenchmarkData(test, recorder.Rows(), failedRequests, testStartTime, histograms)
+	benchmarkData.ErrorsByClass = recorder.ErrorsByClass()
+	benchmarkData.RecorderStalls = recorder.Stalls()
+	return benchmarkData
+}
 
-	DataFolder := os.Getenv("DATA_FOLDER")
+// NewDistributedBenchmarkData merges the histograms saved in the folders of parts
+func NewDistributedBenchmarkData(test Test, parts []BenchmarkPart, testStartTime int64) (BenchmarkData, error) {
+	names := NewRawDataSchema(test).histogramColumns()
+	merged := map[string]*Histogram{}
+	successfulRequests, failedRequests := 0, 0
+	errors := map[string]int{}
+	gcStats := GCStats{}
+	var stalls int64
+	for _, part := range parts {
+		folder := TestDataFolder(test) + PartsFolder + part.Name + "/"
+		for _, name := range names {
+			h, err := LoadHistogram(folder, name)
+			if err != nil {
+				return BenchmarkData{}, err
+			}
+			if merged[name] == nil {
+				merged[name] = NewHistogram(h.SignificantDigits)
+			}
+			if err := merged[name].Merge(h); err != nil {
+				return BenchmarkData{}, err
+			}
+		}
+		successfulRequests += part.SuccessfulRequests
+		failedRequests += part.FailedRequests
+		for class, count := range part.ErrorsByClass {
+			errors[class] += count
+		}
+		stalls += part.RecorderStalls
+		gcStats.NumGC += part.GCStats.NumGC
+		gcStats.PauseTotalNs += part.GCStats.PauseTotalNs
+		if part.GCStats.PauseMaxNs > gcStats.PauseMaxNs {
+			gcStats.PauseMaxNs = part.GCStats.PauseMaxNs
+		}
+	}
+	for _, name := range names {
+		if merged[name] == nil {
+			merged[name] = NewHistogram(test.HistogramSignificantDigits)
+		}
+	}
+	benchmarkData := newBenchmarkData(test, successfulRequests, failedRequests, testStartTime, merged)
+	benchmarkData.ErrorsByClass = errors
+	benchmarkData.GCStats = gcStats
+	benchmarkData.RecorderStalls = stalls
+	benchmarkData.Parts = parts
+	return benchmarkData, nil
+}
 
+// histograms: one per column of the test's RawDataSchema metrics
+func newBenchmarkData(test Test, successfulRequests int, failedRequests int, testStartTime int64, histograms map[string]*Histogram) BenchmarkData {
 	var benchmarkData BenchmarkData
 	benchmarkData.TestStartTime = testStartTime
 	benchmarkData.TestUniqueName = test.TestUniqueName
 	benchmarkData.TestDisplayName = test.TestDisplayName
 	benchmarkData.TestDescription = test.TestDescription
-	benchmarkData.DataFolder = DataFolder + "/" + test.TestUniqueName + "/"
+	benchmarkData.DataFolder = TestDataFolder(test)
 	benchmarkData.TestMode = test.TestMode
 	benchmarkData.RequestURL = test.RequestURL
 	benchmarkData.ConcurrentRequests = test.ConcurrentRequests
 	benchmarkData.SleepBetweenRequests = test.SleepBetweenRequests
 	benchmarkData.TestDuration = test.TestDuration
-	benchmarkData.TotalRequests = len(stats) + failedRequests
-	benchmarkData.SuccessfulRequests = len(stats)
+	benchmarkData.TotalRequests = successfulRequests + failedRequests
+	benchmarkData.SuccessfulRequests = successfulRequests
 	benchmarkData.FailedRequests = failedRequests
-	benchmarkData.RequestsPerSecond = float64(len(stats)+failedRequests) / float64(test.TestDuration)
-	benchmarkData.QueryDurationStats = CalculateStatsFromColumn(stats, "query_duration")
-	benchmarkData.RequestDurationStats = CalculateStatsFromColumn(stats, "request_duration")
+	benchmarkData.RequestsPerSecond = float64(successfulRequests+failedRequests) / float64(test.TestDuration)
+	benchmarkData.Stages = test.Stages
+	benchmarkData.RawDataSchema = NewRawDataSchema(test)
+	// the stats are read from the histograms
+	benchmarkData.histograms = histograms
+	benchmarkData.HistogramSignificantDigits = histograms["RequestDuration"].SignificantDigits
+	benchmarkData.MetricStats = map[string]DurationStats{}
+	for name, h := range histograms {
+		benchmarkData.MetricStats[name] = StatsFromHistogram(h)
+	}
+	// also under their original keys; QueryDuration stays empty when it is not one of the metrics
+	benchmarkData.QueryDurationStats = benchmarkData.MetricStats[QueryDurationColumn]
+	benchmarkData.RequestDurationStats = benchmarkData.MetricStats["RequestDuration"]
+	if test.TestMode == ArrivalRateTestMode {
+		benchmarkData.TargetRPS = test.TargetRPS
+		benchmarkData.StartRPS = test.StartRPS
+		benchmarkData.RampDuration = test.RampDuration
+		responseTimeStats := benchmarkData.MetricStats[ResponseTimeColumn]
+		benchmarkData.ResponseTimeStats = &responseTimeStats
+	}
 	return benchmarkData
 }
 
+// folder the results of test are saved in, DATA_FOLDER/<TestUniqueName>/
+func TestDataFolder(test Test) string {
+	// load environment variables
+	err := godotenv.Load()
+	if err != nil {
+		panic(err)
+	}
+
+	DataFolder := os.Getenv("DATA_FOLDER")
+	return DataFolder + "/" + test.TestUniqueName + "/"
+}
+
 // save the benchmark data to a json file
 func (b BenchmarkData) Save() error {
 	// TODO check if data is valid
@@ -87,49 +203,43 @@ func (b BenchmarkData) Save() error {
 	return nil
 }
 
-// save raw data to csv file
-func (b BenchmarkData) SaveRawData() error {
-	// TODO check if b is valid
-	if len(rawData) == 0 {
-		return fmt.Errorf("no raw data to save")
+// save the histogram of every analyzed column as <name>.histogram.json (QueryDuration,
+// RequestDuration, TimeToFirstByte, ResponseBytes, the extra metrics, and ResponseTime for
+// arrival-rate tests)
+func (b BenchmarkData) SaveHistograms() error {
+	if len(b.histograms) == 0 {
+		return fmt.Errorf("no histograms to save")
 	}
-
-	// create output folder
 	if _, err := os.Stat(b.DataFolder); os.IsNotExist(err) {
-		os.Mkdir(b.DataFolder, 0777)
-	}
-
-	// create csv file
-	csvFile, err := os.Create(b.DataFolder + "data.csv")
-	if err != nil {
-		return err
+		os.Mkdir(b.DataFolder, 0755)
 	}
-	defer csvFile.Close()
-
-	// write CSV records
-	for _, statDataItem := range rawData {
-		_, err := csvFile.WriteString(fmt.Sprintf("%d,%d,%d,%d\n", statDataItem.StartTimestamp, statDataItem.EndTimestamp, statDataItem.QueryDuration, statDataItem.RequestDuration))
-		if err != nil {
+	for _, name := range b.RawDataSchema.histogramColumns() {
+		if err := b.histograms[name].Save(b.DataFolder, name); err != nil {
 			return err
 		}
 	}
-	csvFile.Sync()
-
 	return nil
 }
 
 func (b BenchmarkData) GenerateReport() error {
-	pythonScript := "python/generate_report.py"
-
-	cmd := exec.Command("python", pythonScript, b.TestUniqueName)
-	// get working directory
-	cmd.Dir = os.Getenv("PWD")
-	err := cmd.Run()
+	// runs on the long lived analysis worker, without paying the python startup every time
+	err := analysis.GenerateReport(b.TestUniqueName)
 	if err != nil {
-		fmt.Println("Error running python script")
+		fmt.Println("Error generating report")
 		fmt.Println(err)
 		return err
 	}
 	return nil
 
 }
+
+// AddToCatalog adds the run to the catalog of every run (python/catalog.py), after its
+// report was generated so every run listed has one
+func (b BenchmarkData) AddToCatalog() error {
+	err := analysis.AddToCatalog(b.TestUniqueName)
+	if err != nil {
+		fmt.Println("Error adding the run to the catalog")
+		fmt.Println(err)
+	}
+	return err
+}
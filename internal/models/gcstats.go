@@ -0,0 +1,33 @@
+package models
+
+import "runtime"
+
+// GCStats are the garbage collections of the load generator during a test. Pauses stop
+// the workers too, so long ones show up as latency spikes that the server did not cause.
+type GCStats struct {
+	NumGC        uint32 `json:"num_gc"`
+	PauseTotalNs uint64 `json:"pause_total_ns"`
+	// longest pause, among the last 256 collections
+	PauseMaxNs uint64 `json:"pause_max_ns"`
+}
+
+// GCStatsSince returns the collections that happened since before was read
+func GCStatsSince(before *runtime.MemStats) GCStats {
+	var after runtime.MemStats
+	runtime.ReadMemStats(&after)
+	stats := GCStats{
+		NumGC:        after.NumGC - before.NumGC,
+		PauseTotalNs: after.PauseTotalNs - before.PauseTotalNs,
+	}
+	// pause of collection n is at PauseNs[(n+255)%256], only the last 256 are kept
+	first := before.NumGC + 1
+	if after.NumGC > 256 && first < after.NumGC-255 {
+		first = after.NumGC - 255
+	}
+	for n := first; n <= after.NumGC; n++ {
+		if pause := after.PauseNs[(n+255)%256]; pause > stats.PauseMaxNs {
+			stats.PauseMaxNs = pause
+		}
+	}
+	return stats
+}
@@ -0,0 +1,260 @@
+package models
+
+import (
+	"encoding/json"
+	"fmt"
+	"math"
+	"math/bits"
+	"os"
+)
+
+// Histogram is a log-bucketed (HDR style) histogram of non-negative int64 values.
+//
+// Values below 2^SubBucketBits are counted exactly. Above that, every power of two
+// range is split into 2^(SubBucketBits-1) equal buckets, so any value can be
+// reported with a relative error of at most 2^-(SubBucketBits-1), which is below
+// 10^-SignificantDigits. Histograms with the same precision can be merged, which
+// makes them usable across runs and time windows without the raw samples.
+type Histogram struct {
+	SignificantDigits int
+	SubBucketBits     int
+	TotalCount        int64
+	Min               int64
+	Max               int64
+	// running mean and sum of squared differences (Welford), mergeable
+	Mean float64
+	M2   float64
+	// dense bucket counts, grown on demand
+	counts []int64
+}
+
+// file names of the histograms saved next to benchmark.json
+const HistogramFileSuffix = ".histogram.json"
+
+// DefaultHistogramSignificantDigits is used when a test does not set HistogramSignificantDigits
+const DefaultHistogramSignificantDigits = 3
+
+func NewHistogram(significantDigits int) *Histogram {
+	if significantDigits <= 0 {
+		significantDigits = DefaultHistogramSignificantDigits
+	}
+	if significantDigits > 5 {
+		significantDigits = 5
+	}
+	return &Histogram{
+		SignificantDigits: significantDigits,
+		// smallest power of two that can hold 2 * 10^digits distinct values
+		SubBucketBits: int(math.Ceil(math.Log2(2 * math.Pow10(significantDigits)))),
+		Min:           math.MaxInt64,
+		Max:           math.MinInt64,
+	}
+}
+
+func (h *Histogram) halfCount() int64 {
+	return int64(1) << (h.SubBucketBits - 1)
+}
+
+// index of the bucket holding v
+func (h *Histogram) bucketIndex(v int64) int {
+	if v < 0 {
+		v = 0
+	}
+	magnitude := bits.Len64(uint64(v)) - h.SubBucketBits
+	if magnitude <= 0 {
+		return int(v)
+	}
+	return int(int64(magnitude)*h.halfCount() + (v >> magnitude))
+}
+
+// lowest and highest value counted in bucket i
+func (h *Histogram) bucketRange(i int) (int64, int64) {
+	half := h.halfCount()
+	if int64(i) < 2*half {
+		return int64(i), int64(i)
+	}
+	magnitude := int64(i)/half - 1
+	sub := int64(i) - magnitude*half
+	return sub << magnitude, ((sub + 1) << magnitude) - 1
+}
+
+func (h *Histogram) Record(v int64) {
+	h.RecordN(v, 1)
+}
+
+func (h *Histogram) RecordN(v int64, n int64) {
+	if n <= 0 {
+		return
+	}
+	i := h.bucketIndex(v)
+	if i >= len(h.counts) {
+		grown := make([]int64, i+1, 2*(i+1))
+		copy(grown, h.counts)
+		h.counts = grown
+	}
+	h.counts[i] += n
+	if v < h.Min {
+		h.Min = v
+	}
+	if v > h.Max {
+		h.Max = v
+	}
+	// Welford update, n identical values at once
+	total := h.TotalCount + n
+	delta := float64(v) - h.Mean
+	h.Mean += delta * float64(n) / float64(total)
+	h.M2 += delta * delta * float64(h.TotalCount) * float64(n) / float64(total)
+	h.TotalCount = total
+}
+
+// add the counts of other to h, both must use the same precision
+func (h *Histogram) Merge(other *Histogram) error {
+	if other.SubBucketBits != h.SubBucketBits {
+		return fmt.Errorf("cannot merge histograms with %d and %d significant digits", h.SignificantDigits, other.SignificantDigits)
+	}
+	if other.TotalCount == 0 {
+		return nil
+	}
+	if len(other.counts) > len(h.counts) {
+		grown := make([]int64, len(other.counts))
+		copy(grown, h.counts)
+		h.counts = grown
+	}
+	for i, c := range other.counts {
+		h.counts[i] += c
+	}
+	if other.Min < h.Min {
+		h.Min = other.Min
+	}
+	if other.Max > h.Max {
+		h.Max = other.Max
+	}
+	// parallel variance merge (Chan et al.)
+	total := h.TotalCount + other.TotalCount
+	delta := other.Mean - h.Mean
+	h.Mean += delta * float64(other.TotalCount) / float64(total)
+	h.M2 += other.M2 + delta*delta*float64(h.TotalCount)*float64(other.TotalCount)/float64(total)
+	h.TotalCount = total
+	return nil
+}
+
+// ValueAtQuantile returns the smallest recorded value v (up to the bucket precision)
+// such that at least q of all values are <= v, walking the buckets once.
+func (h *Histogram) ValueAtQuantile(q float64) int64 {
+	if h.TotalCount == 0 {
+		return 0
+	}
+	rank := int64(math.Ceil(q * float64(h.TotalCount)))
+	if rank < 1 {
+		rank = 1
+	}
+	var seen int64
+	for i, c := range h.counts {
+		seen += c
+		if seen >= rank {
+			_, high := h.bucketRange(i)
+			if high > h.Max {
+				high = h.Max
+			}
+			if high < h.Min {
+				high = h.Min
+			}
+			return high
+		}
+	}
+	return h.Max
+}
+
+// sample standard deviation, like gonum's stat.StdDev
+func (h *Histogram) StdDev() float64 {
+	if h.TotalCount < 2 {
+		return 0
+	}
+	return math.Sqrt(h.M2 / float64(h.TotalCount-1))
+}
+
+// summary statistics in O(buckets); min, max, mean and standard deviation are exact,
+// percentiles are within the histogram precision
+func StatsFromHistogram(h *Histogram) DurationStats {
+	if h.TotalCount == 0 {
+		return DurationStats{}
+	}
+	return DurationStats{
+		Min: h.Min,
+		Max: h.Max,
+		Avg: int64(h.Mean),
+		Std: int64(h.StdDev()),
+		P25: h.ValueAtQuantile(0.25),
+		P50: h.ValueAtQuantile(0.50),
+		P75: h.ValueAtQuantile(0.75),
+		P90: h.ValueAtQuantile(0.90),
+		P95: h.ValueAtQuantile(0.95),
+		P99: h.ValueAtQuantile(0.99),
+	}
+}
+
+// on-disk format, only non-empty buckets are written as [index, count] pairs
+type histogramFile struct {
+	Name              string     `json:"name"`
+	SignificantDigits int        `json:"significant_digits"`
+	SubBucketBits     int        `json:"sub_bucket_bits"`
+	TotalCount        int64      `json:"total_count"`
+	Min               int64      `json:"min"`
+	Max               int64      `json:"max"`
+	Mean              float64    `json:"mean"`
+	M2                float64    `json:"m2"`
+	Buckets           [][2]int64 `json:"buckets"`
+}
+
+// save the histogram as <folder><name>.histogram.json
+func (h *Histogram) Save(folder string, name string) error {
+	data := histogramFile{
+		Name:              name,
+		SignificantDigits: h.SignificantDigits,
+		SubBucketBits:     h.SubBucketBits,
+		TotalCount:        h.TotalCount,
+		Min:               h.Min,
+		Max:               h.Max,
+		Mean:              h.Mean,
+		M2:                h.M2,
+		Buckets:           [][2]int64{},
+	}
+	for i, c := range h.counts {
+		if c != 0 {
+			data.Buckets = append(data.Buckets, [2]int64{int64(i), c})
+		}
+	}
+	file, err := os.Create(folder + name + HistogramFileSuffix)
+	if err != nil {
+		return err
+	}
+	defer file.Close()
+	return json.NewEncoder(file).Encode(data)
+}
+
+// load a histogram written by Save
+func LoadHistogram(folder string, name string) (*Histogram, error) {
+	file, err := os.Open(folder + name + HistogramFileSuffix)
+	if err != nil {
+		return nil, err
+	}
+	defer file.Close()
+	var data histogramFile
+	if err := json.NewDecoder(file).Decode(&data); err != nil {
+		return nil, err
+	}
+	h := NewHistogram(data.SignificantDigits)
+	if h.SubBucketBits != data.SubBucketBits {
+		return nil, fmt.Errorf("unexpected sub bucket bits %d in %s", data.SubBucketBits, name)
+	}
+	h.TotalCount, h.Min, h.Max, h.Mean, h.M2 = data.TotalCount, data.Min, data.Max, data.Mean, data.M2
+	for _, bucket := range data.Buckets {
+		i := int(bucket[0])
+		if i >= len(h.counts) {
+			grown := make([]int64, i+1)
+			copy(grown, h.counts)
+			h.counts = grown
+		}
+		h.counts[i] += bucket[1]
+	}
+	return h, nil
+}
@@ -0,0 +1,109 @@
+package models
+
+import (
+	"encoding/json"
+	"math"
+	"math/rand"
+	"os"
+	"sort"
+	"testing"
+)
+
+// bucket indexes shared with python/test_histogram.py, so both sides bucket alike
+type bucketsFixture struct {
+	Values []int64 `json:"values"`
+	Cases  []struct {
+		SignificantDigits int     `json:"significant_digits"`
+		SubBucketBits     int     `json:"sub_bucket_bits"`
+		Indexes           []int64 `json:"indexes"`
+	} `json:"cases"`
+}
+
+func loadBucketsFixture(t *testing.T) bucketsFixture {
+	data, err := os.ReadFile("testdata/histogram_buckets.json")
+	if err != nil {
+		t.Fatal(err)
+	}
+	var fixture bucketsFixture
+	if err := json.Unmarshal(data, &fixture); err != nil {
+		t.Fatal(err)
+	}
+	return fixture
+}
+
+func TestBucketIndexMatchesFixture(t *testing.T) {
+	fixture := loadBucketsFixture(t)
+	for _, c := range fixture.Cases {
+		h := NewHistogram(c.SignificantDigits)
+		if h.SubBucketBits != c.SubBucketBits {
+			t.Fatalf("%d digits: %d sub bucket bits, want %d", c.SignificantDigits, h.SubBucketBits, c.SubBucketBits)
+		}
+		for i, v := range fixture.Values {
+			if got := int64(h.bucketIndex(v)); got != c.Indexes[i] {
+				t.Errorf("%d digits: bucket of %d is %d, want %d", c.SignificantDigits, v, got, c.Indexes[i])
+			}
+			if low, high := h.bucketRange(int(c.Indexes[i])); v < low || v > high {
+				t.Errorf("%d digits: %d outside of its bucket [%d, %d]", c.SignificantDigits, v, low, high)
+			}
+		}
+	}
+}
+
+func lognormalSample(n int) []int64 {
+	rng := rand.New(rand.NewSource(42))
+	values := make([]int64, n)
+	for i := range values {
+		values[i] = int64(math.Exp(math.Log(2e6) + rng.NormFloat64()))
+	}
+	return values
+}
+
+func TestValueAtQuantileWithinBound(t *testing.T) {
+	values := lognormalSample(50000)
+	sorted := append([]int64{}, values...)
+	sort.Slice(sorted, func(i, j int) bool { return sorted[i] < sorted[j] })
+	for _, digits := range []int{1, 2, 3, 4} {
+		h := NewHistogram(digits)
+		for _, v := range values {
+			h.Record(v)
+		}
+		bound := math.Pow(2, -float64(h.SubBucketBits-1))
+		for _, q := range []float64{0, 0.25, 0.5, 0.9, 0.99, 0.999, 1} {
+			rank := int(math.Ceil(q * float64(len(sorted))))
+			if rank < 1 {
+				rank = 1
+			}
+			exact := sorted[rank-1]
+			got := h.ValueAtQuantile(q)
+			if got < exact || float64(got-exact) > bound*float64(exact) {
+				t.Errorf("%d digits: quantile %g is %d, exact %d", digits, q, got, exact)
+			}
+		}
+	}
+}
+
+func TestMergeEqualsWhole(t *testing.T) {
+	values := lognormalSample(20000)
+	whole := NewHistogram(3)
+	merged := NewHistogram(3)
+	for start := 0; start < len(values); start += 3000 {
+		end := start + 3000
+		if end > len(values) {
+			end = len(values)
+		}
+		part := NewHistogram(3)
+		for _, v := range values[start:end] {
+			whole.Record(v)
+			part.Record(v)
+		}
+		if err := merged.Merge(part); err != nil {
+			t.Fatal(err)
+		}
+	}
+	if StatsFromHistogram(merged) != StatsFromHistogram(whole) {
+		t.Errorf("merged %+v, whole %+v", StatsFromHistogram(merged), StatsFromHistogram(whole))
+	}
+	if err := merged.Merge(NewHistogram(2)); err == nil {
+		t.Error("merged histograms of different precision")
+	}
+}
@@ -0,0 +1,141 @@
+package models
+
+import (
+	"fmt"
+	"strings"
+)
+
+// Metric is a number read from every response and recorded as a column of data.bin
+type Metric struct {
+	// column name, at most 32 bytes
+	Name string `yaml:"Name"`
+	// dot separated path of a number in the JSON body, e.g. timings.db or items.0.ms ($. prefix allowed)
+	JSONPath string `yaml:"JSONPath"`
+	// or the name of a response header holding a number
+	Header string `yaml:"Header"`
+	// ns (default), us, ms or s: the value is converted to nanoseconds and analyzed as a duration.
+	// Any other unit (bytes, rows...) is recorded and analyzed as is
+	Unit string `yaml:"Unit"`
+	// shown above the metric's analysis in the report
+	Description string `yaml:"Description"`
+}
+
+// name of the metric the server side duration is read from, also a built-in column
+const QueryDurationColumn = "QueryDuration"
+
+// metrics of tests that do not configure any: the QueryDuration field of the JSON body
+var DefaultMetrics = []Metric{{Name: QueryDurationColumn, JSONPath: QueryDurationColumn}}
+
+// nanoseconds per unit of the duration units
+var durationUnits = map[string]int64{"": 1, "ns": 1, "us": 1000, "ms": 1000000, "s": 1000000000}
+
+// Scale is the factor applied to the values read, 0 when the metric is not a duration
+func (m Metric) Scale() int64 {
+	return durationUnits[m.Unit]
+}
+
+// ResponseMetrics are the metrics read from the responses of test
+func (t Test) ResponseMetrics() []Metric {
+	if len(t.Metrics) == 0 {
+		return DefaultMetrics
+	}
+	return t.Metrics
+}
+
+// ExtraMetrics are the metrics recorded in their own column after the built-in ones,
+// every metric but QueryDuration
+func (t Test) ExtraMetrics() []Metric {
+	extra := []Metric{}
+	for _, metric := range t.ResponseMetrics() {
+		if metric.Name != QueryDurationColumn {
+			extra = append(extra, metric)
+		}
+	}
+	return extra
+}
+
+// records QueryDuration, from the default metric or one configured with that name
+func (t Test) recordsQueryDuration() bool {
+	for _, metric := range t.ResponseMetrics() {
+		if metric.Name == QueryDurationColumn {
+			return true
+		}
+	}
+	return false
+}
+
+// ValidateMetrics checks that the metrics of test can be recorded
+func (t Test) ValidateMetrics() error {
+	names := map[string]bool{}
+	for _, column := range RawDataColumns {
+		names[column] = true
+	}
+	names[ResponseTimeColumn] = true
+	for _, metric := range t.ResponseMetrics() {
+		if metric.Name == "" || len(metric.Name) > rawDataColumnNameSize {
+			return fmt.Errorf("metric names must have 1 to %d bytes: %q", rawDataColumnNameSize, metric.Name)
+		}
+		if names[metric.Name] && metric.Name != QueryDurationColumn {
+			return fmt.Errorf("metric %s has the name of a built-in column", metric.Name)
+		}
+		if (metric.JSONPath == "") == (metric.Header == "") {
+			return fmt.Errorf("metric %s needs either a JSONPath or a Header", metric.Name)
+		}
+		names[metric.Name] = true
+	}
+	return nil
+}
+
+// RawDataSchema describes the columns of data.bin and how they were measured, the
+// analyzer discovers the analyses of a run from it
+type RawDataSchema struct {
+	Columns []string `json:"columns"`
+	// analyzed columns, in report order
+	Metrics []MetricSchema `json:"metrics"`
+	// names of the ErrorClass values, by value
+	ErrorClasses []string `json:"error_classes"`
+}
+
+type MetricSchema struct {
+	Name string `json:"name"`
+	// json, header, or builtin for the columns measured by the runner
+	Source string `json:"source"`
+	Path   string `json:"path,omitempty"`
+	// ns for durations, whatever the configured unit was
+	Unit        string `json:"unit"`
+	Description string `json:"description,omitempty"`
+}
+
+// NewRawDataSchema is the schema of the raw data recorded for test
+func NewRawDataSchema(test Test) RawDataSchema {
+	schema := RawDataSchema{Columns: RawDataColumnsFor(test), ErrorClasses: ErrorClassNames}
+	for _, metric := range test.ResponseMetrics() {
+		m := MetricSchema{Name: metric.Name, Source: "json", Path: strings.TrimPrefix(metric.JSONPath, "$."), Unit: "ns", Description: metric.Description}
+		if metric.Header != "" {
+			m.Source = "header"
+			m.Path = metric.Header
+		}
+		if metric.Scale() == 0 {
+			m.Unit = metric.Unit
+		}
+		schema.Metrics = append(schema.Metrics, m)
+	}
+	schema.Metrics = append(schema.Metrics,
+		MetricSchema{Name: "RequestDuration", Source: "builtin", Unit: "ns"},
+		MetricSchema{Name: TimeToFirstByteColumn, Source: "builtin", Unit: "ns"},
+		MetricSchema{Name: ResponseBytesColumn, Source: "builtin", Unit: "bytes"},
+	)
+	if test.TestMode == ArrivalRateTestMode {
+		schema.Metrics = append(schema.Metrics, MetricSchema{Name: ResponseTimeColumn, Source: "builtin", Unit: "ns"})
+	}
+	return schema
+}
+
+// columns with a histogram saved next to benchmark.json, the analyzed metrics
+func (s RawDataSchema) histogramColumns() []string {
+	names := []string{}
+	for _, metric := range s.Metrics {
+		names = append(names, metric.Name)
+	}
+	return names
+}
@@ -0,0 +1,131 @@
+package models
+
+import (
+	"bufio"
+	"encoding/binary"
+	"fmt"
+	"os"
+)
+
+// Binary raw data file (data.bin) layout, all integers little-endian:
+//
+//	header: magic "APTRAW01" | uint32 column count | uint32 reserved | column names (32 bytes each, zero padded)
+//	blocks: int64 row count | column 0 values | column 1 values | ... (one int64 per row and column)
+//
+// Columns are stored one after the other inside a block so the analyzer can
+// memory-map them as int64 arrays without parsing anything.
+const (
+	RawDataFileName       = "data.bin"
+	rawDataMagic          = "APTRAW01"
+	rawDataColumnNameSize = 32
+)
+
+// RawDataColumns are the built-in columns written for every StatData, in file order.
+// data.csv only has the first four, and only the rows of successful requests
+var RawDataColumns = []string{"StartTime", "EndTime", QueryDurationColumn, "RequestDuration", "IntendedStartTime",
+	"StatusCode", ResponseBytesColumn, TimeToFirstByteColumn, ErrorClassColumn}
+
+// RawDataColumnsFor are the columns of the raw data of test: the built-in ones, then
+// one per extra metric
+func RawDataColumnsFor(test Test) []string {
+	columns := append([]string{}, RawDataColumns...)
+	for _, metric := range test.ExtraMetrics() {
+		columns = append(columns, metric.Name)
+	}
+	return columns
+}
+
+type RawDataWriter struct {
+	file    *os.File
+	writer  *bufio.Writer
+	columns []string
+	scratch [8]byte
+}
+
+// create a raw data file and write its header
+func CreateRawDataFile(path string, columns []string) (*RawDataWriter, error) {
+	file, err := os.Create(path)
+	if err != nil {
+		return nil, err
+	}
+	rw := &RawDataWriter{file: file, writer: bufio.NewWriterSize(file, 1<<20), columns: columns}
+
+	header := make([]byte, 16+rawDataColumnNameSize*len(columns))
+	copy(header, rawDataMagic)
+	binary.LittleEndian.PutUint32(header[8:], uint32(len(columns)))
+	for i, column := range columns {
+		if len(column) > rawDataColumnNameSize {
+			file.Close()
+			return nil, fmt.Errorf("column name %s is longer than %d bytes", column, rawDataColumnNameSize)
+		}
+		copy(header[16+i*rawDataColumnNameSize:], column)
+	}
+	if _, err := rw.writer.Write(header); err != nil {
+		file.Close()
+		return nil, err
+	}
+	return rw, nil
+}
+
+func (rw *RawDataWriter) writeInt64(v int64) error {
+	binary.LittleEndian.PutUint64(rw.scratch[:], uint64(v))
+	_, err := rw.writer.Write(rw.scratch[:])
+	return err
+}
+
+// write one block, columns[i] holds the values of column i
+func (rw *RawDataWriter) WriteBlock(columns [][]int64) error {
+	if len(columns) != len(rw.columns) {
+		return fmt.Errorf("expected %d columns, got %d", len(rw.columns), len(columns))
+	}
+	rows := len(columns[0])
+	for _, column := range columns {
+		if len(column) != rows {
+			return fmt.Errorf("all columns of a block must have the same length")
+		}
+	}
+	if err := rw.writeInt64(int64(rows)); err != nil {
+		return err
+	}
+	for _, column := range columns {
+		for _, v := range column {
+			if err := rw.writeInt64(v); err != nil {
+				return err
+			}
+		}
+	}
+	return nil
+}
+
+// write stats as one block without building intermediate column slices
+func (rw *RawDataWriter) WriteStatData(stats []StatData) error {
+	if err := rw.writeInt64(int64(len(stats))); err != nil {
+		return err
+	}
+	for column := range rw.columns {
+		for i := range stats {
+			if err := rw.writeInt64(stats[i].column(column)); err != nil {
+				return err
+			}
+		}
+	}
+	return nil
+}
+
+// hand buffered blocks to the OS so readers of the file see them, without closing it
+func (rw *RawDataWriter) Flush() error {
+	return rw.writer.Flush()
+}
+
+// flush buffered blocks to disk and close the file
+func (rw *RawDataWriter) Close() error {
+	if err := rw.writer.Flush(); err != nil {
+		rw.file.Close()
+		return err
+	}
+	if err := rw.file.Sync(); err != nil {
+		rw.file.Close()
+		return err
+	}
+	return rw.file.Close()
+}
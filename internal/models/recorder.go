@@ -0,0 +1,480 @@
+package models
+
+import (
+	"bufio"
+	"fmt"
+	"os"
+	"strconv"
+	"sync"
+	"sync/atomic"
+	"time"
+)
+
+// Recorder collects the samples of a running test without keeping them in memory.
+//
+// Every worker records into its own RecorderShard: fixed size column buffers, and
+// latency histograms updated as samples arrive, so the summary statistics never need
+// the full sample set. Full buffers are handed to a background goroutine that appends
+// them to data.bin and data.csv and gives them back for reuse. Every flush interval it
+// also copies out the rows of every shard's partly filled buffer, so the samples of
+// idle or hung workers reach data.bin as well. Recording takes no lock: the worker is
+// the only writer of its buffer and publishes its row count atomically, the goroutine
+// claims the rows it copies with a compare-and-swap. A shard keeps at most
+// recorderBacklogLength full buffers the goroutine could not take at once, so memory
+// is bounded by the number of buffers whatever the test duration, and the load
+// generator hardly allocates while the test runs, so its own GC pauses do not show
+// up in the measured latencies.
+//
+// data.bin is flushed every LiveFlushInterval, so python/live.py can follow the run.
+type Recorder struct {
+	interval time.Duration
+	digits   int
+	schema   RawDataSchema
+	// column of every histogram, -1 for ResponseTime (EndTime - IntendedStartTime)
+	histogramColumns []int
+
+	full    chan *sampleBuffer
+	free    chan *sampleBuffer
+	stopped chan struct{}
+	bin     *RawDataWriter
+	csvFile *os.File
+	csv     *bufio.Writer
+	// first write error of the spill goroutine
+	err error
+	// full buffers a shard could not hand off at once, the queue was full
+	stalls int64
+
+	// open shards, their buffers are collected every interval
+	mu     sync.Mutex
+	shards []*RecorderShard
+	// filled by RecorderShard.Close
+	rows       int
+	errors     []int
+	histograms []*Histogram
+	// first error merging the histograms of a shard, returned by Stop
+	closeErr error
+}
+
+const (
+	// rows of a shard buffer (9 int64 columns and the extra metrics, 288KB and more)
+	recorderBufferRows = 4096
+	// full buffers waiting to be written. When the disk cannot keep up, a worker keeps
+	// its full buffers and goes on in a spare one instead of waiting, see Stalls
+	recorderQueueLength = 64
+	// full buffers a shard keeps when the queue is full, it waits once it has that many
+	recorderBacklogLength = 8
+)
+
+// DefaultLiveFlushInterval is used when a test does not set LiveFlushInterval
+const DefaultLiveFlushInterval = time.Second
+
+type sampleBuffer struct {
+	columns [][]int64
+	// rows recorded, stored atomically by the worker after each sample
+	rows int64
+	// rows copied out by the spill goroutine, handedOff once the worker gave the buffer up
+	drained int64
+	// first row still to be written, set when the buffer is handed off
+	from int64
+}
+
+// drained of a buffer its worker handed off or closed
+const handedOff = -1
+
+func newSampleBuffer(columnCount int) *sampleBuffer {
+	columns := make([][]int64, columnCount)
+	for i := range columns {
+		columns[i] = make([]int64, recorderBufferRows)
+	}
+	return &sampleBuffer{columns: columns}
+}
+
+// NewRecorder creates folder/data.bin and folder/data.csv and starts writing the samples
+// recorded for test to them
+func NewRecorder(test Test, folder string) (*Recorder, error) {
+	interval := time.Duration(test.LiveFlushInterval * float64(time.Second))
+	if interval <= 0 {
+		interval = DefaultLiveFlushInterval
+	}
+	if _, err := os.Stat(folder); os.IsNotExist(err) {
+		os.MkdirAll(folder, 0755)
+	}
+	schema := NewRawDataSchema(test)
+	bin, err := CreateRawDataFile(folder+RawDataFileName, schema.Columns)
+	if err != nil {
+		return nil, err
+	}
+	// the header is visible right away, readers wait for the first block
+	if err := bin.Flush(); err != nil {
+		bin.Close()
+		return nil, err
+	}
+	csvFile, err := os.Create(folder + "data.csv")
+	if err != nil {
+		bin.Close()
+		return nil, err
+	}
+	r := &Recorder{
+		interval: interval,
+		digits:   test.HistogramSignificantDigits,
+		schema:   schema,
+		full:     make(chan *sampleBuffer, recorderQueueLength),
+		free:     make(chan *sampleBuffer, recorderQueueLength),
+		stopped:  make(chan struct{}),
+		bin:      bin,
+		csvFile:  csvFile,
+		csv:      bufio.NewWriterSize(csvFile, 1<<20),
+		errors:   make([]int, len(ErrorClassNames)),
+	}
+	for _, name := range schema.histogramColumns() {
+		column := -1
+		for i, c := range schema.Columns {
+			if c == name {
+				column = i
+			}
+		}
+		r.histogramColumns = append(r.histogramColumns, column)
+		r.histograms = append(r.histograms, NewHistogram(test.HistogramSignificantDigits))
+	}
+	go r.spill()
+	return r, nil
+}
+
+// writes the buffers handed off by the shards, several small buffers make one block
+func (r *Recorder) spill() {
+	defer close(r.stopped)
+	ticker := time.NewTicker(r.interval)
+	defer ticker.Stop()
+	pending := []*sampleBuffer{}
+	pendingRows := 0
+	write := func(flush bool) {
+		if len(pending) > 0 && r.err == nil {
+			r.err = r.writeBlock(pending, pendingRows)
+		}
+		for _, buffer := range pending {
+			buffer.rows, buffer.drained, buffer.from = 0, 0, 0
+			select {
+			case r.free <- buffer:
+			default:
+			}
+		}
+		pending = pending[:0]
+		pendingRows = 0
+		if flush && r.err == nil {
+			r.err = r.bin.Flush()
+		}
+	}
+	for {
+		select {
+		case buffer, ok := <-r.full:
+			if !ok {
+				write(false)
+				return
+			}
+			pending = append(pending, buffer)
+			pendingRows += int(buffer.rows - buffer.from)
+			if pendingRows >= recorderBufferRows {
+				write(false)
+			}
+		case <-ticker.C:
+			for _, s := range r.openShards() {
+				pending, pendingRows = s.drain(pending, pendingRows)
+			}
+			write(true)
+		}
+	}
+}
+
+func (r *Recorder) openShards() []*RecorderShard {
+	r.mu.Lock()
+	defer r.mu.Unlock()
+	return append([]*RecorderShard{}, r.shards...)
+}
+
+// one data.bin block holding the rows of buffers, and the same rows in data.csv
+func (r *Recorder) writeBlock(buffers []*sampleBuffer, rows int) error {
+	if err := r.bin.writeInt64(int64(rows)); err != nil {
+		return err
+	}
+	for column := range r.schema.Columns {
+		for _, buffer := range buffers {
+			for _, v := range buffer.columns[column][buffer.from:buffer.rows] {
+				if err := r.bin.writeInt64(v); err != nil {
+					return err
+				}
+			}
+		}
+	}
+	// data.csv keeps its four columns and the successful requests, formatted into one reused buffer
+	var line [128]byte
+	errorClass := errorClassIndex()
+	for _, buffer := range buffers {
+		for i := buffer.from; i < buffer.rows; i++ {
+			if buffer.columns[errorClass][i] != NoError {
+				continue
+			}
+			b := line[:0]
+			for column := 0; column < 4; column++ {
+				if column > 0 {
+					b = append(b, ',')
+				}
+				b = strconv.AppendInt(b, buffer.columns[column][i], 10)
+			}
+			b = append(b, '\n')
+			if _, err := r.csv.Write(b); err != nil {
+				return err
+			}
+		}
+	}
+	return nil
+}
+
+func (r *Recorder) buffer() *sampleBuffer {
+	select {
+	case buffer := <-r.free:
+		return buffer
+	default:
+		return newSampleBuffer(len(r.schema.Columns))
+	}
+}
+
+// position of the ErrorClass column in RawDataColumns
+func errorClassIndex() int {
+	for i, column := range RawDataColumns {
+		if column == ErrorClassColumn {
+			return i
+		}
+	}
+	return -1
+}
+
+// Shard returns the recorder of one worker, it must only be used by that worker
+func (r *Recorder) Shard() *RecorderShard {
+	s := &RecorderShard{
+		recorder: r,
+		current:  r.buffer(),
+		errors:   make([]int, len(ErrorClassNames)),
+	}
+	s.buffer.Store(s.current)
+	for range r.histogramColumns {
+		s.histograms = append(s.histograms, NewHistogram(r.digits))
+	}
+	r.mu.Lock()
+	r.shards = append(r.shards, s)
+	r.mu.Unlock()
+	return s
+}
+
+// Stop writes the remaining samples and closes data.bin and data.csv. Every shard
+// must be closed first.
+func (r *Recorder) Stop() error {
+	close(r.full)
+	<-r.stopped
+	binErr := r.bin.Close()
+	csvErr := r.csv.Flush()
+	if csvErr == nil {
+		csvErr = r.csvFile.Sync()
+	}
+	r.csvFile.Close()
+	if r.err != nil {
+		return r.err
+	}
+	r.mu.Lock()
+	closeErr := r.closeErr
+	r.mu.Unlock()
+	if closeErr != nil {
+		return closeErr
+	}
+	if binErr != nil {
+		return binErr
+	}
+	return csvErr
+}
+
+// Stalls is the number of full buffers the shards could not hand off right away
+// because the spill goroutine was behind. They were kept by their shard, which went
+// on recording in a spare buffer, so no sample was lost, but many stalls mean the
+// disk is too slow for the request rate. A shard holding recorderBacklogLength
+// buffers waits for the disk before it records again.
+func (r *Recorder) Stalls() int64 {
+	return atomic.LoadInt64(&r.stalls)
+}
+
+// Rows is the number of successful requests recorded by the closed shards
+func (r *Recorder) Rows() int {
+	r.mu.Lock()
+	defer r.mu.Unlock()
+	return r.rows
+}
+
+// ErrorsByClass are the failed requests recorded by the closed shards, by error class name
+func (r *Recorder) ErrorsByClass() map[string]int {
+	r.mu.Lock()
+	defer r.mu.Unlock()
+	return errorsByClass(r.errors)
+}
+
+func errorsByClass(counts []int) map[string]int {
+	errors := map[string]int{}
+	for class, count := range counts {
+		if class != NoError && count > 0 {
+			errors[ErrorClassNames[class]] = count
+		}
+	}
+	return errors
+}
+
+// Schema describes the columns written to data.bin
+func (r *Recorder) Schema() RawDataSchema {
+	return r.schema
+}
+
+// RecorderShard records the samples of one worker
+type RecorderShard struct {
+	recorder *Recorder
+	// buffer being filled, only used by the worker
+	current *sampleBuffer
+	// current, for the spill goroutine to copy its rows every flush interval
+	buffer atomic.Pointer[sampleBuffer]
+	// full buffers kept while the queue was full, taken by the spill goroutine
+	backlog [recorderBacklogLength]atomic.Pointer[sampleBuffer]
+	// used by the worker only
+	rows       int
+	errors     []int
+	histograms []*Histogram
+}
+
+// Add records one sample, failed requests go to data.bin with their ErrorClass but are
+// left out of the histograms and data.csv
+func (s *RecorderShard) Add(stat StatData) {
+	buffer := s.current
+	row := buffer.rows
+	for column := range buffer.columns {
+		buffer.columns[column][row] = stat.column(column)
+	}
+	atomic.StoreInt64(&buffer.rows, row+1)
+	if row+1 == recorderBufferRows {
+		// the rows the spill goroutine has not copied out go with the buffer
+		buffer.from = atomic.SwapInt64(&buffer.drained, handedOff)
+		s.current = s.recorder.buffer()
+		s.buffer.Store(s.current)
+		if buffer.from < buffer.rows {
+			s.handOff(buffer)
+		}
+	}
+	if stat.ErrorClass != NoError {
+		s.errors[stat.ErrorClass]++
+	} else {
+		s.rows++
+		for i, column := range s.recorder.histogramColumns {
+			if column < 0 {
+				s.histograms[i].Record(stat.ResponseTime())
+			} else {
+				s.histograms[i].Record(stat.column(column))
+			}
+		}
+	}
+}
+
+// queues a full buffer without waiting. When the queue is full the buffer goes to a
+// free backlog slot, with every slot taken the worker waits for the queue.
+func (s *RecorderShard) handOff(buffer *sampleBuffer) {
+	select {
+	case s.recorder.full <- buffer:
+		return
+	default:
+	}
+	atomic.AddInt64(&s.recorder.stalls, 1)
+	for i := range s.backlog {
+		if s.backlog[i].CompareAndSwap(nil, buffer) {
+			return
+		}
+	}
+	s.recorder.full <- buffer
+}
+
+// takes the backlog and copies the samples recorded since the last drain to the end of
+// pending. Copying keeps the buffers in use by the shards, instead of replacing one per
+// shard every interval. Runs on the spill goroutine, next to the worker.
+func (s *RecorderShard) drain(pending []*sampleBuffer, pendingRows int) ([]*sampleBuffer, int) {
+	for i := range s.backlog {
+		if buffer := s.backlog[i].Swap(nil); buffer != nil {
+			pending = append(pending, buffer)
+			pendingRows += int(buffer.rows - buffer.from)
+		}
+	}
+	buffer := s.buffer.Load()
+	if buffer == nil {
+		return pending, pendingRows
+	}
+	rows := atomic.LoadInt64(&buffer.rows)
+	from := atomic.LoadInt64(&buffer.drained)
+	// whoever moves drained first owns the rows: a worker handing the buffer off
+	// meanwhile sends only the rows after the ones claimed here
+	if from == handedOff || from == rows || !atomic.CompareAndSwapInt64(&buffer.drained, from, rows) {
+		return pending, pendingRows
+	}
+	for from < rows {
+		if len(pending) == 0 || pending[len(pending)-1].rows == recorderBufferRows {
+			pending = append(pending, s.recorder.buffer())
+		}
+		last := pending[len(pending)-1]
+		n := rows - from
+		if n > recorderBufferRows-last.rows {
+			n = recorderBufferRows - last.rows
+		}
+		for column := range last.columns {
+			copy(last.columns[column][last.rows:], buffer.columns[column][from:from+n])
+		}
+		last.rows += n
+		pendingRows += int(n)
+		from += n
+	}
+	return pending, pendingRows
+}
+
+// Close hands off the remaining samples and adds the shard's histograms to the recorder.
+// An error merging them is also returned by Recorder.Stop.
+func (s *RecorderShard) Close() error {
+	r := s.recorder
+	r.mu.Lock()
+	for i, shard := range r.shards {
+		if shard == s {
+			r.shards = append(r.shards[:i], r.shards[i+1:]...)
+			break
+		}
+	}
+	r.mu.Unlock()
+	// the spill goroutine may still be draining the shard
+	s.buffer.Store(nil)
+	s.current.from = atomic.SwapInt64(&s.current.drained, handedOff)
+	buffers := []*sampleBuffer{s.current}
+	s.current = nil
+	for i := range s.backlog {
+		if buffer := s.backlog[i].Swap(nil); buffer != nil {
+			buffers = append(buffers, buffer)
+		}
+	}
+	// the worker is done measuring, it can wait for the queue
+	for _, buffer := range buffers {
+		if buffer.rows > buffer.from {
+			r.full <- buffer
+		}
+	}
+	r.mu.Lock()
+	defer r.mu.Unlock()
+	r.rows += s.rows
+	for class, count := range s.errors {
+		r.errors[class] += count
+	}
+	for i, h := range s.histograms {
+		if err := r.histograms[i].Merge(h); err != nil {
+			err = fmt.Errorf("merging the %s histogram of a worker: %w", r.schema.histogramColumns()[i], err)
+			if r.closeErr == nil {
+				r.closeErr = err
+			}
+			return err
+		}
+	}
+	return nil
+}
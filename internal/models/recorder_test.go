@@ -0,0 +1,205 @@
+package models
+
+import (
+	"encoding/binary"
+	"os"
+	"sort"
+	"sync"
+	"testing"
+	"time"
+)
+
+// the StartTime column of every block of a data.bin
+func readStartTimes(t *testing.T, path string) []int64 {
+	data, err := os.ReadFile(path)
+	if err != nil {
+		t.Fatal(err)
+	}
+	columns := int(binary.LittleEndian.Uint32(data[8:]))
+	offset := 16 + rawDataColumnNameSize*columns
+	starts := []int64{}
+	// a block being written may be incomplete
+	for offset+8 <= len(data) {
+		rows := int(binary.LittleEndian.Uint64(data[offset:]))
+		if offset+8+rows*8*columns > len(data) {
+			break
+		}
+		for i := 0; i < rows; i++ {
+			starts = append(starts, int64(binary.LittleEndian.Uint64(data[offset+8+i*8:])))
+		}
+		offset += 8 + rows*8*columns
+	}
+	return starts
+}
+
+func sample(start int64) StatData {
+	return StatData{StartTimestamp: start, EndTimestamp: start + 1000, IntendedStartTimestamp: start, RequestDuration: 1000, StatusCode: 200}
+}
+
+func TestIdleShardIsFlushed(t *testing.T) {
+	folder := t.TempDir() + "/"
+	recorder, err := NewRecorder(Test{LiveFlushInterval: 0.02}, folder)
+	if err != nil {
+		t.Fatal(err)
+	}
+	shard := recorder.Shard()
+	for i := int64(1); i <= 10; i++ {
+		shard.Add(sample(i))
+	}
+	// the worker is stuck in a request: its samples are written anyway
+	deadline := time.Now().Add(5 * time.Second)
+	for len(readStartTimes(t, folder+RawDataFileName)) < 10 {
+		if time.Now().After(deadline) {
+			t.Fatal("samples of an idle shard were not written")
+		}
+		time.Sleep(10 * time.Millisecond)
+	}
+	shard.Add(sample(11))
+	shard.Close()
+	if err := recorder.Stop(); err != nil {
+		t.Fatal(err)
+	}
+	if starts := readStartTimes(t, folder+RawDataFileName); len(starts) != 11 || recorder.Rows() != 11 {
+		t.Errorf("%d rows written, %d recorded, want 11", len(starts), recorder.Rows())
+	}
+}
+
+func TestEverySampleWrittenOnce(t *testing.T) {
+	folder := t.TempDir() + "/"
+	// flushes while the workers record, to mix drained and handed off buffers
+	recorder, err := NewRecorder(Test{LiveFlushInterval: 0.001}, folder)
+	if err != nil {
+		t.Fatal(err)
+	}
+	const workers, samples = 8, 3*recorderBufferRows + 123
+	wg := &sync.WaitGroup{}
+	for w := 0; w < workers; w++ {
+		wg.Add(1)
+		go func(w int) {
+			defer wg.Done()
+			shard := recorder.Shard()
+			defer shard.Close()
+			for i := 0; i < samples; i++ {
+				shard.Add(sample(int64(w*samples + i)))
+				if i%1000 == 0 {
+					time.Sleep(time.Millisecond)
+				}
+			}
+		}(w)
+	}
+	wg.Wait()
+	if err := recorder.Stop(); err != nil {
+		t.Fatal(err)
+	}
+	starts := readStartTimes(t, folder+RawDataFileName)
+	sort.Slice(starts, func(i, j int) bool { return starts[i] < starts[j] })
+	if len(starts) != workers*samples {
+		t.Fatalf("%d rows written, want %d", len(starts), workers*samples)
+	}
+	for i, start := range starts {
+		if start != int64(i) {
+			t.Fatalf("row %d has StartTime %d", i, start)
+		}
+	}
+}
+
+func TestFullQueueDoesNotBlock(t *testing.T) {
+	// a recorder whose spill goroutine never reads its one place queue
+	recorder := &Recorder{
+		schema: NewRawDataSchema(Test{}),
+		full:   make(chan *sampleBuffer, 1),
+		free:   make(chan *sampleBuffer, 1),
+		errors: make([]int, len(ErrorClassNames)),
+	}
+	shard := recorder.Shard()
+	done := make(chan struct{})
+	go func() {
+		defer close(done)
+		for i := 0; i < 3*recorderBufferRows+1; i++ {
+			shard.Add(sample(int64(i)))
+		}
+	}()
+	select {
+	case <-done:
+	case <-time.After(5 * time.Second):
+		t.Fatal("Add waited for the queue")
+	}
+	// the first full buffer was queued, the next two were kept
+	if stalls := recorder.Stalls(); stalls != 2 {
+		t.Errorf("%d stalls, want 2", stalls)
+	}
+	if queued := <-recorder.full; queued.rows != recorderBufferRows {
+		t.Errorf("queued %d rows", queued.rows)
+	}
+	pending, rows := shard.drain(nil, 0)
+	if len(pending) != 3 || rows != 2*recorderBufferRows+1 {
+		t.Errorf("drained %d buffers and %d rows, want 3 and %d", len(pending), rows, 2*recorderBufferRows+1)
+	}
+}
+
+func TestFullBacklogWaits(t *testing.T) {
+	recorder := &Recorder{
+		schema: NewRawDataSchema(Test{}),
+		full:   make(chan *sampleBuffer, 1),
+		free:   make(chan *sampleBuffer, 1),
+		errors: make([]int, len(ErrorClassNames)),
+	}
+	shard := recorder.Shard()
+	done := make(chan struct{})
+	go func() {
+		defer close(done)
+		// one buffer queued, a full backlog and one more
+		for i := 0; i < (recorderBacklogLength+2)*recorderBufferRows; i++ {
+			shard.Add(sample(int64(i)))
+		}
+	}()
+	select {
+	case <-done:
+		t.Fatal("the backlog grew past recorderBacklogLength")
+	case <-time.After(100 * time.Millisecond):
+	}
+	<-recorder.full
+	select {
+	case <-done:
+	case <-time.After(5 * time.Second):
+		t.Fatal("Add still waits with room in the queue")
+	}
+	if pending, _ := shard.drain(nil, 0); len(pending) != recorderBacklogLength {
+		t.Errorf("%d buffers kept, want %d", len(pending), recorderBacklogLength)
+	}
+}
+
+func TestCloseErrorReachesStop(t *testing.T) {
+	recorder, err := NewRecorder(Test{HistogramSignificantDigits: 3}, t.TempDir()+"/")
+	if err != nil {
+		t.Fatal(err)
+	}
+	shard := recorder.Shard()
+	shard.Add(sample(1))
+	// histograms of another precision cannot be merged
+	recorder.histograms[0] = NewHistogram(2)
+	if err := shard.Close(); err == nil {
+		t.Error("Close merged histograms of different precision")
+	}
+	if err := recorder.Stop(); err == nil {
+		t.Error("Stop did not return the error of Close")
+	}
+}
+
+func BenchmarkShardAdd(b *testing.B) {
+	recorder, err := NewRecorder(Test{}, b.TempDir()+"/")
+	if err != nil {
+		b.Fatal(err)
+	}
+	b.ReportAllocs()
+	b.RunParallel(func(pb *testing.PB) {
+		shard := recorder.Shard()
+		defer shard.Close()
+		for i := int64(0); pb.Next(); i++ {
+			shard.Add(sample(i))
+		}
+	})
+	if err := recorder.Stop(); err != nil {
+		b.Fatal(err)
+	}
+}
@@ -0,0 +1,202 @@
+package models
+
+import (
+	"fmt"
+	"math"
+)
+
+// Stage is a period of a staged test at one load level: ConcurrentRequests workers
+// in the closed-loop modes, TargetRPS requests per second in arrival-rate mode
+type Stage struct {
+	Name string `yaml:"Name" json:"name"`
+	// seconds
+	Duration           float64 `yaml:"Duration" json:"duration"`
+	ConcurrentRequests int     `yaml:"ConcurrentRequests" json:"concurrent_requests,omitempty"`
+	TargetRPS          float64 `yaml:"TargetRPS" json:"target_rps,omitempty"`
+	// go linearly from the level of the previous stage (0 for the first) to this one
+	// during the stage, instead of switching at its start
+	Ramp bool `yaml:"Ramp" json:"ramp,omitempty"`
+}
+
+// LoadProfile generates the stages of a test from a few numbers, levels are
+// concurrent requests or requests per second like those of the stages
+type LoadProfile struct {
+	// step: From, From+Step, ... up to To, StageDuration seconds each.
+	// ramp: the same levels, each stage rising linearly from the previous one (from 0 for the first).
+	// spike: From for StageDuration, To for SpikeDuration, then From again for StageDuration
+	Type          string  `yaml:"Type"`
+	From          float64 `yaml:"From"`
+	To            float64 `yaml:"To"`
+	Step          float64 `yaml:"Step"`
+	StageDuration float64 `yaml:"StageDuration"`
+	SpikeDuration float64 `yaml:"SpikeDuration"`
+}
+
+// LoadStages are the stages of test, from Stages or generated from LoadProfile, nil
+// for tests that keep one load level
+func (t Test) LoadStages() ([]Stage, error) {
+	if len(t.Stages) > 0 || t.LoadProfile == nil {
+		return t.Stages, nil
+	}
+	profile := t.LoadProfile
+	if profile.StageDuration <= 0 {
+		return nil, fmt.Errorf("LoadProfile needs a StageDuration")
+	}
+	switch profile.Type {
+	case "step", "ramp":
+		if profile.Step <= 0 || profile.To < profile.From {
+			return nil, fmt.Errorf("%s LoadProfile needs a positive Step and To >= From", profile.Type)
+		}
+		stages := []Stage{}
+		for level := profile.From; ; level += profile.Step {
+			// the last stage is at To even when it is not a multiple of Step away
+			last := level >= profile.To-profile.Step*1e-9
+			if last {
+				level = profile.To
+			}
+			stage := t.levelStage(level, profile.StageDuration)
+			stage.Ramp = profile.Type == "ramp"
+			stages = append(stages, stage)
+			if last {
+				return stages, nil
+			}
+		}
+	case "spike":
+		if profile.SpikeDuration <= 0 {
+			return nil, fmt.Errorf("spike LoadProfile needs a SpikeDuration")
+		}
+		return []Stage{
+			t.levelStage(profile.From, profile.StageDuration),
+			t.levelStage(profile.To, profile.SpikeDuration),
+			t.levelStage(profile.From, profile.StageDuration),
+		}, nil
+	}
+	return nil, fmt.Errorf("unknown LoadProfile type %q (step, ramp or spike)", profile.Type)
+}
+
+// stage at level in the test's mode, named after the level
+func (t Test) levelStage(level float64, duration float64) Stage {
+	if t.TestMode == ArrivalRateTestMode {
+		return Stage{Name: fmt.Sprintf("%g rps", level), Duration: duration, TargetRPS: level}
+	}
+	return Stage{Name: fmt.Sprintf("%d workers", int(math.Round(level))), Duration: duration, ConcurrentRequests: int(math.Round(level))}
+}
+
+// WithStages returns test with its stages expanded and checked, TestDuration set to
+// their total and ConcurrentRequests (closed loop) or TargetRPS (arrival-rate) to the
+// highest level, so the runners size their workers for the busiest stage. Staged
+// tests run in concurrent or arrival-rate mode, a TestDuration other than the total
+// of the stages is an error rather than being replaced.
+func (t Test) WithStages() (Test, error) {
+	stages, err := t.LoadStages()
+	if err != nil || len(stages) == 0 {
+		return t, err
+	}
+	if t.TestMode != "concurrent" && t.TestMode != ArrivalRateTestMode {
+		// continious tests run a single worker, stages need several
+		return t, fmt.Errorf("stages need TestMode concurrent or %s, not %q", ArrivalRateTestMode, t.TestMode)
+	}
+	total := 0.0
+	for i, stage := range stages {
+		if stage.Duration <= 0 {
+			return t, fmt.Errorf("stage %d has no Duration", i+1)
+		}
+		if stage.ConcurrentRequests < 0 || stage.TargetRPS < 0 {
+			return t, fmt.Errorf("stage %d has a negative load level", i+1)
+		}
+		if stage.Name == "" {
+			stages[i].Name = fmt.Sprintf("stage %d", i+1)
+		}
+		total += stage.Duration
+	}
+	if t.TestDuration != 0 && t.TestDuration != int(math.Ceil(total)) {
+		return t, fmt.Errorf("TestDuration is %d seconds but the stages last %g, leave it out of staged tests", t.TestDuration, total)
+	}
+	t.Stages = stages
+	t.LoadProfile = nil
+	t.TestDuration = int(math.Ceil(total))
+	if t.TestMode == ArrivalRateTestMode {
+		t.TargetRPS = t.maxStageLevel()
+		// the rates of the stages replace the ramp of the test
+		t.StartRPS = 0
+		t.RampDuration = 0
+	} else {
+		t.ConcurrentRequests = int(t.maxStageLevel())
+	}
+	if t.maxStageLevel() <= 0 {
+		return t, fmt.Errorf("every stage has a load level of 0")
+	}
+	return t, nil
+}
+
+// StageLevel is the load level of stage i: concurrent requests, or requests per
+// second in arrival-rate mode
+func (t Test) StageLevel(i int) float64 {
+	if t.TestMode == ArrivalRateTestMode {
+		return t.Stages[i].TargetRPS
+	}
+	return float64(t.Stages[i].ConcurrentRequests)
+}
+
+func (t Test) maxStageLevel() float64 {
+	level := 0.0
+	for i := range t.Stages {
+		level = math.Max(level, t.StageLevel(i))
+	}
+	return level
+}
+
+// WorkerChange is a change of the number of workers sending in a staged closed-loop
+// test, Offset seconds after its start
+type WorkerChange struct {
+	Offset  float64
+	Workers int
+}
+
+// WorkerChanges are the changes of the number of workers sending in a staged
+// closed-loop test, in order: at the start of every stage, every time a ramp
+// crosses a whole number of workers (LevelAt rounded) and to 0 after the last stage
+func (t Test) WorkerChanges() []WorkerChange {
+	changes := []WorkerChange{}
+	start := 0.0
+	previous := 0.0
+	for i, stage := range t.Stages {
+		level := t.StageLevel(i)
+		if !stage.Ramp {
+			changes = append(changes, WorkerChange{start, int(math.Round(level))})
+		} else {
+			changes = append(changes, WorkerChange{start, int(math.Round(previous))})
+			// a rising ramp reaches k workers at k-0.5, a falling one at k+0.5
+			step := 1.0
+			if level < previous {
+				step = -1
+			}
+			for k := math.Round(previous) + step; (math.Round(level)-k)*step >= 0; k += step {
+				offset := start + (k-step/2-previous)/(level-previous)*stage.Duration
+				changes = append(changes, WorkerChange{offset, int(k)})
+			}
+		}
+		start += stage.Duration
+		previous = level
+	}
+	return append(changes, WorkerChange{start, 0})
+}
+
+// LevelAt is the load level offset seconds after the start of a staged test, 0
+// after the last stage
+func (t Test) LevelAt(offset float64) float64 {
+	start := 0.0
+	previous := 0.0
+	for i, stage := range t.Stages {
+		level := t.StageLevel(i)
+		if offset < start+stage.Duration {
+			if stage.Ramp {
+				return previous + (level-previous)*(offset-start)/stage.Duration
+			}
+			return level
+		}
+		start += stage.Duration
+		previous = level
+	}
+	return 0
+}
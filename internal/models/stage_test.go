@@ -0,0 +1,68 @@
+package models
+
+import (
+	"math"
+	"testing"
+)
+
+func TestWithStages(t *testing.T) {
+	stages := []Stage{{Duration: 10.5, ConcurrentRequests: 5}, {Duration: 20, ConcurrentRequests: 20}}
+	test, err := Test{TestMode: "concurrent", Stages: stages}.WithStages()
+	if err != nil {
+		t.Fatal(err)
+	}
+	if test.TestDuration != 31 || test.ConcurrentRequests != 20 || test.Stages[1].Name != "stage 2" {
+		t.Errorf("TestDuration %d, ConcurrentRequests %d, names %q", test.TestDuration, test.ConcurrentRequests, test.Stages[1].Name)
+	}
+	// the total of the stages may be given
+	if _, err := (Test{TestMode: "concurrent", TestDuration: 31, Stages: stages}).WithStages(); err != nil {
+		t.Error(err)
+	}
+}
+
+func TestWithStagesRejects(t *testing.T) {
+	stages := []Stage{{Duration: 10, ConcurrentRequests: 5}}
+	for name, test := range map[string]Test{
+		"continious mode":   {TestMode: "continious", Stages: stages},
+		"default mode":      {Stages: stages},
+		"other duration":    {TestMode: "concurrent", TestDuration: 60, Stages: stages},
+		"no load":           {TestMode: "concurrent", Stages: []Stage{{Duration: 10}}},
+		"profile with mode": {TestMode: "continious", LoadProfile: &LoadProfile{Type: "step", From: 1, To: 3, Step: 1, StageDuration: 5}},
+	} {
+		if _, err := test.WithStages(); err == nil {
+			t.Errorf("%s: no error", name)
+		}
+	}
+	// tests without stages keep their mode and duration
+	test, err := Test{TestMode: "continious", TestDuration: 60}.WithStages()
+	if err != nil || test.TestMode != "continious" || test.TestDuration != 60 {
+		t.Errorf("unstaged test changed: %v %+v", err, test)
+	}
+}
+
+func TestWorkerChangesFollowLevelAt(t *testing.T) {
+	test := Test{TestMode: "concurrent", Stages: []Stage{
+		{Duration: 10, ConcurrentRequests: 3},
+		{Duration: 7, ConcurrentRequests: 20, Ramp: true},
+		{Duration: 5, ConcurrentRequests: 20},
+		{Duration: 9, ConcurrentRequests: 2, Ramp: true},
+	}}
+	changes := test.WorkerChanges()
+	for i := 1; i < len(changes); i++ {
+		if changes[i].Offset < changes[i-1].Offset {
+			t.Fatalf("change %d at %g is before %g", i, changes[i].Offset, changes[i-1].Offset)
+		}
+	}
+	// the workers of the last change before every offset, against LevelAt rounded
+	for offset := 0.0; offset < 35; offset += 0.01 {
+		workers := 0
+		for _, change := range changes {
+			if change.Offset <= offset {
+				workers = change.Workers
+			}
+		}
+		if level := int(math.Round(test.LevelAt(offset))); level != workers {
+			t.Fatalf("%d workers at %gs, LevelAt gives %d", workers, offset, level)
+		}
+	}
+}
@@ -5,4 +5,75 @@ type StatData struct {
 	EndTimestamp    int64 `json:"end_timestamp"`
 	QueryDuration   int64 `json:"query_duration"`
 	RequestDuration int64 `json:"request_duration"`
+	// when the request was scheduled to be sent; never later than StartTimestamp,
+	// earlier when an open-loop test could not keep up with its arrival rate
+	IntendedStartTimestamp int64 `json:"intended_start_timestamp"`
+	// 0 when no response was received
+	StatusCode    int64 `json:"status_code"`
+	ResponseBytes int64 `json:"response_bytes"`
+	// until the response headers were received, RequestDuration includes reading the body
+	TimeToFirstByte int64 `json:"time_to_first_byte"`
+	// NoError for successful requests
+	ErrorClass int64 `json:"error_class"`
+	// values of the test's ExtraMetrics, in column order
+	Metrics []int64 `json:"metrics"`
+}
+
+// classes of failed requests, recorded in the ErrorClass column
+const (
+	NoError = iota
+	// the request could not be sent or the connection broke (dial, TLS, reset)
+	ConnectionError
+	TimeoutError
+	// 4xx and 5xx responses
+	ClientError
+	ServerError
+	// the body could not be read
+	ReadError
+	// a metric is missing from the response or is not a number
+	MetricError
+)
+
+// ErrorClassNames are the names of the error classes, by value
+var ErrorClassNames = []string{"none", "connection", "timeout", "http_4xx", "http_5xx", "read", "metric"}
+
+// built-in columns besides the original ones
+const (
+	TimeToFirstByteColumn = "TimeToFirstByte"
+	ResponseBytesColumn   = "ResponseBytes"
+	ErrorClassColumn      = "ErrorClass"
+	// derived column, EndTime - IntendedStartTime
+	ResponseTimeColumn = "ResponseTime"
+)
+
+// latency seen by a user arriving at the intended start time, including the
+// time the request waited to be sent (no coordinated omission)
+func (s *StatData) ResponseTime() int64 {
+	return s.EndTimestamp - s.IntendedStartTimestamp
+}
+
+// value of the i-th column of RawDataColumnsFor(test)
+func (s *StatData) column(i int) int64 {
+	switch i {
+	case 0:
+		return s.StartTimestamp
+	case 1:
+		return s.EndTimestamp
+	case 2:
+		return s.QueryDuration
+	case 3:
+		return s.RequestDuration
+	case 4:
+		return s.IntendedStartTimestamp
+	case 5:
+		return s.StatusCode
+	case 6:
+		return s.ResponseBytes
+	case 7:
+		return s.TimeToFirstByte
+	case 8:
+		return s.ErrorClass
+	default:
+		return s.Metrics[i-len(RawDataColumns)]
+	}
 }
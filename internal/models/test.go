@@ -18,8 +18,38 @@ type Test struct {
 	ConcurrentRequests   int     `yaml:"ConcurrentRequests"`
 	SleepBetweenRequests float64 `yaml:"SleepBetweenRequests"`
 	TestDuration         int     `yaml:"TestDuration"`
+	// load levels one after the other, or generated by LoadProfile; they replace
+	// TestDuration and the load level of the test (see stage.go)
+	Stages      []Stage      `yaml:"Stages"`
+	LoadProfile *LoadProfile `yaml:"LoadProfile"`
+	// arrival-rate mode: requests started per second, reached after RampDuration seconds
+	// starting from StartRPS. ConcurrentRequests bounds the requests in flight
+	TargetRPS    float64 `yaml:"TargetRPS"`
+	StartRPS     float64 `yaml:"StartRPS"`
+	RampDuration float64 `yaml:"RampDuration"`
+	// keep-alive connection pool of the test, both default to ConcurrentRequests (100 if not set)
+	MaxIdleConns        int `yaml:"MaxIdleConns"`
+	MaxIdleConnsPerHost int `yaml:"MaxIdleConnsPerHost"`
+	// use HTTP/2 when the server supports it (TLS only)
+	HTTP2 bool `yaml:"HTTP2"`
+	// numbers read from every response (JSON paths or headers), QueryDuration when empty
+	Metrics []Metric `yaml:"Metrics"`
+	// distributed runs: number of local agent processes to start, and addresses
+	// (host:port) of agents started with -agent. Every agent runs the whole test:
+	// ConcurrentRequests is per agent, TargetRPS and StartRPS are split between them
+	Processes int      `yaml:"Processes"`
+	Agents    []string `yaml:"Agents"`
+	// precision of the saved latency histograms, defaults to 3 significant digits
+	HistogramSignificantDigits int `yaml:"HistogramSignificantDigits"`
+	// seconds between writes of the samples to data.bin while the test runs, defaults to 1
+	LiveFlushInterval float64 `yaml:"LiveFlushInterval"`
+	// follow the run with python/live.py, which keeps data/<test>/live.json up to date
+	LiveAnalysis bool `yaml:"LiveAnalysis"`
 }
 
+// TestMode of open-loop tests that start requests at TargetRPS whatever the response times
+const ArrivalRateTestMode = "arrival-rate"
+
 func LoadTestsFromFile(filepath string) ([]Test, error) {
 	var tests []Test
 	// print working directory
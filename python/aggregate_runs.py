@@ -0,0 +1,37 @@
+import json
+import sys
+from aggregates import LATENCY_COLUMNS, PERCENTILES, percentile_label
+from histogram import load_histogram, merge_histograms
+
+# merges the latency histograms of several runs and prints the combined percentiles,
+# without reading any raw data
+# usage: python3 aggregate_runs.py [--json] <test_name> [<test_name> ...]
+
+
+def aggregate(test_names, names=LATENCY_COLUMNS):
+    result = {}
+    for name in names:
+        merged = merge_histograms(load_histogram('data/' + test_name + '/', name) for test_name in test_names)
+        result[name] = merged.describe(PERCENTILES)
+    return result
+
+
+def main():
+    as_json = '--json' in sys.argv[1:]
+    test_names = [arg for arg in sys.argv[1:] if arg != '--json']
+    if len(test_names) == 0:
+        print("Usage: python3 aggregate_runs.py [--json] <test_name> [<test_name> ...]")
+        sys.exit(1)
+    result = aggregate(test_names)
+    if as_json:
+        print(json.dumps(result))
+        return
+    print("Aggregated runs: " + ", ".join(test_names))
+    for name, description in result.items():
+        print(name + " (ms):")
+        print(f"  count: {int(description['count'])}  mean: {description['mean'] / 1000000:.6f}  std: {description['std'] / 1000000:.6f}")
+        print("  " + "  ".join(f"{label}: {description[label] / 1000000:.6f}" for label in ['min'] + [percentile_label(p) for p in PERCENTILES] + ['max']))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+import numpy as np
+
+# percentiles shown in every "Summary Information" chart
+PERCENTILES = [.25, .5, .75, .90, .95, .99]
+# columns of data.csv, in file order
+RAW_COLUMNS = ['StartTime', 'EndTime', 'QueryDuration', 'RequestDuration']
+# columns analyzed as latencies (nanoseconds)
+LATENCY_COLUMNS = ['QueryDuration', 'RequestDuration']
+NS_PER_SECOND = 1000000000
+# arrival-rate runs also record when every request was meant to be sent; their
+# response time is measured from then, so time spent waiting to be sent counts
+INTENDED_START_COLUMN = 'IntendedStartTime'
+RESPONSE_TIME_COLUMN = 'ResponseTime'
+# runs with a raw data schema also record failed requests, with a non zero
+# ErrorClass, and the status code of every response
+ERROR_CLASS_COLUMN = 'ErrorClass'
+STATUS_CODE_COLUMN = 'StatusCode'
+
+
+def percentile_label(p):
+    # same labels as pandas describe(): 0.25 -> '25%', 0.9 -> '90%'
+    return f"{p * 100:g}%"
+
+
+def add_response_time(chunk):
+    # adds the ResponseTime column to a dict of raw columns that has IntendedStartTime
+    if INTENDED_START_COLUMN in chunk:
+        chunk[RESPONSE_TIME_COLUMN] = chunk['EndTime'] - chunk[INTENDED_START_COLUMN]
+    return chunk
+
+
+def successful_rows(chunk):
+    # the rows of a raw chunk without the failed requests, the chunk itself when
+    # there are none
+    if ERROR_CLASS_COLUMN not in chunk:
+        return chunk
+    successful = chunk[ERROR_CLASS_COLUMN] == 0
+    if successful.all():
+        return chunk
+    return {column: values[successful] for column, values in chunk.items()}
+
+
+class ErrorCounts:
+
+    # failed requests per second and error class, and responses per status code,
+    # accumulated one raw chunk at a time (successful rows included).
+    # seconds are unix seconds, kept as (sorted distinct seconds, counts) pairs
+    # per class so memory grows with the seconds that had errors only
+    def __init__(self):
+        self.per_second = {}
+        self.status_codes = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+    def update(self, chunk):
+        if STATUS_CODE_COLUMN in chunk:
+            values, counts = np.unique(chunk[STATUS_CODE_COLUMN], return_counts=True)
+            self.status_codes = merge_value_counts(*self.status_codes, values, counts)
+        failed = chunk[ERROR_CLASS_COLUMN] != 0
+        if not failed.any():
+            return
+        seconds = chunk['StartTime'][failed] // NS_PER_SECOND
+        classes = chunk[ERROR_CLASS_COLUMN][failed]
+        for error_class in np.unique(classes):
+            values, counts = np.unique(seconds[classes == error_class], return_counts=True)
+            empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+            self.per_second[int(error_class)] = merge_value_counts(*self.per_second.get(int(error_class), empty), values, counts)
+
+    def result(self):
+        return {
+            'per_second': {error_class: (seconds.copy(), counts.copy()) for error_class, (seconds, counts) in self.per_second.items()},
+            'status_codes': {int(code): int(count) for code, count in zip(*self.status_codes)},
+        }
+
+
+def _lerp(a, b, t):
+    # linear interpolation done exactly like numpy.percentile so the values
+    # match Series.describe() bit for bit
+    diff_b_a = b - a
+    if t >= 0.5:
+        return b - diff_b_a * (1 - t)
+    return a + diff_b_a * t
+
+
+def describe_from_value_counts(values, counts, percentiles=PERCENTILES):
+    # equivalent of Series.describe(percentiles=...) for a sample given as
+    # sorted distinct values and the number of times each value occurs
+    values = np.asarray(values, dtype=np.int64)
+    counts = np.asarray(counts, dtype=np.int64)
+    n = int(counts.sum())
+    if n == 0:
+        raise ValueError("Cannot describe an empty sample")
+    # cumulative counts: the sample at sorted position i is values[searchsorted(cum, i, 'right')]
+    cum = np.cumsum(counts)
+
+    def order_statistic(i):
+        return values[np.searchsorted(cum, i, side='right')]
+
+    mean = float((values.astype(np.float64) * counts).sum()) / n
+    if n > 1:
+        std = float(np.sqrt((counts * (values - mean) ** 2).sum() / (n - 1)))
+    else:
+        std = float('nan')
+    description = {
+        'count': float(n),
+        'mean': mean,
+        'std': std,
+        'min': float(values[0]),
+    }
+    for p in percentiles:
+        q = (p * 100.0) / 100
+        virtual_index = (n - 1) * q
+        previous_index = min(int(np.floor(virtual_index)), n - 1)
+        next_index = min(previous_index + 1, n - 1)
+        gamma = virtual_index - previous_index
+        description[percentile_label(p)] = float(_lerp(order_statistic(previous_index), order_statistic(next_index), gamma))
+    description['max'] = float(values[-1])
+    return description
+
+
+def describe_array(data, percentiles=PERCENTILES):
+    # Series.describe(percentiles=...) on a plain int64 array, computed the same
+    # way pandas does (float64 sum for the mean, two-pass variance, numpy percentiles)
+    data = np.asarray(data, dtype=np.int64)
+    n = len(data)
+    if n == 0:
+        raise ValueError("Cannot describe an empty sample")
+    mean = data.sum(dtype=np.float64) / n
+    if n > 1:
+        std = float(np.sqrt(((data - mean) ** 2).sum(dtype=np.float64) / (n - 1)))
+    else:
+        std = float('nan')
+    description = {
+        'count': float(n),
+        'mean': float(mean),
+        'std': std,
+        'min': float(data.min()),
+    }
+    # one partition for all percentiles
+    values = np.percentile(data, np.array(percentiles) * 100.0)
+    for p, value in zip(percentiles, values):
+        description[percentile_label(p)] = float(value)
+    description['max'] = float(data.max())
+    return description
+
+
+def per_second_buckets(start_times, columns):
+    # request count and per-column sums for every second between the first and
+    # the last request, as one bincount per column
+    seconds = np.asarray(start_times, dtype=np.int64) // NS_PER_SECOND
+    first_second = int(seconds.min())
+    index = seconds - first_second
+    counts = np.bincount(index)
+    # float64 sums are exact as long as a one second bucket stays below 2^53 ns
+    sums = {column: np.bincount(index, weights=data, minlength=len(counts)).astype(np.int64) for column, data in columns.items()}
+    return first_second, counts, sums
+
+
+def mean_per_second(counts, sums):
+    # per-second means, seconds without requests are NaN like resample().mean()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {column: np.where(counts > 0, total / np.maximum(counts, 1), np.nan) for column, total in sums.items()}
+
+
+def compute_aggregates(start_times, columns, errors=None, warmup_columns=None):
+    # single pass over in-memory int64 columns producing the same structure as
+    # StreamingAggregator.result(): per-second counts and means, the describe()
+    # summary of every column, rolling percentiles and the warm-up period with
+    # the summary of the steady state after it.
+    # errors: ErrorCounts.result() of the failed requests left out of columns
+    # warmup_columns: the duration columns the warm-up is detected on, all when None
+    from steadystate import WindowedPercentiles, rolling_percentiles, warmup_seconds
+    if len(start_times) == 0:
+        raise ValueError("No rows to aggregate")
+    first_second, counts, sums = per_second_buckets(start_times, columns)
+    description = {column: describe_array(data) for column, data in columns.items()}
+    rolling = {}
+    for column, data in columns.items():
+        windowed = WindowedPercentiles()
+        windowed.update(start_times, data)
+        rolling[column] = rolling_percentiles(windowed, first_second)
+    warmup = warmup_seconds(counts, sums, warmup_columns)
+    steady_description = description
+    if warmup > 0:
+        steady = np.asarray(start_times) >= (first_second + warmup) * NS_PER_SECOND
+        steady_description = {column: describe_array(data[steady]) for column, data in columns.items()}
+    return {
+        'first_second': first_second,
+        'requests_per_second': counts,
+        'mean_per_second': mean_per_second(counts, sums),
+        'description': description,
+        'rolling': rolling,
+        'warmup_seconds': warmup,
+        'steady_description': steady_description,
+        'errors': errors,
+    }
+
+
+def steady_state_start(aggregates):
+    # unix nanoseconds the steady state starts at, after the warm-up
+    return (aggregates['first_second'] + aggregates['warmup_seconds']) * NS_PER_SECOND
+
+
+def update_steady_state(aggregator, chunk, start):
+    # adds the successful rows of a raw chunk started at or after start to an
+    # aggregator of the steady state; used when the rows were not kept in memory
+    chunk = successful_rows(chunk)
+    steady = chunk['StartTime'] >= start
+    aggregator.update(chunk['StartTime'][steady], {column: chunk[column][steady] for column in aggregator.columns})
+
+
+def merge_value_counts(values_a, counts_a, values_b, counts_b):
+    # merge two (sorted distinct values, counts) pairs into one
+    values, inverse = np.unique(np.concatenate([values_a, values_b]), return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate([counts_a, counts_b]), minlength=len(values))
+    return values, counts.astype(np.int64)
+
+
+class StreamingAggregator:
+
+    # per-second buckets start at first_second (unix time in seconds)
+    first_second = None
+
+    # accumulates everything the reports need from a run one chunk at a time:
+    # per-second request counts, per-second sums of each latency column and the
+    # exact distribution of each latency column as (distinct value, count) pairs.
+    # memory grows with the run duration in seconds and with the number of
+    # distinct latency values, never with the number of rows.
+    # with histogram_digits set, distributions are kept in log-bucketed
+    # histograms instead: memory is then bounded, percentiles are approximate.
+    # rolling: also keep the sparse per-window histograms of rolling percentiles
+    # warmup_columns: the duration columns the warm-up is detected on, all when None
+    def __init__(self, columns=LATENCY_COLUMNS, histogram_digits=None, rolling=True, warmup_columns=None):
+        self.columns = list(columns)
+        self.warmup_columns = self.columns if warmup_columns is None else list(warmup_columns)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.sums = {column: np.zeros(0, dtype=np.int64) for column in self.columns}
+        self.value_counts = {column: (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)) for column in self.columns}
+        self.histograms = None
+        if histogram_digits is not None:
+            # imported here, histogram.py depends on this module
+            from histogram import LatencyHistogram
+            self.histograms = {column: LatencyHistogram(histogram_digits) for column in self.columns}
+        self.windows = None
+        if rolling:
+            from steadystate import WindowedPercentiles
+            self.windows = {column: WindowedPercentiles() for column in self.columns}
+        self.rows = 0
+        # seconds in use, the arrays can be longer
+        self.seconds = 0
+        # failed requests, only for raw data with an ErrorClass column
+        self.errors = None
+
+    def _grow(self, lo, hi):
+        # make sure the per-second arrays cover the seconds [lo, hi]. seconds are
+        # appended with spare room (doubling), so following a growing run one
+        # second at a time does not copy the arrays every time
+        if self.first_second is None:
+            self.first_second = lo
+        before = max(self.first_second - lo, 0)
+        after = max(hi - (self.first_second + self.seconds - 1), 0)
+        if before == 0 and after == 0:
+            return
+        capacity = len(self.counts)
+        needed = before + self.seconds + after
+        if before > 0 or needed > capacity:
+            if before == 0:
+                needed = max(needed, 2 * capacity)
+            self.counts = np.pad(self.counts[:self.seconds], (before, needed - before - self.seconds))
+            for column in self.columns:
+                self.sums[column] = np.pad(self.sums[column][:self.seconds], (before, needed - before - self.seconds))
+        self.seconds += before + after
+        self.first_second -= before
+
+    def update(self, start_times, columns):
+        # start_times: int64 nanoseconds, columns: dict column name -> int64 array
+        start_times = np.asarray(start_times, dtype=np.int64)
+        if len(start_times) == 0:
+            return
+        columns = {column: np.asarray(columns[column], dtype=np.int64) for column in self.columns}
+        first_second, requests, sums = per_second_buckets(start_times, columns)
+        self._grow(first_second, first_second + len(requests) - 1)
+        # position of the chunk's first second in the accumulated buckets
+        offset = first_second - self.first_second
+        self.counts[offset:offset + len(requests)] += requests
+        for column, data in columns.items():
+            self.sums[column][offset:offset + len(requests)] += sums[column]
+            if self.windows is not None:
+                self.windows[column].update(start_times, data)
+            if self.histograms is not None:
+                self.histograms[column].record_array(data)
+                continue
+            values, counts = np.unique(data, return_counts=True)
+            self.value_counts[column] = merge_value_counts(*self.value_counts[column], values, counts)
+        self.rows += len(start_times)
+
+    def update_chunk(self, chunk):
+        # a raw chunk: failed requests are counted by class, the columns of the
+        # successful ones are aggregated
+        if ERROR_CLASS_COLUMN in chunk:
+            if self.errors is None:
+                self.errors = ErrorCounts()
+            self.errors.update(chunk)
+            chunk = successful_rows(chunk)
+        self.update(chunk['StartTime'], {column: chunk[column] for column in self.columns})
+
+    def result(self):
+        # steady_description is None when there is a warm-up, the rows after it
+        # have to be described again (update_steady_state)
+        from steadystate import rolling_percentiles, warmup_seconds
+        if self.rows == 0:
+            raise ValueError("No rows were aggregated")
+        counts = self.counts[:self.seconds]
+        sums = {column: sums[:self.seconds] for column, sums in self.sums.items()}
+        description = {column: self.describe(column) for column in self.columns}
+        warmup = warmup_seconds(counts, sums, self.warmup_columns)
+        return {
+            'first_second': self.first_second,
+            'requests_per_second': counts.copy(),
+            'mean_per_second': mean_per_second(counts, sums),
+            'description': description,
+            'rolling': {column: rolling_percentiles(windowed, self.first_second) for column, windowed in self.windows.items()} if self.windows is not None else None,
+            'warmup_seconds': warmup,
+            'steady_description': description if warmup == 0 else None,
+            'errors': self.errors.result() if self.errors is not None else None,
+        }
+
+    def describe(self, column):
+        if self.histograms is not None:
+            return self.histograms[column].describe()
+        return describe_from_value_counts(*self.value_counts[column])
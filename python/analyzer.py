@@ -1,9 +1,25 @@
 import json
+import os
+import re
 import sys
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
-import plotly.graph_objs as go
-from plotly.subplots import make_subplots
+from aggregates import ErrorCounts, StreamingAggregator, add_response_time, compute_aggregates, describe_array, percentile_label, steady_state_start, successful_rows, update_steady_state, PERCENTILES, RAW_COLUMNS, LATENCY_COLUMNS, RESPONSE_TIME_COLUMN, ERROR_CLASS_COLUMN
+from rawdata import RawDataFile, RawDataReader, CSV_DATA_FILE, raw_data_sources
+from histogram import load_histogram
+from cache import AnalysisCache, content_key
+from downsample import SERIES_FILE_SUFFIX, downsample_chart_data, max_points
+from stages import StageAggregator, describe_stages, find_knee, stage_windows
+
+# test mode of open-loop runs (see internal/httpbenchmark/arrivalrate.go)
+ARRIVAL_RATE_TEST_MODE = 'arrival-rate'
+# analysis of the failed requests, for runs that record them
+ERRORS_ANALYSIS = 'ErrorsPerSecond'
+# unit of the duration columns, reported in milliseconds
+DURATION_UNIT = 'ns'
+# analysis of the load stages of staged runs
+STAGES_ANALYSIS = 'LoadStages'
 
 
 class Analyzer:
@@ -12,6 +28,8 @@ class Analyzer:
     data_path = None
     test_1_name = None
     test_2_name = None
+    # every compared test, in report order
+    test_names = []
     server_url = None
     test_start_time = None
     title = ''
@@ -23,25 +41,55 @@ class Analyzer:
     failed_requests = None
     requests_per_second = None
     test_mode = None
+    # arrival-rate runs: requests started per second, optionally ramped up from start_rps
+    target_rps = None
+    start_rps = None
+    ramp_duration = None
+    # garbage collections of the load generator during the run, None for older runs
+    gc_stats = None
+    # full sample buffers the runner could not queue for writing at once, None for older runs
+    recorder_stalls = None
     df = None
+    # latency columns analyzed, ResponseTime is added for arrival-rate runs
+    latency_columns = LATENCY_COLUMNS
+    # columns measured in DURATION_UNIT, the warm-up is detected on them only
+    duration_columns = LATENCY_COLUMNS
+    # the analyzed columns with their unit ({'name', 'unit', ...}), from the raw data
+    # schema in benchmark.json, in report order
+    metrics = None
+    # names of the error classes by value, None for runs that do not record failed requests
+    error_classes = None
+    # staged runs: the stages with their load level and the window they are summarized over
+    stages = None
+    # per-second buckets and summaries filled by load_data()
+    aggregates = None
+    # persistent cache in data/<test>/.cache/, None when caching is disabled
+    cache = None
     meta = None
-    graphs = []
+    # analyses to put in the report, set per instance in __init__
+    graphs = None
+    # points per chart series in the reports, REPORT_MAX_POINTS (2000) when None
+    max_points = None
     
-    # constructor for generating report for one test or comparing two tests
-    def __init__(self, test_1_name = None, test_2_name = None):
+    # constructor for generating report for one test or comparing two or more tests
+    def __init__(self, test_1_name = None, test_2_name = None, *other_test_names):
         if test_1_name is None and test_2_name is None:
-            print("Usage: python3 generate_report.py <unique_test_name> or python3 compare_tests.py <test_1_name> <test_2_name>")
+            print("Usage: python3 generate_report.py <unique_test_name> or python3 compare.py <test_1_name> <test_2_name> [<test_name> ...]")
             sys.exit(1)
-        # check if the user wants to compare two tests
+        # instances are reused by the long lived worker (worker.py), nothing may be shared
+        self.graphs = []
+        # check if the user wants to compare tests
         if test_1_name is not None and test_2_name is not None:
             self.test_1_name = test_1_name
             self.test_2_name = test_2_name
             self.test_1_data_path = 'data/' + test_1_name + '/'
             self.test_2_data_path = 'data/' + test_2_name + '/'
+            self.test_names = [test_1_name, test_2_name] + list(other_test_names)
+            # comparisons only read the analyses of each test, benchmark.json is not needed
+            return
             
         # else the user wants to generate report for one test
-        if test_1_name is not None:
-            test_unique_name = test_1_name
+        test_unique_name = test_1_name
         self.data_path = 'data/' + test_unique_name + '/'
        
         # read meta data
@@ -62,27 +110,155 @@ class Analyzer:
         self.successful_requests = meta['successful_requests']
         self.failed_requests = meta['failed_requests']
         self.requests_per_second = meta['requests_per_second']
+        self.target_rps = meta.get('target_rps')
+        self.start_rps = meta.get('start_rps')
+        self.ramp_duration = meta.get('ramp_duration')
+        self.gc_stats = meta.get('gc_stats')
+        self.recorder_stalls = meta.get('recorder_stalls')
+        self.metrics = run_metrics(meta, self.data_path)
+        self.latency_columns = [metric['name'] for metric in self.metrics]
+        self.duration_columns = [metric['name'] for metric in self.metrics if metric['unit'] == DURATION_UNIT]
+        if 'raw_data_schema' in meta:
+            self.error_classes = meta['raw_data_schema']['error_classes']
+        self.stages = stage_windows(meta, self.test_mode == ARRIVAL_RATE_TEST_MODE)
         
         
-    def load_data(self):
+    # histogram_digits: only with streaming, summarize latencies with histograms of that
+    # precision instead of exact distributions (approximate percentiles, bounded memory)
+    # use_cache: reuse the aggregates cached for unchanged raw data and only analyze rows
+    # appended since the last run, rendered figures are cached as well
+    def load_data(self, streaming=False, chunk_size=1000000, histogram_digits=None, use_cache=False):
         # print("Loading data from: " + self.data_path + 'data.csv')
 
         if self.total_requests is None or self.total_requests == 0:
             raise ValueError("Could not load data. Total requests is 0")
-        # types
-        data_types = {
-            'StartTime': np.int64,  
-            'EndTime': np.int64, 
-            'QueryDuration': np.int64,
-            'RequestDuration': np.int64,
-        }
-        self.df = pd.read_csv(self.data_path+'data.csv', header=None, names=data_types.keys(), dtype=data_types)
-        # setting datetime fields
-        self.df['StartTime'] = pd.to_datetime(self.df['StartTime'], unit='ns')
-        self.df['EndTime'] = pd.to_datetime(self.df['EndTime'], unit='ns')
-        
+        if use_cache:
+            self.load_data_cached(chunk_size, histogram_digits)
+            return
+        # the parts of distributed runs are read one after the other, never concatenated
+        if streaming or len(raw_data_sources(self.data_path)) > 1:
+            self.load_data_streaming(chunk_size, histogram_digits)
+            return
+        source = raw_data_sources(self.data_path)[0]
+        errors = None
+        if not source.endswith(CSV_DATA_FILE):
+            # memory-mapped int64 columns, nothing to parse
+            columns = add_response_time(RawDataFile(source).read_columns())
+            if ERROR_CLASS_COLUMN in columns:
+                error_counts = ErrorCounts()
+                error_counts.update(columns)
+                errors = error_counts.result()
+                columns = successful_rows(columns)
+        else:
+            # older runs only have data.csv
+            # types
+            data_types = {
+                'StartTime': np.int64,  
+                'EndTime': np.int64, 
+                'QueryDuration': np.int64,
+                'RequestDuration': np.int64,
+            }
+            self.df = pd.read_csv(self.data_path+'data.csv', header=None, names=data_types.keys(), dtype=data_types)
+            columns = {column: self.df[column].to_numpy() for column in RAW_COLUMNS}
+        # timestamps stay int64 nanoseconds, every analysis is computed from them in one pass
+        self.aggregates = compute_aggregates(columns['StartTime'], {column: columns[column] for column in self.latency_columns}, errors, self.duration_columns)
+        self.complete_stages(chunk_size)
+
+    # read the raw data in chunks of chunk_size rows and only keep the per-second buckets
+    # and latency distributions, so long runs do not have to fit in memory
+    def load_data_streaming(self, chunk_size=1000000, histogram_digits=None):
+        aggregator = StreamingAggregator(self.latency_columns, histogram_digits, warmup_columns=self.duration_columns)
+        for chunk in self.iter_raw_chunks(chunk_size):
+            aggregator.update_chunk(chunk)
+        self.aggregates = aggregator.result()
+        self.complete_steady_state(chunk_size, histogram_digits)
+        self.complete_stages(chunk_size, histogram_digits)
+        self.df = None
+
+    # after a warm-up, the steady state summary needs a second pass over the raw data,
+    # unless steady ({'start', 'aggregator'}, from the cache) already holds the rows
+    # after the same warm-up. returns the steady state aggregated, None without warm-up
+    def complete_steady_state(self, chunk_size=1000000, histogram_digits=None, steady=None):
+        if self.aggregates['steady_description'] is not None:
+            return None
+        start = steady_state_start(self.aggregates)
+        if steady is None or steady['start'] != start:
+            aggregator = StreamingAggregator(self.latency_columns, histogram_digits, rolling=False)
+            for chunk in self.iter_raw_chunks(chunk_size):
+                update_steady_state(aggregator, chunk, start)
+            steady = {'start': start, 'aggregator': aggregator}
+        self.aggregates['steady_description'] = {column: steady['aggregator'].describe(column) for column in self.latency_columns}
+        return steady
+
+    # staged runs: every stage is summarized from another pass over the raw data
+    def complete_stages(self, chunk_size=1000000, histogram_digits=None):
+        if self.stages:
+            self.aggregates['stages'] = describe_stages(self.iter_raw_chunks(chunk_size), self.stages, self.stage_column(), histogram_digits)
+
+    def stage_column(self):
+        # latency the stages are compared on: measured from the intended start in
+        # arrival-rate runs, so the queueing past the knee is seen
+        if RESPONSE_TIME_COLUMN in self.latency_columns:
+            return RESPONSE_TIME_COLUMN
+        return 'RequestDuration'
+
+    # streaming analysis whose state is kept in the cache so it can be resumed: the
+    # aggregator of the run, of its stages and of its steady state all get the
+    # appended rows only
+    def load_data_cached(self, chunk_size=1000000, histogram_digits=None):
+        self.cache = AnalysisCache(self.data_path)
+        raw_paths = raw_data_sources(self.data_path)
+        options = {'histogram_digits': histogram_digits, 'columns': self.latency_columns, 'stages': self.stages, 'stage_column': self.stage_column()}
+        entry, unchanged = self.cache.resume(raw_paths, options)
+        if unchanged:
+            self.aggregates = entry['aggregates']
+            return
+        if entry is None:
+            aggregator = StreamingAggregator(self.latency_columns, histogram_digits, warmup_columns=self.duration_columns)
+            stages = StageAggregator(self.stages, self.stage_column(), histogram_digits) if self.stages else None
+            steady = None
+            readers = [RawDataReader(raw_path) for raw_path in raw_paths]
+        else:
+            # only the rows appended since the cached analysis
+            aggregator, stages, steady = entry['aggregator'], entry['stages'], entry['steady']
+            readers = [RawDataReader(raw_path, position) for raw_path, position in zip(raw_paths, entry['positions'])]
+        for reader in readers:
+            for chunk in map(add_response_time, reader.chunks(chunk_size)):
+                aggregator.update_chunk(chunk)
+                if stages is not None:
+                    stages.update(chunk)
+                # the warm-up may still move with the new rows, checked below
+                if steady is not None:
+                    update_steady_state(steady['aggregator'], chunk, steady['start'])
+        self.aggregates = aggregator.result()
+        if stages is not None:
+            self.aggregates['stages'] = stages.result()
+        steady = self.complete_steady_state(chunk_size, histogram_digits, steady)
+        self.cache.store(raw_paths, options, {'aggregator': aggregator, 'stages': stages, 'steady': steady}, [reader.position for reader in readers], self.aggregates)
+
+    def iter_raw_chunks(self, chunk_size=1000000):
+        # dicts of int64 columns with at most chunk_size rows, from data.bin (or every part) if present
+        for raw_path in raw_data_sources(self.data_path):
+            for chunk in RawDataReader(raw_path).chunks(chunk_size):
+                yield add_response_time(chunk)
+
+    # latency histograms saved by the runner next to benchmark.json, by column name
+    def load_histograms(self, names=LATENCY_COLUMNS):
+        return {name: load_histogram(self.data_path, name) for name in names}
+
     def create_fig(self, chart_data):
-        fig = make_subplots(rows=1, cols=2, subplot_titles=("Mean " + chart_data["display_name"] +  " Per Second", "Summary Information"))
+        # plotly is only imported when a figure is built, stats-only users never load it
+        import plotly.graph_objs as go
+        from plotly.subplots import make_subplots
+        rolling = chart_data.get("rolling_percentiles_chart_data")
+        steady_state = chart_data.get("steady_state")
+        titles = chart_data.get("subplot_titles", ("Mean " + chart_data["display_name"] +  " Per Second", "Summary Information"))
+        if rolling is not None:
+            # second row: rolling percentiles over the whole width
+            fig = make_subplots(rows=2, cols=2, specs=[[{}, {}], [{"colspan": 2}, None]], vertical_spacing=0.15,
+                                subplot_titles=tuple(titles) + ("Rolling Percentiles (" + str(rolling["window_seconds"]) + " second window)",))
+        else:
+            fig = make_subplots(rows=1, cols=2, subplot_titles=tuple(titles))
 
         # left figure
         fig.add_trace(go.Scatter(x=chart_data["average_data_per_second_chart_data"]["x"],
@@ -90,6 +266,13 @@ class Analyzer:
                                 mode=chart_data["average_data_per_second_chart_data"]["mode"],
                                 name=chart_data["average_data_per_second_chart_data"]["name"],),
                     row=1, col=1)
+        for line in chart_data.get("extra_lines", []):
+            fig.add_trace(go.Scatter(x=line["x"], y=line["y"], mode=line.get("mode", 'lines'), name=line["name"]), row=1, col=1)
+        # staged runs: the maximum sustainable throughput
+        knee = chart_data.get("knee")
+        if knee is not None and knee["requests_per_second"] is not None:
+            fig.add_vline(x=knee["requests_per_second"], line_dash='dash', line_color='green',
+                          annotation_text="max sustainable", annotation_position="top left", row=1, col=1)
         fig.update_xaxes(title_text=chart_data["average_data_per_second_chart_data"]["xaxis_title_text"] , row=1, col=1)
         fig.update_yaxes(title_text=chart_data["average_data_per_second_chart_data"]["yaxis_title_text"], row=1, col=1)
 
@@ -102,87 +285,123 @@ class Analyzer:
                         #marker_color=chart_data["data_description_chart_data"]["marker_color"],
                         name=chart_data["data_description_chart_data"]["name"],),
                     row=1, col=2)
+        if steady_state is not None and steady_state["warmup_seconds"] > 0:
+            # whole run percentiles next to the steady state ones
+            fig.add_trace(go.Bar(
+                            x=steady_state["full_run_chart_data"]["x"],
+                            y=steady_state["full_run_chart_data"]["y"],
+                            marker_color='lightgrey',
+                            name=steady_state["full_run_chart_data"]["name"],),
+                        row=1, col=2)
         fig.update_xaxes(title_text=chart_data["data_description_chart_data"]["xaxis_title_text"], row=1, col=2)
         fig.update_yaxes(title_text=chart_data["data_description_chart_data"]["yaxis_title_text"], row=1, col=2)
 
+        # rolling percentiles
+        if rolling is not None:
+            for line in rolling["lines"]:
+                fig.add_trace(go.Scatter(x=line["x"], y=line["y"], mode='lines', name=line["name"]), row=2, col=1)
+            fig.update_xaxes(title_text=rolling["xaxis_title_text"], row=2, col=1)
+            fig.update_yaxes(title_text=rolling["yaxis_title_text"], row=2, col=1)
+
+        # shade the warm-up left out of the summary
+        if steady_state is not None and steady_state["warmup_seconds"] > 0:
+            for row in range(1, 3 if rolling is not None else 2):
+                fig.add_vrect(x0=0, x1=steady_state["warmup_seconds"], fillcolor='orange', opacity=0.15, line_width=0,
+                              annotation_text="warm-up", annotation_position="top left", row=row, col=1)
 
         # setup the layout for the subplots
-        fig.update_layout(title_text=chart_data["display_name"] + " Analysis", showlegend=False)
-        fig.update_layout(height=600, width=1200)
+        fig.update_layout(title_text=chart_data["display_name"] + " Analysis", showlegend=rolling is not None or bool(chart_data.get("extra_lines")))
+        fig.update_layout(height=1000 if rolling is not None else 600, width=1200)
         return fig
     
-    def analyze_latency(self, field_name, display_name, test_description = ''):
-        if self.df is None:
+    def latency_from_aggregates(self, field_name, scale=1000000):
+        # per-second means in milliseconds (divided by scale), empty seconds stay NaN like resample().mean()
+        means = self.aggregates['mean_per_second'][field_name]
+        x = np.arange(len(means), dtype=np.float64).tolist()
+        y = (means / scale).tolist()
+        # headline statistics leave out the warm-up
+        data_description = {key: np.int64(value) for key, value in self.aggregates['steady_description'][field_name].items()}
+        return x, y, data_description
+
+    def steady_state_data(self, full_run_description, scale=1):
+        # warm-up detected in the run and the whole run percentiles next to the steady state ones
+        labels = [percentile_label(p) for p in PERCENTILES]
+        return {
+            'warmup_seconds': int(self.aggregates['warmup_seconds']),
+            'method': 'MSER-5',
+            'full_run_chart_data': {
+                'x': labels,
+                'y': [full_run_description[label] / scale for label in labels],
+                'name': 'Whole Run',
+            },
+        }
+
+    def warmup_html(self, steady_state, unit=''):
+        warmup = steady_state['warmup_seconds']
+        if warmup == 0:
+            return "<p class=\"italic\">Warm-up: <b>none detected</b>, the summary covers the whole run</p>"
+        return (f"<p class=\"italic\">Warm-up: the first <b>{warmup}</b> seconds are left out of the summary (steady state detected with MSER-5). "
+                f"99th Percentile of the whole run: <b>{steady_state['full_run_chart_data']['y'][-1]}</b>{unit}</p>")
+
+    # unit: of the column, durations (ns) are reported in milliseconds, other units as they are
+    def analyze_latency(self, field_name, display_name, test_description = '', unit=DURATION_UNIT):
+        if self.aggregates is None:
             raise ValueError("The data was not loaded")
+        scale, unit_label, unit_name, value_name = 1000000, 'ms', 'milliseconds', 'Latency'
+        if unit != DURATION_UNIT:
+            scale, unit_label, unit_name, value_name = 1, unit, unit, display_name
         
-        
-        # Analyze Mean Latency Per Second
-        ## copy df and aggregate 'field_name' per second
-        df_resampled = self.df.copy()
-        df_resampled.set_index('StartTime', inplace=True)
-        df_resampled = df_resampled.resample('1S').agg({field_name: 'mean'})
-        ## reset index to show seconds passed instead of StartTime which is datetime
-        start_time = df_resampled.index.min()
-        df_resampled['SecondsPassed'] = (df_resampled.index - start_time).total_seconds()
-        df_resampled.set_index('SecondsPassed', inplace=True)
-        
-    
-        # convert nanoseconds to milliseconds for better readability
-        df_resampled[field_name] = df_resampled[field_name] / 1000000
-        
-        
-        # Analyze Summary Information
-        ## copy df and extract 'field_name' column
-        df_copy = self.df[field_name]
-        ## get data description
-        data_description = df_copy.describe(percentiles=[.25, .5, .75, .90, .95, .99]).astype('int64')
-        # print("Data description")
-        # print(data_description)
+        # per-second means and summary come from the single analysis pass done by load_data
+        x, y, data_description = self.latency_from_aggregates(field_name, scale)
+
         ## extract analysis    
         min = data_description['min']
-        min = min / 1000000 # convert to milliseconds
+        min = min / scale
 
         mean = data_description['mean']
-        mean = mean / 1000000 # convert to milliseconds
+        mean = mean / scale
 
         std = data_description['std']
-        std = std / 1000000 # convert to milliseconds
+        std = std / scale
 
         max = data_description['max']
-        max = max / 1000000 # convert to milliseconds
+        max = max / scale
 
         p25 = data_description['25%']
-        p25 = p25 / 1000000 # convert to milliseconds
+        p25 = p25 / scale
 
         p50 = data_description['50%']
-        p50 = p50 / 1000000 # convert to milliseconds
+        p50 = p50 / scale
 
         p75 = data_description['75%']
-        p75 = p75 / 1000000 # convert to milliseconds
+        p75 = p75 / scale
 
         p90 = data_description['90%']
-        p90 = p90 / 1000000
+        p90 = p90 / scale
 
         p95 = data_description['95%']
-        p95 = p95 / 1000000
+        p95 = p95 / scale
 
         p99 = data_description['99%']
-        p99 = p99 / 1000000
+        p99 = p99 / scale
+
+        steady_state = self.steady_state_data(self.aggregates['description'][field_name], scale)
     
         ## html summary
         html_div = f"""
                     <div class='card rounded-xl m-10 p-10 border-2'>
                         <p class="text-lg font-bold italic">Summary Information</p>
-                        <p class="italic">Mean Latency: <b>{mean}</b> milliseconds</p>
-                        <p class="italic">Standard Deviation: <b>{std}</b> milliseconds</p>
-                        <p class="italic">25th Percentile: <b>{p25}</b> milliseconds</p>
-                        <p class="italic">50th Percentile: <b>{p50}</b> milliseconds</p>
-                        <p class="italic">75th Percentile: <b>{p75}</b> milliseconds</p>
-                        <p class="italic">90th Percentile: <b>{p90}</b> milliseconds</p>
-                        <p class="italic">95th Percentile: <b>{p95}</b> milliseconds</p>
-                        <p class="italic">99th Percentile: <b>{p99}</b> milliseconds</p>
-                        <p class="italic">Request with lowest latency: <b>{min}</b> milliseconds</p>
-                        <p class="italic">Request with highest latency: <b>{max}</b> milliseconds</p>
+                        <p class="italic">Mean {value_name}: <b>{mean}</b> {unit_name}</p>
+                        <p class="italic">Standard Deviation: <b>{std}</b> {unit_name}</p>
+                        <p class="italic">25th Percentile: <b>{p25}</b> {unit_name}</p>
+                        <p class="italic">50th Percentile: <b>{p50}</b> {unit_name}</p>
+                        <p class="italic">75th Percentile: <b>{p75}</b> {unit_name}</p>
+                        <p class="italic">90th Percentile: <b>{p90}</b> {unit_name}</p>
+                        <p class="italic">95th Percentile: <b>{p95}</b> {unit_name}</p>
+                        <p class="italic">99th Percentile: <b>{p99}</b> {unit_name}</p>
+                        <p class="italic">Request with lowest {value_name.lower()}: <b>{min}</b> {unit_name}</p>
+                        <p class="italic">Request with highest {value_name.lower()}: <b>{max}</b> {unit_name}</p>
+                        {self.warmup_html(steady_state, ' ' + unit_name)}
                     </div>
                     """
         analyzed_data = {
@@ -196,50 +415,56 @@ class Analyzer:
                 #'marker_color': ['blue', 'yellow', 'red' , 'green', 'orange', 'purple'],
                 'name': 'Data Description',
                 'xaxis_title_text': 'Percentile',
-                'yaxis_title_text': display_name + '(ms)',
+                'yaxis_title_text': display_name + '(' + unit_label + ')',
             },
         
             
             'average_data_per_second_chart_data': {
-                'x': df_resampled.index.to_list(),
-                'y': df_resampled[field_name].to_list(),
+                'x': x,
+                'y': y,
                 'mode': 'lines',
                 'name': 'Mean ' + display_name,
                 'xaxis_title_text': 'Time (seconds)',
-                'yaxis_title_text': display_name + '(ms)',
+                'yaxis_title_text': display_name + '(' + unit_label + ')',
 
             }
         }
 
-        # left figure
-        fig = self.create_fig(analyzed_data)
+        analyzed_data['steady_state'] = steady_state
+        rolling = self.aggregates['rolling'][field_name]
+        analyzed_data['rolling_percentiles_chart_data'] = {
+            'window_seconds': rolling['window_seconds'],
+            'lines': [{
+                'name': 'Rolling ' + label,
+                'x': rolling['x'],
+                'y': (np.asarray(values) / scale).tolist(),
+            } for label, values in rolling['percentiles'].items()],
+            'xaxis_title_text': 'Time (seconds)',
+            'yaxis_title_text': display_name + '(' + unit_label + ')',
+        }
+
+        # long runs only draw a bounded number of points, the full series is saved separately
+        full_resolution = downsample_chart_data(analyzed_data, self.chart_max_points())
+
+        # the figure is built when the report is written, unless its html is cached
         self.graphs.append({
             'title': display_name + " Analysis",
             'description': test_description,
             'html_summary': html_div,
-            'fig': fig,
-            'analyzed_data': analyzed_data
+            'fig': None,
+            'analyzed_data': analyzed_data,
+            'full_resolution': full_resolution
         })
 
     def analyze_requests_per_second(self, test_description = ''):
-        # copy and aggregate per second
-        df_copy = self.df.copy()
-        df_copy.set_index('StartTime', inplace=True)
-        df_copy = df_copy.resample('1S').count() 
-        # reset index to show seconds passed instead of StartTime which is datetime
-        start_time = df_copy.index.min()
-        df_copy['SecondsPassed'] = (df_copy.index - start_time).total_seconds()
-        df_copy.set_index('SecondsPassed', inplace=True)
-        # rename columns and drop unnecessary ones
-        df_copy.rename(columns={'EndTime': 'RequestsPerSecond'}, inplace=True)
-        df_copy.drop(columns=['QueryDuration', 'RequestDuration'], inplace=True)
-        
-        data_description = df_copy.describe(percentiles=[.25, .5, .75, .90, .95, .99]).astype('int64')
-        # print("Data description")
-        # print(data_description)
-        data_description_dict = data_description.to_dict()
-        # print("Data description dict")
-        # print(data_description_dict)
+        if self.aggregates is None:
+            raise ValueError("The data was not loaded")
+        # requests per second were counted by the analysis pass, only describe them here
+        counts = self.aggregates['requests_per_second']
+        # the summary leaves out the warm-up seconds
+        steady_counts = counts[self.aggregates['warmup_seconds']:]
+        data_description_dict = {'RequestsPerSecond': {key: int(value) for key, value in describe_array(steady_counts).items()}}
+        steady_state = self.steady_state_data({key: int(value) for key, value in describe_array(counts).items()})
         # extract x and y for percentile chart
         x = ['25%', '50%', '75%', '90%', '95%', '99%']
         y = [data_description_dict['RequestsPerSecond']['25%'], data_description_dict['RequestsPerSecond']['50%'], data_description_dict['RequestsPerSecond']['75%'] , data_description_dict['RequestsPerSecond']['90%'], data_description_dict['RequestsPerSecond']['95%'], data_description_dict['RequestsPerSecond']['99%']]
@@ -260,18 +485,17 @@ class Analyzer:
         
             
             'average_data_per_second_chart_data': {
-                'x': df_copy.index.to_list(),
-                'y': df_copy['RequestsPerSecond'].to_list(),
+                'x': np.arange(len(counts), dtype=np.float64).tolist(),
+                'y': counts.tolist(),
                 'mode': 'lines',
                 'name': 'Mean Requests Per Second',
                 'xaxis_title_text': 'Time (seconds)',
                 'yaxis_title_text': 'Requests Per Second',
 
-            }
+            },
+            'steady_state': steady_state,
         }
 
-        fig = self.create_fig(analyzed_data)
-
         # html summary
         html_div = f"""
                     <div class='card rounded-xl m-10 p-10 border-2'>
@@ -286,17 +510,175 @@ class Analyzer:
                         <p class="italic">99th Percentile: <b>{data_description_dict['RequestsPerSecond']['99%']}</b></p>
                         <p class="italic">Request with lowest latency: <b>{data_description_dict['RequestsPerSecond']['min']}</b></p>
                         <p class="italic">Request with highest latency: <b>{data_description_dict['RequestsPerSecond']['max']}</b></p>
+                        {self.warmup_html(steady_state)}
 
 
                     </div>
                     """
+        full_resolution = downsample_chart_data(analyzed_data, self.chart_max_points())
         self.graphs.append({
             'title': "Requests Per Second Analysis",
             'description': test_description,
             'html_summary': html_div,
-            'fig': fig,
-            'analyzed_data': analyzed_data
+            'fig': None,
+            'analyzed_data': analyzed_data,
+            'full_resolution': full_resolution
+        })
+
+    def analyze_errors(self, test_description = ''):
+        if self.aggregates is None:
+            raise ValueError("The data was not loaded")
+        errors = self.aggregates['errors']
+        # seconds since the first successful request like the other charts, errors may come before it
+        first_second = self.aggregates['first_second']
+        lo = first_second
+        hi = first_second + len(self.aggregates['requests_per_second']) - 1
+        for seconds, _ in errors['per_second'].values():
+            lo = min(lo, int(seconds[0]))
+            hi = max(hi, int(seconds[-1]))
+        x = np.arange(lo - first_second, hi - first_second + 1, dtype=np.float64).tolist()
+        total = np.zeros(len(x), dtype=np.int64)
+        lines = []
+        by_class = {}
+        for error_class, (seconds, counts) in sorted(errors['per_second'].items()):
+            series = np.zeros(len(x), dtype=np.int64)
+            series[seconds - lo] = counts
+            total += series
+            name = self.error_class_name(error_class)
+            by_class[name] = int(counts.sum())
+            lines.append({'name': name, 'x': x, 'y': series.tolist()})
+        failed = int(total.sum())
+        successful = int(self.aggregates['requests_per_second'].sum())
+        analyzed_data = {
+            'name': ERRORS_ANALYSIS, # used to identify the file name to be saved
+            'display_name': 'Errors Per Second',
+            'data_description_chart_data': {
+                'x': list(by_class),
+                'y': list(by_class.values()),
+                'text': list(by_class.values()),
+                'textposition': 'outside',
+                'name': 'Failed Requests',
+                'xaxis_title_text': 'Error Class',
+                'yaxis_title_text': 'Failed Requests',
+            },
+            'average_data_per_second_chart_data': {
+                'x': x,
+                'y': total.tolist(),
+                'mode': 'lines',
+                'name': 'Failed Requests Per Second',
+                'xaxis_title_text': 'Time (seconds)',
+                'yaxis_title_text': 'Failed Requests',
+            },
+            # one line per error class, on the same time axis as the latency charts
+            'extra_lines': lines,
+        }
+        classes_html = ''.join(f"<p class=\"italic\">{name}: <b>{count}</b></p>" for name, count in by_class.items())
+        status_html = ', '.join(f"{code}: <b>{count}</b>" for code, count in sorted(errors['status_codes'].items()))
+        html_div = f"""
+                    <div class='card rounded-xl m-10 p-10 border-2'>
+                        <p class="text-lg font-bold italic">Summary Information</p>
+                        <p class="italic">Failed Requests: <b>{failed}</b> ({failed * 100 / max(failed + successful, 1):.3f}%)</p>
+                        {classes_html}
+                        <p class="italic">Responses by status code (0: no response): {status_html}</p>
+                    </div>
+                    """
+        full_resolution = downsample_chart_data(analyzed_data, self.chart_max_points())
+        self.graphs.append({
+            'title': "Errors Per Second Analysis",
+            'description': test_description,
+            'html_summary': html_div,
+            'fig': None,
+            'analyzed_data': analyzed_data,
+            'full_resolution': full_resolution
+        })
+
+    def analyze_stages(self, test_description = ''):
+        if self.aggregates is None:
+            raise ValueError("The data was not loaded")
+        stages = self.aggregates['stages']
+        knee = find_knee(stages)
+        column = self.stage_column()
+        level_name = 'Target Requests Per Second' if self.test_mode == ARRIVAL_RATE_TEST_MODE else 'Concurrent Requests'
+        # latency against throughput, one point per stage in the order they ran
+        measured = [stage for stage in stages if stage['p99'] is not None]
+        x = [stage['requests_per_second'] for stage in measured]
+        analyzed_data = {
+            'name': STAGES_ANALYSIS, # used to identify the file name to be saved
+            'display_name': 'Load Stages',
+            'subplot_titles': ("99th Percentile " + display_name(column) + " vs Throughput", "Throughput Per Stage"),
+            'data_description_chart_data': {
+                'x': [stage['name'] for stage in stages],
+                'y': [round(stage['requests_per_second'], 3) for stage in stages],
+                'text': [round(stage['requests_per_second'], 3) for stage in stages],
+                'textposition': 'outside',
+                'name': 'Throughput',
+                'xaxis_title_text': 'Stage',
+                'yaxis_title_text': 'Requests Per Second',
+            },
+            'average_data_per_second_chart_data': {
+                'x': x,
+                'y': [stage['p99'] / 1000000 for stage in measured],
+                'mode': 'lines+markers',
+                'name': '99th Percentile',
+                'xaxis_title_text': 'Requests Per Second',
+                'yaxis_title_text': display_name(column) + '(ms)',
+            },
+            'extra_lines': [{
+                'name': '50th Percentile',
+                'mode': 'lines+markers',
+                'x': x,
+                'y': [stage['p50'] / 1000000 for stage in measured],
+            }],
+            # kept in LoadStages.json for capacity planning
+            'stages': stages,
+            'knee': knee,
+        }
+        if knee is None:
+            knee_html = "<p class=\"italic\">Maximum sustainable throughput: <b>not computed</b>, it needs stages at two or more increasing load levels</p>"
+        elif knee['stage'] is None:
+            knee_html = (f"<p class=\"italic\">Maximum sustainable throughput: <b>below the lowest stage</b>, "
+                         f"stage <b>{stages[knee['saturation_stage']]['name']}</b> is already saturated</p>")
+        elif knee['saturated']:
+            knee_html = (f"<p class=\"italic\">Maximum sustainable throughput: <b>{knee['requests_per_second']:.1f}</b> requests per second "
+                         f"(stage <b>{stages[knee['stage']]['name']}</b>), the knee is before stage <b>{stages[knee['saturation_stage']]['name']}</b> "
+                         f"where latency climbs while the throughput flattens or requests fail</p>")
+        else:
+            knee_html = (f"<p class=\"italic\">Maximum sustainable throughput: at least <b>{knee['requests_per_second']:.1f}</b> requests per second "
+                         f"(stage <b>{stages[knee['stage']]['name']}</b>), no stage reached the knee</p>")
+        rows_html = ''.join(
+            f"<tr><td class=\"px-2\">{stage['name']}</td><td class=\"px-2\">{stage['mean_level']:g}</td>"
+            f"<td class=\"px-2\">{stage['requests_per_second']:.1f}</td>"
+            f"<td class=\"px-2\">{stage['p50'] / 1000000 if stage['p50'] is not None else '-'}</td>"
+            f"<td class=\"px-2\">{stage['p99'] / 1000000 if stage['p99'] is not None else '-'}</td>"
+            f"<td class=\"px-2\">{stage['error_rate'] * 100:.3f}%</td></tr>" for stage in stages)
+        html_div = f"""
+                    <div class='card rounded-xl m-10 p-10 border-2'>
+                        <p class="text-lg font-bold italic">Summary Information</p>
+                        {knee_html}
+                        <table class="italic">
+                            <tr><th class="px-2">Stage</th><th class="px-2">{level_name}</th><th class="px-2">Requests Per Second</th>
+                            <th class="px-2">50th Percentile (ms)</th><th class="px-2">99th Percentile (ms)</th><th class="px-2">Failed</th></tr>
+                            {rows_html}
+                        </table>
+                    </div>
+                    """
+        self.graphs.append({
+            'title': "Load Stages Analysis",
+            'description': test_description,
+            'html_summary': html_div,
+            'fig': None,
+            'analyzed_data': analyzed_data,
+            'full_resolution': None
         })
+
+    def error_class_name(self, error_class):
+        if self.error_classes is not None and error_class < len(self.error_classes):
+            return self.error_classes[error_class]
+        return str(error_class)
+
+    def chart_max_points(self):
+        return self.max_points if self.max_points is not None else max_points()
+
     def create_test_report_html(self):
         # create html file with the report data
         with open(self.data_path + 'report.html', 'w') as f:
@@ -313,12 +695,25 @@ class Analyzer:
             f.write("<p class='text-lg italic'>" + self.description + "</p>")
             f.write("<p class='font-bold italic'>Run Information:</p>")
             f.write("<p class='italic'>Test Mode: <b>" + self.test_mode + "</b></p>")
-            f.write("<p class='italic'>Concurrent Requests: <b>" + str(self.concurrent_requests) + "</b></p>")
+            if self.target_rps is not None:
+                f.write("<p class='italic'>Target Requests Per Second: <b>" + str(self.target_rps) + "</b></p>")
+                if self.ramp_duration:
+                    f.write("<p class='italic'>Ramp: from <b>" + str(self.start_rps or 0) + "</b> requests per second over <b>" + str(self.ramp_duration) + "</b> seconds</p>")
+                f.write("<p class='italic'>Maximum Requests In Flight: <b>" + str(self.concurrent_requests) + "</b></p>")
+            else:
+                f.write("<p class='italic'>Concurrent Requests: <b>" + str(self.concurrent_requests) + "</b></p>")
+            if self.stages:
+                f.write("<p class='italic'>Stages: " + ", ".join("<b>" + stage['name'] + "</b>" + (" (ramp)" if stage['ramp'] else "") for stage in self.stages) + "</p>")
             f.write("<p class='italic'>Test Duration: <b>" + str(self.test_duration) + "</b> seconds</p>")
             f.write("<p class='italic'>Total Requests: <b>" + str(self.total_requests) + "</b></p>")
             f.write("<p class='italic'>Successful Requests: <b>" + str(self.successful_requests) + "</b></p>")
             f.write("<p class='italic'>Failed Requests: <b>" + str(self.failed_requests) + "</b></p>")
             f.write("<p class='italic'>Average Requests Per Second (Total Requests / Test Duration): <b>" + str(self.requests_per_second) + "</b></p>")
+            if self.gc_stats is not None:
+                f.write("<p class='italic'>Load Generator GC Pauses: <b>" + str(self.gc_stats['num_gc']) + "</b> collections, <b>" + str(self.gc_stats['pause_total_ns'] / 1000000)
+                        + "</b> milliseconds in total, longest <b>" + str(self.gc_stats['pause_max_ns'] / 1000000) + "</b> milliseconds</p>")
+            if self.recorder_stalls:
+                f.write("<p class='italic'>Sample Buffers Not Queued At Once (disk behind the load generator): <b>" + str(self.recorder_stalls) + "</b></p>")
             f.write("</div>")
             f.write("<hr class='!border-t-4'>")
             for graph in self.graphs:
@@ -330,8 +725,13 @@ class Analyzer:
                     f.write("<p class='text-lg italic'>" + graph['description'] + "</p>")
                     f.write("</div>")
                 f.write(graph['html_summary'])
+                if graph['full_resolution'] is not None:
+                    series = graph['analyzed_data']['average_data_per_second_chart_data']
+                    f.write("<p class='italic text-center'>Showing " + str(len(series['y'])) + " of " + str(series['full_resolution_points'])
+                            + " points (lowest and highest value of each interval), full resolution: <a class='underline' href='/benchmarks/"
+                            + os.path.basename(os.path.normpath(self.data_path)) + "/series/" + graph['analyzed_data']['name'] + "'>" + graph['analyzed_data']['name'] + SERIES_FILE_SUFFIX + "</a></p>")
                 f.write("<div class='card flex justify-center rounded-xl m-10 p-10 border-2'>")
-                f.write(graph['fig'].to_html(full_html=False, include_plotlyjs='cdn'))
+                f.write(self.figure_html(graph))
                 f.write("</div>")
                 f.write("</div>") 
                 
@@ -346,10 +746,48 @@ class Analyzer:
             with open(self.data_path + graph['analyzed_data']['name'] + '.json', 'w') as f:
                 json.dump(graph['analyzed_data'], f)
                 f.close()
+            # full resolution series of downsampled charts, served on demand
+            series_path = self.data_path + graph['analyzed_data']['name'] + SERIES_FILE_SUFFIX
+            if graph['full_resolution'] is not None:
+                with open(series_path, 'w') as f:
+                    json.dump(dict(name=graph['analyzed_data']['name'], **graph['full_resolution']), f)
+            elif os.path.exists(series_path):
+                os.remove(series_path)
 
             # print("Report created successfully")
+    # html of a graph's figure, from the cache when the same data was rendered before
+    def figure_html(self, graph):
+        key = content_key('figure', graph['analyzed_data'])
+        html = self.cache.get(key) if self.cache is not None else None
+        if html is None:
+            if graph['fig'] is None:
+                graph['fig'] = self.create_fig(graph['analyzed_data'])
+            html = graph['fig'].to_html(full_html=False, include_plotlyjs='cdn')
+            if self.cache is not None:
+                self.cache.put(key, html)
+        return html
+
+    def comparison_figure_html(self, chart_data_list):
+        # comparison fragments are cached with the first test's analyses
+        cache = AnalysisCache(self.test_1_data_path)
+        key = content_key('comparison', self.test_names, chart_data_list)
+        html = cache.get(key)
+        if html is None:
+            html = self.create_comparison_fig(chart_data_list).to_html(full_html=False, include_plotlyjs='cdn')
+            cache.put(key, html)
+        return html
+
     def create_comparison_fig(self, chart_data_list):
-        fig = make_subplots(rows=1, cols=2, subplot_titles=("Mean " + chart_data_list[0]["display_name"] +  " Per Second", "Summary Information"))
+        import plotly.graph_objs as go
+        from plotly.subplots import make_subplots
+        # the rolling 99th percentile of every test, when all of them have it
+        rolling = all("rolling_percentiles_chart_data" in chart_data for chart_data in chart_data_list)
+        titles = chart_data_list[0].get("subplot_titles", ("Mean " + chart_data_list[0]["display_name"] +  " Per Second", "Summary Information"))
+        if rolling:
+            fig = make_subplots(rows=2, cols=2, specs=[[{}, {}], [{"colspan": 2}, None]], vertical_spacing=0.15,
+                                subplot_titles=tuple(titles) + ("Rolling 99th Percentile (" + str(chart_data_list[0]["rolling_percentiles_chart_data"]["window_seconds"]) + " second window)",))
+        else:
+            fig = make_subplots(rows=1, cols=2, subplot_titles=tuple(titles))
 
         # left figure
         for i, chart_data in enumerate(chart_data_list):
@@ -357,7 +795,7 @@ class Analyzer:
                                     y=chart_data["average_data_per_second_chart_data"]["y"],
                                     mode=chart_data["average_data_per_second_chart_data"]["mode"],
                                     name=chart_data["average_data_per_second_chart_data"]["name"],
-                                    line=dict(color=['blue', 'red'][i], width=2)),
+                                    line=dict(color=comparison_color(i), width=2)),
                         row=1, col=1)
         fig.update_xaxes(title_text=chart_data_list[0]["average_data_per_second_chart_data"]["xaxis_title_text"] , row=1, col=1)
         fig.update_yaxes(title_text=chart_data_list[0]["average_data_per_second_chart_data"]["yaxis_title_text"], row=1, col=1)
@@ -369,72 +807,120 @@ class Analyzer:
                             y=chart_data["data_description_chart_data"]["y"],
                             text=chart_data["data_description_chart_data"]["text"],
                             textposition='outside',
-                            marker_color=['blue', 'red'][i],
+                            marker_color=comparison_color(i),
                             name=chart_data["data_description_chart_data"]["name"],
                             legendgroup=chart_data["data_description_chart_data"]["name"],),
                         row=1, col=2)
         fig.update_xaxes(title_text=chart_data_list[0]["data_description_chart_data"]["xaxis_title_text"], row=1, col=2)
         fig.update_yaxes(title_text=chart_data_list[0]["data_description_chart_data"]["yaxis_title_text"], row=1, col=2)
 
+        # rolling 99th percentile, the legend tells the warm-up left out of each test's summary
+        if rolling:
+            for i, chart_data in enumerate(chart_data_list):
+                line = chart_data["rolling_percentiles_chart_data"]["lines"][-1]
+                name = self.test_names[i] + " " + line["name"]
+                if chart_data.get("steady_state") is not None:
+                    name += " (warm-up " + str(chart_data["steady_state"]["warmup_seconds"]) + "s)"
+                fig.add_trace(go.Scatter(x=line["x"], y=line["y"], mode='lines', name=name,
+                                         line=dict(color=comparison_color(i), width=2, dash='dot')),
+                              row=2, col=1)
+            fig.update_xaxes(title_text=chart_data_list[0]["rolling_percentiles_chart_data"]["xaxis_title_text"], row=2, col=1)
+            fig.update_yaxes(title_text=chart_data_list[0]["rolling_percentiles_chart_data"]["yaxis_title_text"], row=2, col=1)
 
         # add annotation in the footer
         fig.add_annotation(text="Comparison of " + chart_data_list[0]["display_name"] + " Analysis", showarrow=False,
                            xref="paper", yref="paper", x=0.5, y=-0.1)
 
         # setup the layout for the subplots
-        fig.update_layout(title_text=chart_data_list[0]["display_name"] + " Comparison " + self.test_1_name + " vs " + self.test_2_name 
+        fig.update_layout(title_text=chart_data_list[0]["display_name"] + " Comparison " + " vs ".join(self.test_names)
                           , showlegend=True)
         # update the legend title
         fig.update_layout(legend_title_text='Legend')
         
 
-        fig.update_layout(height=600, width=1500)
+        fig.update_layout(height=1000 if rolling else 600, width=1500)
         # save the figure as png
         #fig.write_image("comparisons/" + chart_data_list[0]["name"] + '.png')
         return fig
-    def compare_tests(self, analyses_file_names):
-       print("Comparing tests: " + self.test_1_name + " and " + self.test_2_name)
-       figs = []
-       # loop through the analyses files
-       for analysis_file_name in analyses_file_names:
-           # load the data for each test
-           test_1_data = json.load(open(self.test_1_data_path + analysis_file_name + '.json'))
-           test_2_data = json.load(open(self.test_2_data_path + analysis_file_name + '.json'))
-           # change the field test_x_data["data_description_chart_data"]["name"] to the test name + the actual name
-           test_1_data["data_description_chart_data"]["name"] = self.test_1_name + " " + test_1_data["data_description_chart_data"]["name"]
-           test_1_data["average_data_per_second_chart_data"]["name"] = self.test_1_name + " " + test_1_data["average_data_per_second_chart_data"]["name"]
-           test_2_data["data_description_chart_data"]["name"] = self.test_2_name + " " + test_2_data["data_description_chart_data"]["name"]
-           test_2_data["average_data_per_second_chart_data"]["name"] = self.test_2_name + " " + test_2_data["average_data_per_second_chart_data"]["name"]
-           figs.append(self.create_comparison_fig([test_1_data, test_2_data]))
-        
-            # create html file with the report data
-           with open('comparisons/' + self.test_1_name + '_vs_' + self.test_2_name + '_comparison_report.html', 'w') as f:
-                    # write the report data to the file
-                    f.write("<html><head><title>" + self.test_1_name + " vs " + self.test_2_name + " Comparison Report</title>")
-                    # use tailwind css
-                    f.write("<script src='https://cdn.tailwindcss.com'></script>")
-                    f.write("</head><body>")
-                    f.write("<div class='card rounded-xl m-10 p-10 border-2'>")
-                    f.write("<p class='text-2xl font-bold italic'>" + self.test_1_name + " vs " + self.test_2_name + " Comparison Report</p>")
-                
-                    f.write("</div>")
-                    f.write("<hr class='!border-t-4'>")
-                    for fig in figs:
-                        f.write("<div class='card flex justify-center rounded-xl m-10 p-10 border-2'>")
-                        f.write(fig.to_html(full_html=False, include_plotlyjs='cdn'))
-                        f.write("</div>")
-                        f.write("<hr class='!border-t-4'>")
-                    f.write("</body></html>")
-                    f.close()
-                    print("Comparison report created successfully")
-       
-          
+    # summary_html: shown above the charts, the regression check of compare.py
+    def compare_tests(self, analyses_file_names, summary_html=''):
+        print("Comparing tests: " + ", ".join(self.test_names))
+        # load the analyses of every test in parallel, one process per test
+        data_paths = ['data/' + test_name + '/' for test_name in self.test_names]
+        with ProcessPoolExecutor(max_workers=min(len(data_paths), os.cpu_count() or 1)) as executor:
+            analyses = list(executor.map(load_analyses, data_paths, [analyses_file_names] * len(data_paths)))
+        figs = []
+        # loop through the analyses files
+        for analysis_file_name in analyses_file_names:
+            chart_data_list = []
+            for test_name, test_analyses in zip(self.test_names, analyses):
+                test_data = test_analyses[analysis_file_name]
+                # change the field test_data["data_description_chart_data"]["name"] to the test name + the actual name
+                test_data["data_description_chart_data"]["name"] = test_name + " " + test_data["data_description_chart_data"]["name"]
+                test_data["average_data_per_second_chart_data"]["name"] = test_name + " " + test_data["average_data_per_second_chart_data"]["name"]
+                # analyses saved before downsampling still hold every point
+                downsample_chart_data(test_data, self.chart_max_points())
+                chart_data_list.append(test_data)
+            figs.append(self.comparison_figure_html(chart_data_list))
+
+        # create html file with the report data, once all figures are ready
+        report_title = " vs ".join(self.test_names) + " Comparison Report"
+        with open(comparison_report_path(self.test_names), 'w') as f:
+            # write the report data to the file
+            f.write("<html><head><title>" + report_title + "</title>")
+            # use tailwind css
+            f.write("<script src='https://cdn.tailwindcss.com'></script>")
+            f.write("</head><body>")
+            f.write("<div class='card rounded-xl m-10 p-10 border-2'>")
+            f.write("<p class='text-2xl font-bold italic'>" + report_title + "</p>")
         
-       
+            f.write("</div>")
+            f.write("<hr class='!border-t-4'>")
+            if summary_html:
+                f.write(summary_html)
+                f.write("<hr class='!border-t-4'>")
+            for fig in figs:
+                f.write("<div class='card flex justify-center rounded-xl m-10 p-10 border-2'>")
+                f.write(fig)
+                f.write("</div>")
+                f.write("<hr class='!border-t-4'>")
+            f.write("</body></html>")
+        print("Comparison report created successfully")
+
+
+def run_metrics(meta, data_path):
+    # analyzed columns of a run with their unit, in report order, from the raw data
+    # schema written by the runner. Older runs analyze QueryDuration and RequestDuration,
+    # and ResponseTime for arrival-rate runs
+    if 'raw_data_schema' in meta:
+        return meta['raw_data_schema']['metrics']
+    names = list(LATENCY_COLUMNS)
+    # only data.bin has the intended start time of every request
+    if meta['test_mode'] == ARRIVAL_RATE_TEST_MODE and not raw_data_sources(data_path)[0].endswith(CSV_DATA_FILE):
+        names.append(RESPONSE_TIME_COLUMN)
+    return [{'name': name, 'unit': DURATION_UNIT} for name in names]
+
+
+def display_name(name):
+    # QueryDuration -> Query Duration
+    return re.sub(r'(?<=[a-z0-9])(?=[A-Z])', ' ', name)
 
 
- 
+def comparison_color(i):
+    # one color per compared test: blue and red for the first two as before, then a qualitative palette
+    from plotly.colors import qualitative
+    colors = ['blue', 'red'] + qualitative.Dark24
+    return colors[i % len(colors)]
 
 
+def comparison_report_path(test_names):
+    return 'comparisons/' + '_vs_'.join(test_names) + '_comparison_report.html'
 
 
+def load_analyses(data_path, analyses_file_names):
+    # the saved analyses of one test, runs in a worker process
+    analyses = {}
+    for analysis_file_name in analyses_file_names:
+        with open(data_path + analysis_file_name + '.json') as f:
+            analyses[analysis_file_name] = json.load(f)
+    return analyses
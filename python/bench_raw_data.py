@@ -0,0 +1,95 @@
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from aggregates import RAW_COLUMNS
+from rawdata import RawDataFile, RawDataWriter
+
+# compares loading data.csv with pandas against memory-mapping data.bin
+# usage: python3 bench_raw_data.py [rows] (10M rows by default)
+
+
+def generate(folder, rows, chunk_size=1000000):
+    rng = np.random.default_rng(0)
+    start = 1696573698875976571
+    chunks = []
+    with open(os.path.join(folder, 'data.csv'), 'w') as csv_file:
+        for offset in range(0, rows, chunk_size):
+            n = min(chunk_size, rows - offset)
+            start_times = start + np.cumsum(rng.integers(100000, 500000, n))
+            start = int(start_times[-1])
+            query_durations = rng.lognormal(12, 0.5, n).astype(np.int64)
+            request_durations = query_durations + rng.lognormal(12.5, 0.5, n).astype(np.int64)
+            chunk = {'StartTime': start_times, 'EndTime': start_times + request_durations,
+                     'QueryDuration': query_durations, 'RequestDuration': request_durations}
+            chunks.append(chunk)
+            pd.DataFrame(chunk).to_csv(csv_file, header=False, index=False)
+    # a single block, like the file written by the Go runner
+    with RawDataWriter(os.path.join(folder, 'data.bin'), RAW_COLUMNS) as writer:
+        writer.write_block({column: np.concatenate([chunk[column] for chunk in chunks]) for column in RAW_COLUMNS})
+
+
+def load_csv(folder):
+    data_types = {column: np.int64 for column in RAW_COLUMNS}
+    df = pd.read_csv(os.path.join(folder, 'data.csv'), header=None, names=RAW_COLUMNS, dtype=data_types)
+    return {column: df[column].to_numpy() for column in RAW_COLUMNS}
+
+
+def load_binary(folder):
+    return RawDataFile(os.path.join(folder, 'data.bin')).read_columns()
+
+
+def peak_rss_mb():
+    # VmHWM belongs to the address space and starts over in the spawned process,
+    # ru_maxrss can carry the parent's peak across fork
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(loader, folder, queue):
+    # runs in a fresh process so peak RSS only covers this loader. Pages of
+    # data.bin touched through the memory map are counted too, although they
+    # belong to the page cache and can be dropped by the kernel at any time
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    columns = loader(folder)
+    loaded = time.perf_counter()
+    # touch every value once so mapped pages are actually read
+    checksum = sum(int(values.sum()) for values in columns.values())
+    queue.put({
+        'load_seconds': loaded - start,
+        'load_and_scan_seconds': time.perf_counter() - start,
+        'peak_rss_mb': peak_rss_mb() - rss_before,
+        'checksum': checksum,
+    })
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000000
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as folder:
+        print(f"Generating {rows} rows in {folder}")
+        generate(folder, rows)
+        for name, file_name, loader in [('csv', 'data.csv', load_csv), ('binary', 'data.bin', load_binary)]:
+            queue = context.Queue()
+            process = context.Process(target=measure, args=(loader, folder, queue))
+            process.start()
+            result = queue.get()
+            process.join()
+            size_mb = os.path.getsize(os.path.join(folder, file_name)) / 1024 / 1024
+            print(f"{name:>6}: {size_mb:8.1f} MB file, load {result['load_seconds']:7.3f}s, "
+                  f"load + scan {result['load_and_scan_seconds']:7.3f}s, peak RSS +{result['peak_rss_mb']:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import glob
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sys
+
+# Persistent analysis cache stored in data/<test>/.cache/.
+#
+# Entries are content addressed: the file name is a hash of what was computed
+# (kind of result, raw files, options, ANALYZER_VERSION). Aggregates also carry
+# the size, mtime and digests of the first and last block of the raw data they
+# were computed from, so an unchanged run is served from the cache and a run whose
+# raw files only grew is resumed from where the previous analysis stopped, reading
+# nothing but the appended rows and those two blocks. The aggregators of the
+# stages and of the steady state are resumed with the run's one.
+# Each test's cache is kept below ANALYSIS_CACHE_MAX_BYTES by deleting its least
+# recently used entries whenever one is written, the caches of all tests together
+# when the analysis worker starts and with the prune command.
+
+# bump whenever cached results would change for the same input
+ANALYZER_VERSION = '8'
+CACHE_FOLDER = '.cache/'
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def max_cache_bytes():
+    return int(os.environ.get('ANALYSIS_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+
+
+def hash_range(path, start, end):
+    # blake2b of the bytes of the file from start to end
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = f.read(min(HASH_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+
+def fingerprint_digests(path, size):
+    # digests of the first and the last HASH_BLOCK_SIZE bytes of the file's first
+    # size bytes: raw files are only appended to, or written again from the start
+    # by a new run, which changes the rows of both. Checked without reading the rest.
+    return {
+        'head': hash_range(path, 0, min(size, HASH_BLOCK_SIZE)),
+        'tail': hash_range(path, max(size - HASH_BLOCK_SIZE, 0), size),
+    }
+
+
+def content_key(*parts):
+    # cache key for any json serializable description of a result
+    data = json.dumps([ANALYZER_VERSION, parts], sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class AnalysisCache:
+
+    def __init__(self, data_path, max_bytes=None):
+        self.data_path = data_path
+        self.folder = data_path + CACHE_FOLDER
+        self.max_bytes = max_cache_bytes() if max_bytes is None else max_bytes
+
+    def _path(self, key):
+        return self.folder + key + '.pkl'
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        # mark as recently used for the LRU bound
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value):
+        os.makedirs(self.folder, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path + '.' + str(os.getpid()) + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except FileNotFoundError:
+            # the cache was invalidated meanwhile
+            return
+        # only this test's entries: jobs analyzing other tests prune their own
+        prune_folders([self.folder], self.max_bytes)
+
+    def invalidate(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    # --- aggregates of the raw data
+
+    def aggregates_key(self, raw_paths, options):
+        return content_key('aggregates', [os.path.relpath(path, self.data_path) for path in raw_paths], options)
+
+    def resume(self, raw_paths, options):
+        # cached aggregator state usable for raw_paths as they are now, or None.
+        # returns (entry, unchanged): entry['positions'] is where unread rows start in each file
+        entry = self.get(self.aggregates_key(raw_paths, options))
+        if entry is None:
+            return None, False
+        unchanged = True
+        for raw_path, fingerprint in zip(raw_paths, entry['fingerprints']):
+            stat = os.stat(raw_path)
+            if stat.st_size == fingerprint['size'] and stat.st_mtime_ns == fingerprint['mtime_ns']:
+                continue
+            unchanged = False
+            if stat.st_size < fingerprint['size'] or fingerprint_digests(raw_path, fingerprint['size']) != fingerprint['digests']:
+                return None, False
+            # same content, possibly with rows appended
+        return entry, unchanged
+
+    def store(self, raw_paths, options, state, positions, aggregates):
+        # state: the aggregators resume() hands back in the entry, by name
+        fingerprints = []
+        for raw_path, position in zip(raw_paths, positions):
+            stat = os.stat(raw_path)
+            fingerprints.append({
+                'size': position,
+                # the mtime only identifies the content if everything was read
+                'mtime_ns': stat.st_mtime_ns if stat.st_size == position else None,
+                'digests': fingerprint_digests(raw_path, position),
+            })
+        self.put(self.aggregates_key(raw_paths, options), dict(state, fingerprints=fingerprints, positions=positions, aggregates=aggregates))
+
+
+def cache_folders(data_root='data'):
+    return sorted(glob.glob(os.path.join(data_root, '*', CACHE_FOLDER)))
+
+
+def prune(data_root='data', max_bytes=None):
+    # delete least recently used entries of all tests until they fit in max_bytes;
+    # run before analyses start (worker.py) or from the command line
+    return prune_folders(cache_folders(data_root), max_bytes)
+
+
+def prune_folders(folders, max_bytes=None):
+    # entries may be removed meanwhile by other jobs, missing files are skipped
+    max_bytes = max_cache_bytes() if max_bytes is None else max_bytes
+    entries = []
+    for folder in folders:
+        for path in glob.glob(folder + '*.pkl'):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            continue
+        total -= size
+    return total
+
+
+def main():
+    usage = "Usage: python3 cache.py invalidate <test_name> [...] | invalidate --all | prune [max_bytes]"
+    if len(sys.argv) < 2:
+        print(usage)
+        sys.exit(1)
+    command, args = sys.argv[1], sys.argv[2:]
+    if command == 'invalidate' and args:
+        data_paths = [os.path.dirname(os.path.normpath(folder)) + '/' for folder in cache_folders()] if args == ['--all'] else ['data/' + name + '/' for name in args]
+        for data_path in data_paths:
+            AnalysisCache(data_path).invalidate()
+            print("Invalidated cache of " + data_path)
+    elif command == 'prune':
+        total = prune('data', int(args[0]) if args else None)
+        print(f"Cache size: {total} bytes")
+    else:
+        print(usage)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import json
+import os
+import sqlite3
+import sys
+import time
+
+# Catalog of every run, an SQLite database next to the runs (data/catalog.sqlite).
+#
+# A run is added when its report is written (see internal/analysis/catalog.go) under
+# a unique run ID, <test>-<start time in unix nanoseconds>. Its data folder holds the
+# latest run of the test only, the catalog keeps the summary of every run: the counts
+# and requests per second of benchmark.json, and the statistics of every metric in
+# metric_stats (min, max, avg, std, p25, p50, p75, p90, p95, p99), which the runner
+# already computed from its histograms. A run is written in one transaction, so
+# readers see all of it or nothing. Trends of a test and the latest regressions of
+# every test are then indexed queries instead of opening every benchmark.json.
+# The catalog is built from the existing runs with a report the first time it is opened,
+# later connections only check its schema version.
+# usage: python3 catalog.py index <test_name> [...] | rebuild | list
+#        | trend <test_name> [metric] [statistic] [--limit N]
+#        | regressions [metric] [statistic] [--top N] [--baseline N]
+# Results are printed as JSON.
+
+CATALOG_PATH = 'data/catalog.sqlite'
+DATA_FOLDER = 'data/'
+# seconds a writer waits for another one to commit
+BUSY_TIMEOUT = 30
+# requests per second are stored with the metrics, as their mean
+REQUESTS_PER_SECOND = 'RequestsPerSecond'
+# metrics where a higher value is better, every other one regresses when it grows
+HIGHER_IS_BETTER = [REQUESTS_PER_SECOND]
+DEFAULT_METRIC = 'RequestDuration'
+DEFAULT_STATISTIC = 'p99'
+TREND_LIMIT = 200
+TOP_REGRESSIONS = 10
+# the latest run of a test is compared with the mean of the BASELINE_RUNS before it
+BASELINE_RUNS = 5
+# statistics of older runs, saved before metric_stats
+LEGACY_STATS = {'QueryDuration': 'query_duration_stats', 'RequestDuration': 'request_duration_stats', 'ResponseTime': 'response_time_stats'}
+
+# saved in PRAGMA user_version once the tables exist, raise it when SCHEMA changes
+SCHEMA_VERSION = 1
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    test_name TEXT NOT NULL,
+    display_name TEXT,
+    start_time INTEGER NOT NULL,
+    test_mode TEXT,
+    test_duration REAL,
+    total_requests INTEGER,
+    successful_requests INTEGER,
+    failed_requests INTEGER,
+    requests_per_second REAL,
+    indexed_at REAL
+);
+CREATE INDEX IF NOT EXISTS runs_by_test ON runs (test_name, start_time);
+CREATE TABLE IF NOT EXISTS stats (
+    run_id TEXT NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    metric TEXT NOT NULL,
+    statistic TEXT NOT NULL,
+    value REAL,
+    unit TEXT,
+    PRIMARY KEY (run_id, metric, statistic)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS stats_by_metric ON stats (metric, statistic, run_id);
+"""
+
+
+def run_id(meta):
+    return meta['test_unique_name'] + '-' + str(meta['test_start_time'])
+
+
+def run_stats(meta):
+    # (metric, statistic, value, unit) of a benchmark.json
+    units = {metric['name']: metric['unit'] for metric in meta.get('raw_data_schema', {}).get('metrics') or []}
+    stats = dict(meta.get('metric_stats') or {})
+    for metric, key in LEGACY_STATS.items():
+        if metric not in stats and meta.get(key):
+            stats[metric] = meta[key]
+    rows = [(REQUESTS_PER_SECOND, 'mean', meta['requests_per_second'], 'rps')]
+    for metric, values in stats.items():
+        for statistic, value in values.items():
+            rows.append((metric, statistic, value, units.get(metric, 'ns')))
+    return rows
+
+
+def connect(path=CATALOG_PATH):
+    # the catalog, created from the runs in data/ the first time it is opened
+    connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+    connection.row_factory = sqlite3.Row
+    # a setting of the connection, not saved in the file
+    connection.execute('PRAGMA foreign_keys = ON')
+    if connection.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+        initialize(connection)
+    return connection
+
+
+def initialize(connection):
+    # create the tables and add the existing runs, once per catalog file: the
+    # schema version saved in user_version is only set when both are committed
+    # readers do not wait for a run being written, saved in the file
+    connection.execute('PRAGMA journal_mode = WAL')
+    # another process may be initializing it too, the second one waits and finds it done
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        if connection.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION:
+            connection.rollback()
+            return
+        # executescript would commit, the statements run in this transaction instead
+        for statement in SCHEMA.split(';'):
+            if statement.strip():
+                connection.execute(statement)
+        test_names = sorted(os.listdir(DATA_FOLDER)) if os.path.isdir(DATA_FOLDER) else []
+        for test_name in test_names:
+            # the runs the runner would have added, those with a report
+            if not os.path.exists(DATA_FOLDER + test_name + '/benchmark.json') or not os.path.exists(DATA_FOLDER + test_name + '/report.html'):
+                continue
+            try:
+                insert_run(connection, test_name)
+            except (ValueError, KeyError) as e:
+                # stdout is for the results
+                print("Could not add " + test_name + " to the catalog: " + str(e), file=sys.stderr)
+        connection.execute('PRAGMA user_version = ' + str(SCHEMA_VERSION))
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+
+
+def insert_run(connection, test_name):
+    # add or replace the run saved in data/<test_name>/ in the current transaction
+    with open(DATA_FOLDER + test_name + '/benchmark.json') as f:
+        meta = json.load(f)
+    run = run_id(meta)
+    connection.execute('DELETE FROM runs WHERE run_id = ?', (run,))
+    connection.execute('INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+        run, meta['test_unique_name'], meta.get('test_display_name'), meta['test_start_time'],
+        meta.get('test_mode'), meta.get('test_duration'), meta.get('total_requests'),
+        meta.get('successful_requests'), meta.get('failed_requests'), meta['requests_per_second'], time.time()))
+    connection.executemany('INSERT INTO stats VALUES (?, ?, ?, ?, ?)',
+                           [(run,) + row for row in run_stats(meta)])
+    return run
+
+
+def add_run(connection, test_name):
+    # add or replace the run saved in data/<test_name>/, returns its run ID
+    # one transaction: the run and its statistics are committed together
+    with connection:
+        return insert_run(connection, test_name)
+
+
+def index_runs(test_names, path=CATALOG_PATH):
+    connection = connect(path)
+    try:
+        return [add_run(connection, test_name) for test_name in test_names]
+    finally:
+        connection.close()
+
+
+def rebuild(path=CATALOG_PATH):
+    # a new catalog of the runs in data/, the runs whose folder was overwritten are lost
+    for suffix in ['', '-wal', '-shm']:
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    connection = connect(path)
+    try:
+        return connection.execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+    finally:
+        connection.close()
+
+
+def query(sql, parameters=(), path=CATALOG_PATH):
+    connection = connect(path)
+    try:
+        return [dict(row) for row in connection.execute(sql, parameters)]
+    finally:
+        connection.close()
+
+
+def latest_runs(path=CATALOG_PATH):
+    # the latest run of every test, with the number of runs of the test
+    return query("""
+        SELECT runs.*, counts.runs FROM runs
+        JOIN (SELECT test_name, MAX(start_time) AS start_time, COUNT(*) AS runs FROM runs GROUP BY test_name) counts
+        USING (test_name, start_time)
+        ORDER BY runs.test_name
+        """, path=path)
+
+
+def trend(test_name, metric=DEFAULT_METRIC, statistic=DEFAULT_STATISTIC, limit=TREND_LIMIT, path=CATALOG_PATH):
+    # statistic of metric over the last limit runs of test_name, oldest first
+    points = query("""
+        SELECT runs.run_id, runs.start_time, stats.value, stats.unit FROM runs
+        JOIN stats ON stats.run_id = runs.run_id AND stats.metric = ? AND stats.statistic = ?
+        WHERE runs.test_name = ?
+        ORDER BY runs.start_time DESC LIMIT ?
+        """, (metric, statistic, test_name, limit), path)
+    return points[::-1]
+
+
+def top_regressions(metric=DEFAULT_METRIC, statistic=DEFAULT_STATISTIC, top=TOP_REGRESSIONS, baseline_runs=BASELINE_RUNS, path=CATALOG_PATH):
+    # the tests whose latest run is the most worse than the mean of the baseline_runs
+    # before it, on statistic of metric; change is relative, positive when worse.
+    # One index lookup per test, however many runs each has
+    sign = -1 if metric in HIGHER_IS_BETTER else 1
+    connection = connect(path)
+    try:
+        regressions = []
+        for (test_name,) in connection.execute('SELECT DISTINCT test_name FROM runs').fetchall():
+            recent = connection.execute("""
+                SELECT runs.run_id, runs.start_time, stats.value FROM runs
+                JOIN stats ON stats.run_id = runs.run_id AND stats.metric = ? AND stats.statistic = ?
+                WHERE runs.test_name = ?
+                ORDER BY runs.start_time DESC LIMIT ?
+                """, (metric, statistic, test_name, baseline_runs + 1)).fetchall()
+            if len(recent) < 2:
+                continue
+            baseline = sum(row['value'] for row in recent[1:]) / (len(recent) - 1)
+            if baseline <= 0:
+                continue
+            change = sign * (recent[0]['value'] / baseline - 1)
+            if change > 0:
+                regressions.append(dict(recent[0], test_name=test_name, baseline=baseline, baseline_runs=len(recent) - 1, change=change))
+    finally:
+        connection.close()
+    regressions.sort(key=lambda regression: regression['change'], reverse=True)
+    return regressions[:top]
+
+
+def option(args, name, default):
+    # value of --name <value> in args, removed from them
+    if name not in args:
+        return default
+    i = args.index(name)
+    value = int(args[i + 1])
+    del args[i:i + 2]
+    return value
+
+
+def command(args):
+    # the result of a command line, also run by the analysis worker (worker.py)
+    args = list(args)
+    limit = option(args, '--limit', TREND_LIMIT)
+    top = option(args, '--top', TOP_REGRESSIONS)
+    baseline = option(args, '--baseline', BASELINE_RUNS)
+    if not args:
+        raise ValueError("No catalog command")
+    name, args = args[0], args[1:]
+    if name == 'index' and args:
+        return index_runs(args)
+    if name == 'rebuild':
+        return rebuild()
+    if name == 'list':
+        return latest_runs()
+    if name == 'trend' and 1 <= len(args) <= 3:
+        return trend(*args, limit=limit)
+    if name == 'regressions' and len(args) <= 2:
+        return top_regressions(*args, top=top, baseline_runs=baseline)
+    raise ValueError("Unknown catalog command " + ' '.join([name] + args))
+
+
+# main
+if __name__ == "__main__":
+    try:
+        result = command(sys.argv[1:])
+    except ValueError as e:
+        print(e)
+        print("Usage: python3 catalog.py index <test_name> [...] | rebuild | list | trend <test_name> [metric] [statistic] [--limit N] | regressions [metric] [statistic] [--top N] [--baseline N]")
+        sys.exit(1)
+    print(json.dumps(result))
@@ -1,14 +1,84 @@
+import json
+import os
 import sys
-from analyzer import Analyzer
+from analyzer import Analyzer, ERRORS_ANALYSIS, STAGES_ANALYSIS, run_metrics
+from aggregates import LATENCY_COLUMNS, RESPONSE_TIME_COLUMN
+from regression import compare_runs, save_verdict, verdict_html, verdict_path, CONFIDENCE, RESAMPLES, THRESHOLD
+
+# analyses of every run, before the columns of its raw data
+ANALYSES = ['RequestsPerSecond']
+# exit status of compare.py --gate when a run regressed or could not be checked
+GATE_EXIT_CODE = 2
+
+
+def comparable_analyses(test_names):
+    # analyses saved for every test, in the report order of the first one: requests per
+    # second, the columns of its raw data schema (response times only for arrival-rate
+    # runs), the failed requests of runs that record them and the load stages of staged runs
+    data_path = 'data/' + test_names[0] + '/'
+    try:
+        with open(data_path + 'benchmark.json') as f:
+            columns = [metric['name'] for metric in run_metrics(json.load(f), data_path)]
+    except OSError:
+        # only the analyses were kept
+        columns = LATENCY_COLUMNS + [RESPONSE_TIME_COLUMN]
+    candidates = ANALYSES + columns + [ERRORS_ANALYSIS, STAGES_ANALYSIS]
+    analyses = []
+    for name in candidates:
+        if name not in analyses and all(os.path.exists('data/' + test_name + '/' + name + '.json') for test_name in test_names):
+            analyses.append(name)
+    return analyses
+
+
+# write the comparison report of two or more tests, also used by the analysis worker (worker.py).
+# Returns the regression verdict of the runs against the first one, also saved as
+# comparisons/<tests>_verdict.json, or None when the raw data of a run is missing
+def compare(test_names, confidence=CONFIDENCE, threshold=THRESHOLD, resamples=RESAMPLES):
+    analyzer = Analyzer(*test_names)
+    try:
+        verdict = compare_runs(test_names, confidence, threshold, resamples)
+    except (OSError, ValueError) as e:
+        # comparisons of runs of which only the analyses were kept still get their charts
+        print("No regression check, the raw data of every run is needed: " + str(e))
+        verdict = None
+    if verdict is not None:
+        save_verdict(verdict, test_names)
+    elif os.path.exists(verdict_path(test_names)):
+        os.remove(verdict_path(test_names))
+    analyzer.compare_tests(comparable_analyses(test_names), verdict_html(verdict) if verdict is not None else '')
+    return verdict
+
+
+def option(args, name, default):
+    # value of --name <value> in args, removed from them
+    if name not in args:
+        return default
+    i = args.index(name)
+    value = float(args[i + 1])
+    del args[i:i + 2]
+    return value
+
 
 def main():
-    if len(sys.argv) != 3:
-        print("Usage: python3 compare_tests.py <test_1_name> <test_2_name>")
+    # --gate exits with GATE_EXIT_CODE when a run regressed, for CI pipelines
+    # --threshold: smallest relative change that counts (0.05), --confidence: of the
+    # bootstrap intervals (0.95), --resamples: bootstrap resamples (2000)
+    args = sys.argv[1:]
+    gate = '--gate' in args
+    args = [arg for arg in args if arg != '--gate']
+    threshold = option(args, '--threshold', THRESHOLD)
+    confidence = option(args, '--confidence', CONFIDENCE)
+    resamples = int(option(args, '--resamples', RESAMPLES))
+    if len(args) < 2:
+        print("Usage: python3 compare.py <test_1_name> <test_2_name> [<test_name> ...] [--gate] [--threshold 0.05] [--confidence 0.95] [--resamples 2000]")
         sys.exit(1)
-    # create analyzer
-
-    analyzer = Analyzer(sys.argv[1], sys.argv[2])
-    analyzer.compare_tests(['RequestsPerSecond', 'QueryDuration', 'RequestDuration'])
+    verdict = compare(args, confidence, threshold, resamples)
+    if verdict is not None:
+        print("Regression check against " + args[0] + ": " + verdict['verdict'])
+        for run in verdict['runs']:
+            print("  " + run['test'] + ": " + run['verdict'])
+    if gate and (verdict is None or verdict['verdict'] == 'regressed'):
+        sys.exit(GATE_EXIT_CODE)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
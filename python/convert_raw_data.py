@@ -0,0 +1,42 @@
+import glob
+import os
+import sys
+import numpy as np
+import pandas as pd
+from aggregates import RAW_COLUMNS
+from rawdata import RawDataWriter, RAW_DATA_FILE, CSV_DATA_FILE
+
+# converts data.csv of existing runs to the binary data.bin format
+# usage: python3 convert_raw_data.py [test_name ...] (all runs in data/ by default)
+
+
+def convert(data_path, chunk_size=1000000):
+    csv_path = data_path + CSV_DATA_FILE
+    tmp_path = data_path + RAW_DATA_FILE + '.tmp'
+    data_types = {column: np.int64 for column in RAW_COLUMNS}
+    # one block per chunk so memory use does not depend on the run size
+    with RawDataWriter(tmp_path, RAW_COLUMNS) as writer:
+        with pd.read_csv(csv_path, header=None, names=RAW_COLUMNS, dtype=data_types, chunksize=chunk_size) as reader:
+            for chunk in reader:
+                writer.write_block({column: chunk[column].to_numpy() for column in RAW_COLUMNS})
+    os.replace(tmp_path, data_path + RAW_DATA_FILE)
+
+
+def main():
+    if len(sys.argv) > 1:
+        data_paths = ['data/' + name + '/' for name in sys.argv[1:]]
+    else:
+        data_paths = sorted(os.path.dirname(path) + '/' for path in glob.glob('data/*/' + CSV_DATA_FILE))
+    for data_path in data_paths:
+        if not os.path.exists(data_path + CSV_DATA_FILE):
+            print("Skipping " + data_path + ": no " + CSV_DATA_FILE)
+            continue
+        if os.path.exists(data_path + RAW_DATA_FILE) and len(sys.argv) == 1:
+            print("Skipping " + data_path + ": already converted")
+            continue
+        convert(data_path)
+        print("Converted " + data_path + CSV_DATA_FILE + " to " + RAW_DATA_FILE)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import os
+import numpy as np
+
+# Downsampling of the per-second series drawn in the reports, so report.html and
+# the comparison pages stay the same size whatever the test duration.
+#
+# The series is split into equal buckets and the lowest and highest point of
+# every bucket are kept (plus the first and last point), so spikes and dips stay
+# visible where an average or LTTB would smooth them away. Buckets that only hold
+# NaN (seconds without requests) keep one NaN point so the gap is still drawn.
+# Summary statistics are always computed from the full data, not from this.
+
+# points per chart series, override with REPORT_MAX_POINTS
+DEFAULT_MAX_POINTS = 2000
+# file holding the full resolution series of a downsampled chart, next to <name>.json
+SERIES_FILE_SUFFIX = '.series.json'
+
+
+def max_points():
+    return int(os.environ.get('REPORT_MAX_POINTS', DEFAULT_MAX_POINTS))
+
+
+def minmax_indexes(y, max_points):
+    # sorted indexes of the points kept from y, all of them when they fit
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= max_points or max_points < 4:
+        return np.arange(n)
+    buckets = (max_points - 2) // 2
+    interior = y[1:-1]
+    edges = np.linspace(0, len(interior), buckets + 1).astype(np.int64)
+    bucket = np.repeat(np.arange(buckets), np.diff(edges))
+    nan = np.isnan(interior)
+    # within each bucket the smallest value sorts first, NaN last
+    lowest = np.lexsort((np.where(nan, np.inf, interior), bucket))[edges[:-1]]
+    highest = np.lexsort((np.where(nan, np.inf, -interior), bucket))[edges[:-1]]
+    return np.unique(np.concatenate(([0], lowest + 1, highest + 1, [n - 1])))
+
+
+def downsample(x, y, max_points):
+    # (x, y) lists with at most max_points points
+    indexes = minmax_indexes(y, max_points)
+    if len(indexes) == len(y):
+        return x, y
+    x = np.asarray(x)[indexes]
+    y = np.asarray(y, dtype=np.float64)[indexes]
+    return x.tolist(), y.tolist()
+
+
+def downsample_chart_data(chart_data, max_points):
+    # downsample the per-second series of an analyzed_data dict in place.
+    # returns the full resolution series, or None when it already fit
+    # rolling percentile lines are derived data, they are only downsampled
+    rolling = chart_data.get('rolling_percentiles_chart_data')
+    if rolling is not None:
+        for line in rolling['lines']:
+            line['x'], line['y'] = downsample(line['x'], line['y'], max_points)
+    # lines drawn next to the series (errors per class), downsampled the same way
+    for line in chart_data.get('extra_lines', []):
+        line['x'], line['y'] = downsample(line['x'], line['y'], max_points)
+    series = chart_data['average_data_per_second_chart_data']
+    points = len(series['y'])
+    if points <= max_points:
+        return None
+    full_resolution = {'x': series['x'], 'y': series['y']}
+    series['x'], series['y'] = downsample(series['x'], series['y'], max_points)
+    series['full_resolution_points'] = points
+    return full_resolution
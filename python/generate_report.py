@@ -1,33 +1,71 @@
 import sys
-from analyzer import Analyzer
+from analyzer import Analyzer, display_name
 
 
+# descriptions of the columns measured by the runner, configured metrics have their own
+DESCRIPTIONS = {
+    'QueryDuration': """
+                        This represents the lookup duration of the client's ip in the server.
+                        In this test, the server is storing the ip addresses in a hash table along with the number of requests made by this ip.
+                        """,
+    'RequestDuration': """
+                        This represents the whole request duration from the moment the request is received by the server until the response is sent back to the client.
+                        """,
+    'TimeToFirstByte': """
+                        This represents the time from sending the request until the response headers were received, the request duration also includes reading the body.
+                        """,
+    'ResponseBytes': """
+                        This represents the size of the response bodies.
+                        """,
+    'ResponseTime': """
+                        This represents the response time seen by a client arriving on schedule: from the moment the request was meant to be sent until the response was received.
+                        Unlike the request duration, it includes the time the request waited to be sent when every connection was busy, so a stalled server is not hidden (coordinated omission).
+                        """,
+}
 
-# main
-if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python3 generate_report.py <unique_test_name>")
-        sys.exit(1)
+
+# generate data/<test_name>/report.html, also used by the analysis worker (worker.py)
+def generate_report(test_name, streaming=False, histogram=False, use_cache=True):
     # create analyzer
-    analyzer = Analyzer(sys.argv[1])
+    analyzer = Analyzer(test_name)
     # load data
-    analyzer.load_data()
+    analyzer.load_data(streaming=streaming or histogram, histogram_digits=3 if histogram else None, use_cache=use_cache)
     # analyze requests per second
     test_description = """
                         This represents the number of requests processed by the server per second.
                         """
     analyzer.analyze_requests_per_second(test_description=test_description)
-    # analyze lookup duration
-    test_description = """
-                        This represents the lookup duration of the client's ip in the server.
-                        In this test, the server is storing the ip addresses in a hash table along with the number of requests made by this ip.
-                        """
-                        
-    analyzer.analyze_latency('QueryDuration', 'Query Duration', test_description=test_description)
-    # analyze request duration
-    test_description = """
-                        This represents the whole request duration from the moment the request is received by the server until the response is sent back to the client.
-                        """
-    analyzer.analyze_latency('RequestDuration', 'Request Duration', test_description=test_description)
+    # one analysis per column of the run (metrics read from the responses, durations measured by the runner)
+    for metric in analyzer.metrics:
+        test_description = metric.get('description') or DESCRIPTIONS.get(metric['name'], '')
+        analyzer.analyze_latency(metric['name'], display_name(metric['name']), test_description=test_description, unit=metric['unit'])
+    if analyzer.error_classes is not None:
+        # runs that record failed requests
+        test_description = """
+                            This represents the failed requests per second by error class: no connection, timeout, 4xx or 5xx status, unreadable body or a metric missing from the response.
+                            """
+        analyzer.analyze_errors(test_description=test_description)
+    if analyzer.stages:
+        # staged runs (Stages or LoadProfile)
+        test_description = """
+                            This represents the throughput and latency of every load stage, once it settled (the first 20% of each stage is left out).
+                            The maximum sustainable throughput is the throughput of the last stage before the knee, where the latency climbs while the throughput flattens.
+                            """
+        analyzer.analyze_stages(test_description=test_description)
     # create report
     analyzer.create_test_report_html()
+
+
+# main
+if __name__ == "__main__":
+    # --streaming reads the raw data in chunks instead of loading it at once (for very long runs)
+    # --histogram also summarizes latencies with histograms, keeping memory bounded
+    # --no-cache recomputes everything instead of using data/<test>/.cache/
+    histogram = '--histogram' in sys.argv[1:]
+    streaming = '--streaming' in sys.argv[1:] or histogram
+    use_cache = '--no-cache' not in sys.argv[1:]
+    args = [arg for arg in sys.argv[1:] if arg not in ('--streaming', '--histogram', '--no-cache')]
+    if len(args) != 1:
+        print("Usage: python3 generate_report.py <unique_test_name> [--streaming] [--histogram] [--no-cache]")
+        sys.exit(1)
+    generate_report(args[0], streaming=streaming, histogram=histogram, use_cache=use_cache)
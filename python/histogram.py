@@ -0,0 +1,174 @@
+import json
+import math
+import numpy as np
+from aggregates import PERCENTILES, percentile_label
+
+# Log-bucketed (HDR style) latency histogram, same bucket layout as
+# internal/models/histogram.go so the files saved by the runner can be loaded
+# and merged here.
+#
+# Values below 2^sub_bucket_bits are counted exactly, above that each power of
+# two range is split into 2^(sub_bucket_bits - 1) buckets. A value reported by
+# value_at_quantile() is the highest value of the bucket holding the exact
+# empirical quantile (lower nearest rank), so it is never below the exact
+# quantile and at most 2^-(sub_bucket_bits - 1) (< 10^-significant_digits)
+# above it, relative to the exact value.
+HISTOGRAM_FILE_SUFFIX = '.histogram.json'
+DEFAULT_SIGNIFICANT_DIGITS = 3
+
+
+def sub_bucket_bits_for(significant_digits):
+    return int(math.ceil(math.log2(2 * 10 ** significant_digits)))
+
+
+class LatencyHistogram:
+
+    def __init__(self, significant_digits=DEFAULT_SIGNIFICANT_DIGITS):
+        significant_digits = min(max(int(significant_digits), 1), 5)
+        self.significant_digits = significant_digits
+        self.sub_bucket_bits = sub_bucket_bits_for(significant_digits)
+        self.half_count = 1 << (self.sub_bucket_bits - 1)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.total_count = 0
+        self.min = None
+        self.max = None
+        # running mean and sum of squared differences, merged like the Go side
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def bucket_indexes(self, values):
+        # vectorized bucket index of every value
+        values = np.maximum(np.asarray(values, dtype=np.int64), 0)
+        # bit length from the float exponent, corrected below where rounding to
+        # float64 moved a large value to the next power of two
+        bit_length = np.frexp(values.astype(np.float64))[1].astype(np.int64)
+        magnitude = np.maximum(bit_length - self.sub_bucket_bits, 0)
+        sub = values >> magnitude
+        too_large = sub >= 2 * self.half_count
+        magnitude[too_large] += 1
+        too_small = (magnitude > 0) & ((values >> magnitude) < self.half_count)
+        magnitude[too_small] -= 1
+        sub = values >> magnitude
+        return magnitude * self.half_count + sub
+
+    def bucket_ranges(self, indexes):
+        # lowest and highest value of each bucket
+        indexes = np.asarray(indexes, dtype=np.int64)
+        magnitude = np.maximum(indexes // self.half_count - 1, 0)
+        sub = indexes - magnitude * self.half_count
+        return sub << magnitude, ((sub + 1) << magnitude) - 1
+
+    def record_array(self, values):
+        values = np.asarray(values, dtype=np.int64)
+        if len(values) == 0:
+            return
+        counts = np.bincount(self.bucket_indexes(values))
+        self._add_counts(counts)
+        other_mean = values.mean(dtype=np.float64)
+        other_m2 = float(((values - other_mean) ** 2).sum(dtype=np.float64))
+        self._merge_moments(len(values), int(values.min()), int(values.max()), float(other_mean), other_m2)
+
+    def _add_counts(self, counts):
+        if len(counts) > len(self.counts):
+            self.counts = np.pad(self.counts, (0, len(counts) - len(self.counts)))
+        self.counts[:len(counts)] += counts
+
+    def _merge_moments(self, count, minimum, maximum, mean, m2):
+        # parallel variance merge (Chan et al.)
+        total = self.total_count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.total_count * count / total
+        self.total_count = total
+        self.min = minimum if self.min is None else min(self.min, minimum)
+        self.max = maximum if self.max is None else max(self.max, maximum)
+
+    def merge(self, other):
+        if other.sub_bucket_bits != self.sub_bucket_bits:
+            raise ValueError(f"Cannot merge histograms with {self.significant_digits} and {other.significant_digits} significant digits")
+        if other.total_count == 0:
+            return self
+        self._add_counts(other.counts)
+        self._merge_moments(other.total_count, other.min, other.max, other.mean, other.m2)
+        return self
+
+    def values_at_quantiles(self, quantiles):
+        # one cumulative sum, then a binary search per quantile: O(buckets)
+        if self.total_count == 0:
+            return [0 for _ in quantiles]
+        cumulative = np.cumsum(self.counts)
+        ranks = np.maximum(np.ceil(np.asarray(quantiles, dtype=np.float64) * self.total_count), 1)
+        indexes = np.searchsorted(cumulative, ranks, side='left')
+        _, highest = self.bucket_ranges(indexes)
+        return np.clip(highest, self.min, self.max).tolist()
+
+    def value_at_quantile(self, quantile):
+        return self.values_at_quantiles([quantile])[0]
+
+    @property
+    def std(self):
+        if self.total_count < 2:
+            return float('nan')
+        return math.sqrt(self.m2 / (self.total_count - 1))
+
+    def describe(self, percentiles=PERCENTILES):
+        # same keys as Series.describe(), percentiles within the histogram precision
+        description = {
+            'count': float(self.total_count),
+            'mean': self.mean,
+            'std': self.std,
+            'min': float(self.min),
+        }
+        for p, value in zip(percentiles, self.values_at_quantiles(percentiles)):
+            description[percentile_label(p)] = float(value)
+        description['max'] = float(self.max)
+        return description
+
+    def to_dict(self, name):
+        indexes = np.nonzero(self.counts)[0]
+        return {
+            'name': name,
+            'significant_digits': self.significant_digits,
+            'sub_bucket_bits': self.sub_bucket_bits,
+            'total_count': self.total_count,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.mean,
+            'm2': self.m2,
+            'buckets': [[int(i), int(self.counts[i])] for i in indexes],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data['significant_digits'])
+        if histogram.sub_bucket_bits != data['sub_bucket_bits']:
+            raise ValueError("Unexpected sub bucket bits " + str(data['sub_bucket_bits']))
+        if data['total_count'] == 0:
+            return histogram
+        buckets = np.asarray(data['buckets'], dtype=np.int64).reshape(-1, 2)
+        histogram.counts = np.bincount(buckets[:, 0], weights=buckets[:, 1]).astype(np.int64)
+        histogram.total_count = data['total_count']
+        histogram.min = data['min']
+        histogram.max = data['max']
+        histogram.mean = data['mean']
+        histogram.m2 = data['m2']
+        return histogram
+
+    def save(self, data_path, name):
+        with open(data_path + name + HISTOGRAM_FILE_SUFFIX, 'w') as f:
+            json.dump(self.to_dict(name), f)
+
+
+def load_histogram(data_path, name):
+    with open(data_path + name + HISTOGRAM_FILE_SUFFIX) as f:
+        return LatencyHistogram.from_dict(json.load(f))
+
+
+def merge_histograms(histograms):
+    histograms = list(histograms)
+    if len(histograms) == 0:
+        raise ValueError("No histograms to merge")
+    merged = LatencyHistogram(histograms[0].significant_digits)
+    for histogram in histograms:
+        merged.merge(histogram)
+    return merged
@@ -0,0 +1,140 @@
+import json
+import os
+import sys
+import time
+import numpy as np
+from aggregates import StreamingAggregator, successful_rows, LATENCY_COLUMNS
+from histogram import LatencyHistogram
+from rawdata import RawDataFile, RAW_DATA_FILE
+
+# Follows a test while it is running: the Go runner appends a block of samples to
+# data.bin every LiveFlushInterval, every tick here reads only the blocks added
+# since the previous one (O(new rows)) into a histogram based StreamingAggregator
+# and writes the summary to data/<test>/live.json.
+# Stops once the runner saves benchmark.json at the end of the test.
+# usage: python3 live.py <test_name> [--interval seconds] [--once]
+LIVE_FILE = 'live.json'
+# recent per-second values included in the summary
+LIVE_WINDOW_SECONDS = 60
+
+
+class LiveAnalysis:
+
+    def __init__(self, data_path, histogram_digits=3):
+        self.data_path = data_path
+        self.histogram_digits = histogram_digits
+        # rolling percentiles are not needed here, they would make every tick O(run length)
+        self.aggregator = StreamingAggregator(LATENCY_COLUMNS, histogram_digits, rolling=False)
+        # latencies of the rows read by the last poll()
+        self.recent = {column: LatencyHistogram(histogram_digits) for column in LATENCY_COLUMNS}
+        self.raw = None
+        self.next_block = 0
+        # failed requests read so far, they are left out of the latencies
+        self.failed = 0
+
+    def open(self):
+        path = self.data_path + RAW_DATA_FILE
+        try:
+            self.raw = RawDataFile(path)
+        except (OSError, ValueError):
+            # not created yet, or the header is not written yet
+            self.raw = None
+        return self.raw is not None
+
+    def poll(self):
+        # read the blocks appended since the last poll, returns the number of new rows
+        if self.raw is None and not self.open():
+            return 0
+        self.raw.refresh()
+        self.recent = {column: LatencyHistogram(self.histogram_digits) for column in LATENCY_COLUMNS}
+        rows = 0
+        for index in range(self.next_block, len(self.raw.blocks)):
+            block = self.raw.block(index)
+            block_rows = len(block['StartTime'])
+            block = successful_rows(block)
+            self.failed += block_rows - len(block['StartTime'])
+            rows += block_rows
+            latencies = {column: block[column] for column in LATENCY_COLUMNS}
+            self.aggregator.update(block['StartTime'], latencies)
+            for column, data in latencies.items():
+                self.recent[column].record_array(data)
+        self.next_block = len(self.raw.blocks)
+        return rows
+
+    def summary(self, finished=False):
+        aggregator = self.aggregator
+        summary = {'updated_at': time.time(), 'finished': finished, 'rows': aggregator.rows, 'failed': self.failed}
+        if aggregator.rows == 0:
+            return summary
+        # the last second is still being filled until the test is finished
+        complete = aggregator.seconds if finished else aggregator.seconds - 1
+        window = slice(max(complete - LIVE_WINDOW_SECONDS, 0), max(complete, 0))
+        counts = aggregator.counts[window]
+        summary['first_second'] = aggregator.first_second
+        summary['seconds'] = aggregator.seconds
+        # unix second of the first value of every recent list
+        summary['recent_first_second'] = aggregator.first_second + window.start
+        summary['requests_per_second'] = {
+            'overall': aggregator.rows / aggregator.seconds,
+            'recent': counts.tolist(),
+        }
+        summary['latency'] = {}
+        for column in LATENCY_COLUMNS:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means = aggregator.sums[column][window] / counts
+            summary['latency'][column] = {
+                # percentiles within the histogram precision, nanoseconds
+                'overall': aggregator.describe(column),
+                'last_poll': self.recent[column].describe() if self.recent[column].total_count > 0 else None,
+                'recent_mean_per_second': [None if np.isnan(mean) else float(mean) for mean in means],
+            }
+        return summary
+
+    def publish(self, finished=False):
+        # replaced atomically, readers never see a partial file
+        path = self.data_path + LIVE_FILE
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.summary(finished), f)
+        os.replace(tmp_path, path)
+
+
+def finished_since(data_path, start):
+    # benchmark.json is written by the runner once the test is over
+    try:
+        return os.path.getmtime(data_path + 'benchmark.json') >= start
+    except OSError:
+        return False
+
+
+def follow(test_name, interval=1.0, once=False):
+    data_path = 'data/' + test_name + '/'
+    start = time.time()
+    live = LiveAnalysis(data_path)
+    while True:
+        finished = once or finished_since(data_path, start)
+        live.poll()
+        if live.raw is not None:
+            live.publish(finished)
+        if finished:
+            return live
+        time.sleep(interval)
+
+
+def main():
+    args = sys.argv[1:]
+    interval = 1.0
+    if '--interval' in args:
+        i = args.index('--interval')
+        interval = float(args[i + 1])
+        del args[i:i + 2]
+    once = '--once' in args
+    args = [arg for arg in args if arg != '--once']
+    if len(args) != 1:
+        print("Usage: python3 live.py <test_name> [--interval seconds] [--once]")
+        sys.exit(1)
+    follow(args[0], interval, once)
+
+
+if __name__ == "__main__":
+    main()
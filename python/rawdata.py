@@ -0,0 +1,200 @@
+import glob
+import os
+import numpy as np
+from aggregates import RAW_COLUMNS
+
+# Binary raw data file written by the Go runner next to data.csv, see
+# internal/models/rawdata.go for the layout:
+#   header: magic "APTRAW01" | uint32 column count | uint32 reserved | column names (32 bytes each)
+#   blocks: int64 row count | column 0 values | column 1 values | ...
+RAW_DATA_FILE = 'data.bin'
+CSV_DATA_FILE = 'data.csv'
+# distributed runs: one data.bin per agent in data/<test>/parts/<part>/
+PARTS_FOLDER = 'parts/'
+MAGIC = b'APTRAW01'
+COLUMN_NAME_SIZE = 32
+INT64 = np.dtype('<i8')
+
+
+class RawDataFile:
+
+    # opens a data.bin file with numpy.memmap. Columns are returned as int64
+    # views of the mapped file, nothing is parsed or copied.
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(16)
+            if len(header) < 16 or header[:8] != MAGIC:
+                raise ValueError(path + " is not a raw data file")
+            column_count = int(np.frombuffer(header, dtype='<u4', count=1, offset=8)[0])
+            names = f.read(COLUMN_NAME_SIZE * column_count)
+        self.columns = [names[i * COLUMN_NAME_SIZE:(i + 1) * COLUMN_NAME_SIZE].rstrip(b'\0').decode() for i in range(column_count)]
+        self.data_offset = 16 + COLUMN_NAME_SIZE * column_count
+        self.map = None
+        self.blocks = []
+        self.refresh()
+
+    def refresh(self):
+        # (re)scan the block index, a block still being written at the end of
+        # the file is ignored until it is complete
+        size = os.path.getsize(self.path)
+        if size == self.data_offset:
+            self.map = None
+            self.blocks = []
+            self.size = size
+            return
+        self.map = np.memmap(self.path, dtype=np.uint8, mode='r')
+        offset = self.blocks[-1][0] + 8 + self.blocks[-1][1] * 8 * len(self.columns) if self.blocks else self.data_offset
+        while offset + 8 <= size:
+            rows = int(self.map[offset:offset + 8].view(INT64)[0])
+            end = offset + 8 + rows * 8 * len(self.columns)
+            if end > size:
+                break
+            self.blocks.append((offset, rows))
+            offset = end
+        self.size = offset
+
+    @property
+    def rows(self):
+        return sum(rows for _, rows in self.blocks)
+
+    def block(self, index):
+        # dict column name -> int64 array for one block
+        offset, rows = self.blocks[index]
+        values = self.map[offset + 8:offset + 8 + rows * 8 * len(self.columns)].view(INT64).reshape(len(self.columns), rows)
+        return {name: values[i] for i, name in enumerate(self.columns)}
+
+    def iter_chunks(self, chunk_size=1000000, first_block=0):
+        # yield views of at most chunk_size rows, block by block
+        for index in range(first_block, len(self.blocks)):
+            block = self.block(index)
+            rows = self.blocks[index][1]
+            for start in range(0, rows, chunk_size):
+                yield {name: values[start:start + chunk_size] for name, values in block.items()}
+
+    def read_columns(self):
+        # all rows; zero-copy for the usual single block file
+        if len(self.blocks) == 1:
+            return self.block(0)
+        if len(self.blocks) == 0:
+            return {name: np.zeros(0, dtype=np.int64) for name in self.columns}
+        blocks = [self.block(i) for i in range(len(self.blocks))]
+        return {name: np.concatenate([block[name] for block in blocks]) for name in self.columns}
+
+
+class RawDataWriter:
+
+    # writes data.bin files the same way the Go runner does
+    def __init__(self, path, columns):
+        self.columns = list(columns)
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.file.write(np.array([len(self.columns), 0], dtype='<u4').tobytes())
+        for column in self.columns:
+            name = column.encode()
+            if len(name) > COLUMN_NAME_SIZE:
+                raise ValueError("Column name too long: " + column)
+            self.file.write(name.ljust(COLUMN_NAME_SIZE, b'\0'))
+
+    def write_block(self, columns):
+        # columns: dict column name -> int64 array, all of the same length
+        rows = len(columns[self.columns[0]])
+        self.file.write(np.array([rows], dtype=INT64).tobytes())
+        for column in self.columns:
+            values = np.ascontiguousarray(columns[column], dtype=INT64)
+            if len(values) != rows:
+                raise ValueError("All columns of a block must have the same length")
+            self.file.write(values.tobytes())
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def raw_data_path(data_path):
+    # data.bin when the run has one, None for runs that only have data.csv
+    path = data_path + RAW_DATA_FILE
+    return path if os.path.exists(path) else None
+
+
+def raw_data_source(data_path):
+    # file the raw samples are read from: data.bin, or data.csv for older runs
+    return raw_data_path(data_path) or data_path + CSV_DATA_FILE
+
+
+def part_paths(data_path):
+    # data.bin of every part of a distributed run, empty for single process runs
+    return sorted(glob.glob(data_path + PARTS_FOLDER + '*/' + RAW_DATA_FILE))
+
+
+def raw_data_sources(data_path):
+    # files the raw samples are read from, one after the other
+    return part_paths(data_path) or [raw_data_source(data_path)]
+
+
+class _LimitedReader:
+
+    # file wrapper that stops after limit bytes, so pandas never sees a
+    # partially written last line
+    def __init__(self, f, limit):
+        self.f = f
+        self.remaining = limit
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+
+class RawDataReader:
+
+    # reads the rows of data.bin or data.csv starting at a byte position.
+    # after chunks() is exhausted, position is where the next unread row starts,
+    # so a file that keeps growing can be read again from there later
+    def __init__(self, path, position=None):
+        self.path = path
+        self.binary = not path.endswith(CSV_DATA_FILE)
+        self.position = position
+
+    def chunks(self, chunk_size=1000000):
+        if self.binary:
+            yield from self._binary_chunks(chunk_size)
+        else:
+            yield from self._csv_chunks(chunk_size)
+
+    def _binary_chunks(self, chunk_size):
+        raw = RawDataFile(self.path)
+        for index, (offset, rows) in enumerate(raw.blocks):
+            if self.position is not None and offset < self.position:
+                continue
+            block = raw.block(index)
+            for start in range(0, rows, chunk_size):
+                yield {name: values[start:start + chunk_size] for name, values in block.items()}
+        self.position = raw.size
+
+    def _csv_chunks(self, chunk_size):
+        # pandas is only needed for runs without data.bin
+        import pandas as pd
+        position = self.position or 0
+        with open(self.path, 'rb') as f:
+            # only complete lines are read
+            end = os.path.getsize(self.path)
+            while end > position:
+                f.seek(end - 1)
+                if f.read(1) == b'\n':
+                    break
+                end -= 1
+            if end > position:
+                f.seek(position)
+                data_types = {column: np.int64 for column in RAW_COLUMNS}
+                with pd.read_csv(_LimitedReader(f, end - position), header=None, names=RAW_COLUMNS, dtype=data_types, chunksize=chunk_size) as reader:
+                    for chunk in reader:
+                        yield {column: chunk[column].to_numpy() for column in RAW_COLUMNS}
+        self.position = end
@@ -0,0 +1,293 @@
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from aggregates import NS_PER_SECOND, percentile_label, successful_rows
+from analyzer import Analyzer, DURATION_UNIT
+from histogram import LatencyHistogram
+
+# Regression gate of comparisons: is a difference between runs real or noise?
+#
+# Every run is compared to the first one (the baseline) on its steady state (the
+# warm-up found by the analyzer is left out): the requests per second and the
+# latency columns all runs have. For each statistic (mean and tail percentiles) a
+# bootstrap gives the confidence interval of the relative change, and the whole
+# distributions are compared with the Mann-Whitney U and Kolmogorov-Smirnov tests
+# and Cliff's delta (effect size). A statistic regressed when its interval lies
+# entirely on the worse side of 0 and reaches the threshold, and one of the two
+# tests finds the distributions different (p-value below half of 1 - confidence,
+# Bonferroni corrected for the two tests); it improved in the opposite case. So
+# a change is unchanged when it may be 0 or is shown to be smaller than the
+# threshold, and a shift of exactly the threshold is caught: its point estimate
+# falls below the threshold half of the time, its interval reaches it. A run
+# regressed when any statistic did.
+#
+# Percentiles are bootstrapped without resampling the rows: the k-th smallest of
+# n values drawn from the sorted sample is the value at index floor(n * U) where
+# U ~ Beta(k, n - k + 1), the k-th smallest of n uniforms, so a resample costs a
+# few random numbers whatever the size of the run. Means are bootstrapped from a
+# log-bucketed histogram of the sample (histogram.py, MEAN_HISTOGRAM_DIGITS): a
+# resample of the n rows puts a multinomial number of them in every bucket, and its
+# mean is the sum of those counts times the mean of each bucket. That costs a draw
+# per bucket, about a hundred of them, instead of one per row. Only the spread of
+# the values within a bucket is left out, less than 0.1% of the variance of
+# latencies. Each run is loaded and resampled in its own process, in parallel, with
+# its own seeded generator; only the comparisons run in the caller.
+
+CONFIDENCE = 0.95
+# smallest relative change reported as a regression or an improvement: a change
+# whose confidence interval lies below it is unchanged
+THRESHOLD = 0.05
+RESAMPLES = 2000
+# rows of a run used per column, longer runs are sampled uniformly
+MAX_SAMPLE_ROWS = 1000000
+# buckets of the histograms means are resampled from, about 4% wide
+MEAN_HISTOGRAM_DIGITS = 1
+STATISTICS = ['mean', .5, .95, .99]
+# statistics of the per-second request counts, their tail percentiles say little
+THROUGHPUT_STATISTICS = ['mean']
+# same resamples for the same runs, so the verdict of a comparison does not change
+SEED = 0
+# analysis of the per-second request counts, higher is better
+REQUESTS_PER_SECOND = 'RequestsPerSecond'
+# Cliff's delta magnitudes (Romano et al.), below each bound
+EFFECT_SIZES = [(0.147, 'negligible'), (0.33, 'small'), (0.474, 'medium'), (float('inf'), 'large')]
+VERDICT_FILE_SUFFIX = '_verdict.json'
+
+
+def run_samples(test_name, max_rows=MAX_SAMPLE_ROWS, seed=SEED):
+    # steady state samples of a run: the per-second request counts and the
+    # successful rows of every duration column, at most max_rows of them
+    analyzer = Analyzer(test_name)
+    analyzer.load_data(use_cache=True)
+    aggregates = analyzer.aggregates
+    warmup = aggregates['warmup_seconds']
+    start = (aggregates['first_second'] + warmup) * NS_PER_SECOND
+    columns = [metric['name'] for metric in analyzer.metrics if metric['unit'] == DURATION_UNIT]
+    rng = np.random.default_rng(seed)
+    rate = min(1.0, max_rows / max(analyzer.successful_requests, 1))
+    samples = {column: [] for column in columns}
+    for chunk in analyzer.iter_raw_chunks():
+        chunk = successful_rows(chunk)
+        keep = chunk['StartTime'] >= start
+        if rate < 1:
+            keep &= rng.random(len(keep)) < rate
+        for column in columns:
+            samples[column].append(chunk[column][keep])
+    samples = {column: np.concatenate(parts) for column, parts in samples.items()}
+    # the first and the last second are only partly covered by the run
+    samples[REQUESTS_PER_SECOND] = aggregates['requests_per_second'][max(warmup, 1):-1]
+    return samples, warmup
+
+
+def bootstrap_mean(sample, resamples, rng):
+    # means of resamples of every row drawn with replacement, from the histogram of the sample
+    n = len(sample)
+    buckets, inverse, counts = np.unique(LatencyHistogram(MEAN_HISTOGRAM_DIGITS).bucket_indexes(sample), return_inverse=True, return_counts=True)
+    means = np.bincount(inverse, weights=sample) / counts
+    return rng.multinomial(n, counts / n, size=resamples) @ means / n
+
+
+def bootstrap_quantile(sorted_sample, q, resamples, rng):
+    # the q quantile of resamples drawn with replacement, interpolated between two
+    # order statistics like numpy.percentile, from the distribution of the order
+    # statistics of uniforms
+    n = len(sorted_sample)
+    virtual_index = (n - 1) * q
+    k = int(math.floor(virtual_index)) + 1
+    fraction = virtual_index - (k - 1)
+    u = rng.beta(k, n - k + 1, size=resamples)
+    low = sorted_sample[np.minimum((n * u).astype(np.int64), n - 1)]
+    if k >= n or fraction == 0:
+        return low.astype(np.float64)
+    # the next order statistic: the smallest of the n - k uniforms above u
+    u_next = u + (1 - u) * rng.beta(1, n - k, size=resamples)
+    high = sorted_sample[np.minimum((n * u_next).astype(np.int64), n - 1)]
+    return low + fraction * (high - low)
+
+
+def mann_whitney(a, b):
+    # two-sided p-value of the Mann-Whitney U test (normal approximation with tie
+    # and continuity corrections) and Cliff's delta, P(b > a) - P(b < a)
+    n_a, n_b = len(a), len(b)
+    values, inverse, counts = np.unique(np.concatenate([a, b]), return_inverse=True, return_counts=True)
+    # mid-ranks, 1 based
+    ranks = (np.cumsum(counts) - (counts - 1) / 2.0)[inverse]
+    u_b = ranks[n_a:].sum() - n_b * (n_b + 1) / 2.0
+    mean = n_a * n_b / 2.0
+    n = n_a + n_b
+    ties = (counts.astype(np.float64) ** 3 - counts).sum()
+    variance = n_a * n_b / 12.0 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        p_value = 1.0
+    else:
+        z = (abs(u_b - mean) - 0.5) / math.sqrt(variance)
+        p_value = min(1.0, math.erfc(max(z, 0) / math.sqrt(2)))
+    return p_value, 2.0 * u_b / (n_a * n_b) - 1
+
+
+def kolmogorov_smirnov(a, b):
+    # two sample Kolmogorov-Smirnov statistic and its asymptotic p-value
+    a, b = np.sort(a), np.sort(b)
+    values = np.concatenate([a, b])
+    d = float(np.abs(np.searchsorted(a, values, side='right') / len(a) - np.searchsorted(b, values, side='right') / len(b)).max())
+    n = len(a) * len(b) / (len(a) + len(b))
+    x = (math.sqrt(n) + 0.12 + 0.11 / math.sqrt(n)) * d
+    if x < 0.2:
+        return d, 1.0
+    p_value = 2 * sum((-1) ** (k - 1) * math.exp(-2 * k * k * x * x) for k in range(1, 101))
+    return d, min(max(p_value, 0.0), 1.0)
+
+
+def effect_size(delta):
+    for bound, name in EFFECT_SIZES:
+        if abs(delta) < bound:
+            return name
+
+
+def statistic_value(sample, statistic):
+    if statistic == 'mean':
+        return float(sample.mean())
+    return float(np.percentile(sample, statistic * 100))
+
+
+def bootstrap(sample, resamples, rng, statistics=STATISTICS):
+    # resampled values of every statistic of a sample
+    sorted_sample = np.sort(sample)
+    return {statistic: bootstrap_mean(sample, resamples, rng) if statistic == 'mean' else bootstrap_quantile(sorted_sample, statistic, resamples, rng)
+            for statistic in statistics}
+
+
+def compare_samples(base, base_replicates, candidate, candidate_replicates, confidence, threshold, higher_is_better=False):
+    # the distribution tests and the change of every statistic of the replicates
+    # from base to candidate, the replicates are bootstrap() of each sample
+    mw_p_value, delta = mann_whitney(base, candidate)
+    ks_statistic, ks_p_value = kolmogorov_smirnov(base, candidate)
+    # differences in the intervals only count when the distributions differ
+    significant = min(mw_p_value, ks_p_value) < (1 - confidence) / 2
+    result = {
+        'baseline_rows': len(base),
+        'candidate_rows': len(candidate),
+        'mann_whitney_p_value': mw_p_value,
+        'ks_statistic': ks_statistic,
+        'ks_p_value': ks_p_value,
+        'cliffs_delta': delta,
+        'effect_size': effect_size(delta),
+        'significant': significant,
+        'statistics': {},
+    }
+    tail = (1 - confidence) / 2
+    for statistic in base_replicates:
+        base_value = statistic_value(base, statistic)
+        candidate_value = statistic_value(candidate, statistic)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            changes = candidate_replicates[statistic] / base_replicates[statistic] - 1
+        changes = changes[np.isfinite(changes)]
+        if len(changes) == 0 or base_value == 0:
+            # no relative change from 0
+            continue
+        low, high = np.percentile(changes, [tail * 100, (1 - tail) * 100])
+        change = candidate_value / base_value - 1
+        # positive is worse: an increase, or a decrease when higher is better
+        sign = -1 if higher_is_better else 1
+        worse_low, worse_high = sorted([sign * low, sign * high])
+        verdict = 'unchanged'
+        if significant and worse_low > 0 and worse_high >= threshold:
+            verdict = 'regressed'
+        elif significant and worse_high < 0 and worse_low <= -threshold:
+            verdict = 'improved'
+        result['statistics'][statistic if statistic == 'mean' else percentile_label(statistic)] = {
+            'baseline': base_value,
+            'candidate': candidate_value,
+            'change': change,
+            'confidence_interval': [float(low), float(high)],
+            'verdict': verdict,
+        }
+    return result
+
+
+def statistics(name):
+    return THROUGHPUT_STATISTICS if name == REQUESTS_PER_SECOND else STATISTICS
+
+
+def run_verdict(metrics):
+    verdicts = [statistic['verdict'] for metric in metrics.values() for statistic in metric['statistics'].values()]
+    if 'regressed' in verdicts:
+        return 'regressed'
+    if 'improved' in verdicts:
+        return 'improved'
+    return 'unchanged'
+
+
+def run_replicates(test_name, index, resamples):
+    # steady state samples of a run and their bootstrap replicates, runs in a worker process
+    samples, warmup = run_samples(test_name)
+    samples = {name: np.asarray(sample, dtype=np.float64) for name, sample in samples.items()}
+    # the same resamples for the same position in the comparison
+    rng = np.random.default_rng([SEED, index])
+    replicates = {name: bootstrap(sample, resamples, rng, statistics(name)) for name, sample in samples.items() if len(sample) >= 2}
+    return samples, replicates, warmup
+
+
+def compare_runs(test_names, confidence=CONFIDENCE, threshold=THRESHOLD, resamples=RESAMPLES):
+    # verdict of every run against the first one, written next to the comparison report
+    with ProcessPoolExecutor(max_workers=min(len(test_names), os.cpu_count() or 1)) as executor:
+        runs = list(executor.map(run_replicates, test_names, range(len(test_names)), [resamples] * len(test_names)))
+    (base, base_replicates, base_warmup), candidates = runs[0], runs[1:]
+    # the columns every run has, in the baseline's order
+    names = [name for name in base_replicates if all(name in replicates for _, replicates, _ in candidates)]
+    results = []
+    for test_name, (samples, replicates, warmup) in zip(test_names[1:], candidates):
+        metrics = {}
+        for name in names:
+            metrics[name] = compare_samples(base[name], base_replicates[name], samples[name], replicates[name], confidence, threshold,
+                                            higher_is_better=name == REQUESTS_PER_SECOND)
+        results.append({'test': test_name, 'warmup_seconds': warmup, 'verdict': run_verdict(metrics), 'metrics': metrics})
+    verdicts = [result['verdict'] for result in results]
+    return {
+        'baseline': test_names[0],
+        'baseline_warmup_seconds': base_warmup,
+        'confidence': confidence,
+        'threshold': threshold,
+        'resamples': resamples,
+        'verdict': 'regressed' if 'regressed' in verdicts else 'improved' if 'improved' in verdicts else 'unchanged',
+        'runs': results,
+    }
+
+
+def verdict_path(test_names):
+    # next to the comparison report
+    return 'comparisons/' + '_vs_'.join(test_names) + VERDICT_FILE_SUFFIX
+
+
+def save_verdict(verdict, test_names):
+    with open(verdict_path(test_names), 'w') as f:
+        json.dump(verdict, f, indent=2)
+
+
+def verdict_html(verdict):
+    # summary of the verdict at the top of the comparison report
+    colors = {'regressed': 'text-red-600', 'improved': 'text-green-600', 'unchanged': ''}
+    html = (f"<div class='card rounded-xl m-10 p-10 border-2'><p class='text-xl font-bold italic'>Regression Check: "
+            f"<span class='{colors[verdict['verdict']]}'>{verdict['verdict']}</span></p>"
+            f"<p class='italic'>Every run against <b>{verdict['baseline']}</b>, steady state only: {verdict['confidence'] * 100:g}% bootstrap confidence intervals "
+            f"({verdict['resamples']} resamples) of the relative change, changes shown to be within {verdict['threshold'] * 100:g}% are unchanged.</p>")
+    for run in verdict['runs']:
+        html += f"<p class='text-lg font-bold italic mt-5'>{run['test']}: <span class='{colors[run['verdict']]}'>{run['verdict']}</span></p>"
+        html += ("<table class='italic'><tr><th class='px-2'>Column</th><th class='px-2'>Statistic</th><th class='px-2'>Baseline</th><th class='px-2'>Candidate</th>"
+                 "<th class='px-2'>Change</th><th class='px-2'>Confidence Interval</th><th class='px-2'>Verdict</th></tr>")
+        for name, metric in run['metrics'].items():
+            # durations in milliseconds
+            scale = 1 if name == REQUESTS_PER_SECOND else 1000000
+            for statistic, values in metric['statistics'].items():
+                low, high = values['confidence_interval']
+                html += (f"<tr><td class='px-2'>{name}</td><td class='px-2'>{statistic}</td><td class='px-2'>{values['baseline'] / scale:.4g}</td>"
+                         f"<td class='px-2'>{values['candidate'] / scale:.4g}</td><td class='px-2'>{values['change'] * 100:+.2f}%</td>"
+                         f"<td class='px-2'>[{low * 100:+.2f}%, {high * 100:+.2f}%]</td><td class='px-2 {colors[values['verdict']]}'>{values['verdict']}</td></tr>")
+            html += (f"<tr><td class='px-2'></td><td class='px-2' colspan='6'>Mann-Whitney p = {metric['mann_whitney_p_value']:.3g}, "
+                     f"Kolmogorov-Smirnov D = {metric['ks_statistic']:.3g} (p = {metric['ks_p_value']:.3g}), "
+                     f"Cliff's delta = {metric['cliffs_delta']:+.3f} ({metric['effect_size']}), "
+                     f"{'distributions differ' if metric['significant'] else 'no significant difference between the distributions'}</td></tr>")
+        html += "</table>"
+    return html + "</div>"
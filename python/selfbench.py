@@ -0,0 +1,383 @@
+import cProfile
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import pstats
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from rawdata import RawDataWriter, RAW_DATA_FILE
+
+# Benchmarks of the tool itself: the analysis of synthetic runs and the Go load generator.
+#
+# Synthetic runs are written to data/<test>/ of a scratch folder like the runner
+# writes them (benchmark.json with its raw data schema, and data.bin). The latencies
+# are lognormal with a heavy tail, a warm-up and periodic slow seconds, and 0.5% of
+# the requests fail. For every size, a baseline run and a candidate run 5% slower
+# are generated. Then every stage of the analysis is timed in a fresh process, the
+# same stages the report and the comparison run. Each stage records its wall time
+# and its own peak RSS (VmHWM is reset before it), and in a second, profiled pass
+# its cProfile hot spots. The load generator is measured with cmd/loadbench -json.
+#
+# Results are saved as JSON (selfbench/<revision>.json) and appended to
+# selfbench/history.jsonl with the git revision. They are then compared to the
+# previous entry, usually the parent commit: a stage whose wall time or peak RSS grew by more
+# than SELF_REGRESSION_THRESHOLD regressed, and so did the load generator when its
+# requests per second dropped or its allocations per request grew by as much.
+# usage: python3 python/selfbench.py [--rows 10000,100000,1000000] [--no-profile]
+#        [--loadbench] [--loadbench-binary path] [--workdir folder] [--output folder] [--gate]
+
+DEFAULT_ROWS = [10000, 100000, 1000000]
+# stages of the analysis, in the order the report and the comparison run them
+STAGES = ['load_data', 'analyze_requests_per_second', 'analyze_latency', 'create_test_report_html', 'compare_tests', 'regression_check']
+HOT_SPOTS = 15
+SELF_REGRESSION_THRESHOLD = 0.2
+# wall time changes below this are noise, whatever their relative size
+MIN_WALL_CHANGE_SECONDS = 0.05
+OUTPUT_FOLDER = 'selfbench'
+HISTORY_FILE = 'history.jsonl'
+# exit status of --gate when something regressed, like compare.py --gate
+GATE_EXIT_CODE = 2
+GENERATE_BLOCK_ROWS = 1000000
+# the runs requests are spread over: rows / SYNTHETIC_RPS seconds, within these bounds
+SYNTHETIC_RPS = 1000
+SYNTHETIC_SECONDS = (60, 3600)
+SYNTHETIC_START_TIME = 1700000000 * 1000000000
+# columns and error classes written by the Go runner (internal/models/rawdata.go and stat.go)
+SYNTHETIC_COLUMNS = ['StartTime', 'EndTime', 'QueryDuration', 'RequestDuration', 'IntendedStartTime',
+                     'StatusCode', 'ResponseBytes', 'TimeToFirstByte', 'ErrorClass']
+ERROR_CLASSES = ['none', 'connection', 'timeout', 'http_4xx', 'http_5xx', 'read', 'metric']
+SERVER_ERROR = 4
+CANDIDATE_SLOWDOWN = 1.05
+
+
+def synthetic_block(rng, start_times, test_start, slowdown):
+    # the columns of the requests started at start_times
+    n = len(start_times)
+    seconds = (start_times - test_start) / 1e9
+    # ~2ms queries, 1% of them in a Pareto tail, slower during the first seconds and
+    # during one second out of every 60
+    query = rng.lognormal(np.log(2e6), 0.4, n)
+    tail = rng.random(n) < 0.01
+    query[tail] += 1e7 * rng.pareto(2.5, tail.sum())
+    query *= slowdown * (1 + 2 * np.exp(-seconds / 10)) * np.where(seconds.astype(np.int64) % 60 == 59, 3, 1)
+    query = query.astype(np.int64)
+    first_byte = query + rng.lognormal(np.log(3e5), 0.3, n).astype(np.int64)
+    request = first_byte + rng.lognormal(np.log(5e4), 0.5, n).astype(np.int64)
+    failed = rng.random(n) < 0.005
+    return {
+        'StartTime': start_times,
+        'EndTime': start_times + request,
+        'QueryDuration': np.where(failed, 0, query),
+        'RequestDuration': request,
+        'IntendedStartTime': start_times,
+        'StatusCode': np.where(failed, 503, 200),
+        'ResponseBytes': np.maximum(rng.normal(2048, 256, n), 0).astype(np.int64),
+        'TimeToFirstByte': first_byte,
+        'ErrorClass': np.where(failed, SERVER_ERROR, 0),
+    }
+
+
+def generate_run(test_name, rows, seed=0, slowdown=1.0):
+    # data/<test_name>/ with benchmark.json and data.bin, kept when it already has rows rows
+    data_path = 'data/' + test_name + '/'
+    meta_path = data_path + 'benchmark.json'
+    if os.path.exists(meta_path) and os.path.exists(data_path + RAW_DATA_FILE):
+        with open(meta_path) as f:
+            if json.load(f)['total_requests'] == rows:
+                return
+    shutil.rmtree(data_path, ignore_errors=True)
+    os.makedirs(data_path)
+    rng = np.random.default_rng(seed)
+    duration = min(max(rows / SYNTHETIC_RPS, SYNTHETIC_SECONDS[0]), SYNTHETIC_SECONDS[1])
+    gap = duration * 1e9 / rows
+    start = SYNTHETIC_START_TIME
+    failed = 0
+    with RawDataWriter(data_path + RAW_DATA_FILE, SYNTHETIC_COLUMNS) as writer:
+        for offset in range(0, rows, GENERATE_BLOCK_ROWS):
+            n = min(GENERATE_BLOCK_ROWS, rows - offset)
+            start_times = start + np.cumsum(rng.exponential(gap, n)).astype(np.int64)
+            start = int(start_times[-1])
+            block = synthetic_block(rng, start_times, SYNTHETIC_START_TIME, slowdown)
+            failed += int((block['ErrorClass'] != 0).sum())
+            writer.write_block(block)
+    schema = {
+        'columns': SYNTHETIC_COLUMNS,
+        'metrics': [
+            {'name': 'QueryDuration', 'source': 'json', 'path': 'QueryDuration', 'unit': 'ns'},
+            {'name': 'RequestDuration', 'source': 'builtin', 'unit': 'ns'},
+            {'name': 'TimeToFirstByte', 'source': 'builtin', 'unit': 'ns'},
+            {'name': 'ResponseBytes', 'source': 'builtin', 'unit': 'bytes'},
+        ],
+        'error_classes': ERROR_CLASSES,
+    }
+    meta = {
+        'test_start_time': SYNTHETIC_START_TIME,
+        'test_unique_name': test_name,
+        'test_display_name': 'Synthetic ' + test_name,
+        'test_description': 'Synthetic run of ' + str(rows) + ' requests generated by selfbench.py',
+        'data_folder': data_path,
+        'test_mode': 'concurrent',
+        'request_url': 'http://localhost/synthetic',
+        'concurrent_requests': 10,
+        'test_duration': int(np.ceil(duration)),
+        'total_requests': rows,
+        'successful_requests': rows - failed,
+        'failed_requests': failed,
+        'requests_per_second': rows / duration,
+        'raw_data_schema': schema,
+    }
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+
+
+def reset_peak_rss():
+    # writing 5 to clear_refs resets VmHWM (Linux 4.0+)
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    from bench_raw_data import peak_rss_mb as peak
+    return peak()
+
+
+def hot_spots(profile, count=HOT_SPOTS):
+    # the functions with the most time of their own
+    stats = pstats.Stats(profile)
+    spots = []
+    for (file_name, line, function), (_, calls, own, cumulative, _) in stats.stats.items():
+        spots.append({
+            'function': os.path.basename(file_name) + ':' + str(line) + '(' + function + ')',
+            'calls': calls,
+            'own_seconds': round(own, 6),
+            'cumulative_seconds': round(cumulative, 6),
+        })
+    spots.sort(key=lambda spot: spot['own_seconds'], reverse=True)
+    return spots[:count]
+
+
+def run_stages(workdir, base, candidate, profile, queue):
+    # every stage one after the other in this (fresh) process, they depend on each other
+    os.chdir(workdir)
+    from analyzer import Analyzer, display_name
+    from compare import comparable_analyses
+    from regression import compare_runs
+    from generate_report import DESCRIPTIONS
+    state = {}
+
+    def load_data():
+        state['analyzer'] = Analyzer(base)
+        state['analyzer'].load_data(use_cache=False)
+
+    def analyze_latency():
+        for metric in state['analyzer'].metrics:
+            description = metric.get('description') or DESCRIPTIONS.get(metric['name'], '')
+            state['analyzer'].analyze_latency(metric['name'], display_name(metric['name']), test_description=description, unit=metric['unit'])
+
+    stages = {
+        'load_data': load_data,
+        'analyze_requests_per_second': lambda: state['analyzer'].analyze_requests_per_second(),
+        'analyze_latency': analyze_latency,
+        'create_test_report_html': lambda: state['analyzer'].create_test_report_html(),
+        'compare_tests': lambda: Analyzer(base, candidate).compare_tests(comparable_analyses([base, candidate])),
+        'regression_check': lambda: compare_runs([base, candidate]),
+    }
+    results = {}
+    for name in STAGES:
+        result = {'peak_rss_reset': reset_peak_rss()}
+        profiler = cProfile.Profile() if profile else None
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        stages[name]()
+        if profiler is not None:
+            profiler.disable()
+        result['wall_seconds'] = time.perf_counter() - start
+        # without the reset it is the peak of the process so far
+        result['peak_rss_mb'] = peak_rss_mb()
+        if profiler is not None:
+            result['hot_spots'] = hot_spots(profiler)
+        results[name] = result
+    queue.put(results)
+
+
+def measure_stages(workdir, base, candidate, profile=False):
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=run_stages, args=(workdir, base, candidate, profile, queue))
+    process.start()
+    results = queue.get()
+    process.join()
+    return results
+
+
+def benchmark_analysis(workdir, rows, profile=True):
+    # the stages of the analysis of a synthetic run of rows requests
+    base, candidate = 'selfbench_' + str(rows), 'selfbench_' + str(rows) + '_slower'
+    os.chdir(workdir)
+    os.makedirs('comparisons', exist_ok=True)
+    start = time.perf_counter()
+    generate_run(base, rows, seed=rows)
+    generate_run(candidate, rows, seed=rows + 1, slowdown=CANDIDATE_SLOWDOWN)
+    generate_seconds = time.perf_counter() - start
+    # the comparison reads the analyses of the candidate, written once beforehand
+    from generate_report import generate_report
+    generate_report(candidate, use_cache=False)
+    stages = measure_stages(workdir, base, candidate)
+    if profile:
+        # a second pass for the hot spots, the profiler slows the stages down
+        for name, result in measure_stages(workdir, base, candidate, profile=True).items():
+            stages[name]['hot_spots'] = result['hot_spots']
+            stages[name]['profiled_wall_seconds'] = result['wall_seconds']
+    return {
+        'rows': rows,
+        'generate_seconds': generate_seconds,
+        'raw_data_mb': os.path.getsize('data/' + base + '/' + RAW_DATA_FILE) / 1024 / 1024,
+        'stages': stages,
+    }
+
+
+def benchmark_load_generator(root, binary=None, duration=5, concurrency=50):
+    # cmd/loadbench -json against its local server
+    command = [binary] if binary else ['go', 'run', './cmd/loadbench']
+    command += ['-json', '-duration', str(duration), '-concurrency', str(concurrency)]
+    try:
+        output = subprocess.run(command, cwd=root, capture_output=True, text=True, check=True, timeout=duration + 300).stdout
+        return json.loads(output.strip().splitlines()[-1])
+    except (OSError, subprocess.SubprocessError, ValueError, IndexError) as e:
+        print("Could not run the load generator benchmark: " + str(e))
+        return {'error': str(e)}
+
+
+def git_revision(root):
+    def git(*args):
+        return subprocess.run(['git'] + list(args), cwd=root, capture_output=True, text=True).stdout.strip()
+    try:
+        return git('rev-parse', '--short', 'HEAD') or 'unknown', bool(git('status', '--porcelain', '--untracked-files=no'))
+    except OSError:
+        return 'unknown', False
+
+
+def machine():
+    return {
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'cpus': os.cpu_count(),
+    }
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def changes(previous, current, threshold=SELF_REGRESSION_THRESHOLD):
+    # regressions and improvements of current against previous, one line each
+    lines, regressed = [], False
+
+    def check(label, before, after, higher_is_better=False, min_change=0):
+        nonlocal regressed
+        if before is None or after is None or before <= 0:
+            return
+        change = after / before - 1
+        worse = -change if higher_is_better else change
+        if abs(after - before) < min_change or abs(change) <= threshold:
+            return
+        verdict = 'regressed' if worse > 0 else 'improved'
+        regressed |= worse > 0
+        lines.append(f"{verdict:>9}: {label} {before:.4g} -> {after:.4g} ({change * 100:+.1f}%)")
+
+    for rows, run in current['analysis'].items():
+        before_run = previous.get('analysis', {}).get(rows)
+        if before_run is None:
+            continue
+        for name, stage in run['stages'].items():
+            before = before_run['stages'].get(name)
+            if before is None:
+                continue
+            check(f"{rows} rows {name} wall seconds", before['wall_seconds'], stage['wall_seconds'], min_change=MIN_WALL_CHANGE_SECONDS)
+            if stage.get('peak_rss_reset') and before.get('peak_rss_reset'):
+                check(f"{rows} rows {name} peak RSS MB", before['peak_rss_mb'], stage['peak_rss_mb'])
+    load, before_load = current.get('loadbench'), previous.get('loadbench')
+    if load and before_load and 'error' not in load and 'error' not in before_load:
+        check("load generator requests per second", before_load['requests_per_second'], load['requests_per_second'], higher_is_better=True)
+        check("load generator allocations per request", before_load['allocs_per_request'], load['allocs_per_request'])
+    return lines, regressed
+
+
+def option(args, name, default):
+    # value of --name <value> in args
+    if name not in args:
+        return default
+    return args[args.index(name) + 1]
+
+
+def main():
+    args = sys.argv[1:]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    rows_list = [int(rows) for rows in option(args, '--rows', ','.join(map(str, DEFAULT_ROWS))).split(',')]
+    output = os.path.abspath(option(args, '--output', os.path.join(root, OUTPUT_FOLDER)))
+    workdir = option(args, '--workdir', None)
+    scratch = None
+    if workdir is None:
+        scratch = workdir = tempfile.mkdtemp(prefix='selfbench')
+    workdir = os.path.abspath(workdir)
+    os.makedirs(workdir, exist_ok=True)
+    revision, dirty = git_revision(root)
+    results = {
+        'revision': revision,
+        'dirty': dirty,
+        'time': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'machine': machine(),
+        'analysis': {},
+    }
+    try:
+        for rows in rows_list:
+            print(f"Analysis of {rows} rows")
+            run = benchmark_analysis(workdir, rows, profile='--no-profile' not in args)
+            results['analysis'][str(rows)] = run
+            for name, stage in run['stages'].items():
+                print(f"  {name:>28}: {stage['wall_seconds']:8.3f}s, peak RSS {stage['peak_rss_mb']:8.1f} MB")
+    finally:
+        os.chdir(root)
+        if scratch is not None:
+            shutil.rmtree(scratch, ignore_errors=True)
+    if '--loadbench' in args or '--loadbench-binary' in args:
+        print("Load generator")
+        results['loadbench'] = benchmark_load_generator(root, option(args, '--loadbench-binary', None))
+        if 'error' not in results['loadbench']:
+            print(f"  {results['loadbench']['requests_per_second']:.0f} requests per second, {results['loadbench']['allocs_per_request']:.1f} allocations per request")
+
+    os.makedirs(output, exist_ok=True)
+    with open(os.path.join(output, revision + ('-dirty' if dirty else '') + '.json'), 'w') as f:
+        json.dump(results, f, indent=2)
+    history_path = os.path.join(output, HISTORY_FILE)
+    previous = load_history(history_path)
+    with open(history_path, 'a') as f:
+        f.write(json.dumps(results) + '\n')
+    if not previous:
+        print("No earlier results to compare with in " + history_path)
+        return
+    lines, regressed = changes(previous[-1], results)
+    print(f"Against {previous[-1]['revision']}{'-dirty' if previous[-1]['dirty'] else ''} ({previous[-1]['time']}):")
+    for line in lines or ["no change above " + str(int(SELF_REGRESSION_THRESHOLD * 100)) + "%"]:
+        print("  " + line)
+    if regressed and '--gate' in args:
+        sys.exit(GATE_EXIT_CODE)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+from aggregates import StreamingAggregator, successful_rows, ERROR_CLASS_COLUMN, NS_PER_SECOND
+
+# Per-stage analysis of staged runs (Stages or LoadProfile in tests.yaml) and the
+# saturation point, the knee where latency climbs while the throughput flattens.
+#
+# Every stage is summarized after it settled: the first STAGE_SETTLE_FRACTION of
+# it is left out. Its throughput is the responses received in that window, its
+# latencies those of the requests started in it. Stages are then compared in
+# order of increasing load level, a stage is past the knee when it turned less
+# than KNEE_MIN_EFFICIENCY of its added load into throughput while its 99th
+# percentile grew by more than KNEE_LATENCY_GROWTH, when its 99th percentile grew
+# by more than KNEE_MAX_LATENCY_GROWTH whatever the throughput (requests queueing
+# in open-loop runs), or when more than KNEE_MAX_ERROR_RATE of its requests failed.
+# The maximum sustainable throughput is the throughput of the last stage before it.
+
+# part of every stage left out while the load settles at the new level
+STAGE_SETTLE_FRACTION = 0.2
+KNEE_MIN_EFFICIENCY = 0.5
+KNEE_LATENCY_GROWTH = 0.2
+KNEE_MAX_LATENCY_GROWTH = 1.0
+KNEE_MAX_ERROR_RATE = 0.01
+
+
+def stage_windows(meta, arrival_rate=False):
+    # the stages of a run from benchmark.json, with their load level (requests per
+    # second for arrival-rate runs, concurrent requests otherwise) and the unix
+    # nanoseconds they are summarized over; [] for runs with one load level
+    windows = []
+    start = meta['test_start_time']
+    previous = 0
+    for stage in meta.get('stages') or []:
+        if arrival_rate:
+            level = stage.get('target_rps', 0)
+        else:
+            level = stage.get('concurrent_requests', 0)
+        duration = int(stage['duration'] * NS_PER_SECOND)
+        settle = int(duration * STAGE_SETTLE_FRACTION)
+        # ramped stages are described by their level in the middle of the window
+        middle = level
+        if stage.get('ramp'):
+            middle = previous + (level - previous) * (1 + STAGE_SETTLE_FRACTION) / 2
+        windows.append({
+            'name': stage['name'],
+            'level': level,
+            'mean_level': middle,
+            'ramp': bool(stage.get('ramp')),
+            'start': start + settle,
+            'end': start + duration,
+        })
+        start += duration
+        previous = level
+    return windows
+
+
+class StageAggregator:
+
+    # throughput, failures and latency distribution of column in every stage window,
+    # accumulated one raw chunk at a time (failed requests included). Kept in the
+    # analysis cache next to the run's aggregator, so appended rows are added to it.
+    def __init__(self, windows, column, histogram_digits=None):
+        self.windows = windows
+        self.column = column
+        self.aggregators = [StreamingAggregator([column], histogram_digits, rolling=False) for _ in windows]
+        self.failed = [0] * len(windows)
+        self.completed = [0] * len(windows)
+
+    def update(self, chunk):
+        starts = chunk['StartTime']
+        ends = successful_rows(chunk)['EndTime']
+        for i, window in enumerate(self.windows):
+            self.completed[i] += int(((ends >= window['start']) & (ends < window['end'])).sum())
+            inside = (starts >= window['start']) & (starts < window['end'])
+            if not inside.any():
+                continue
+            rows = {name: values[inside] for name, values in chunk.items()}
+            if ERROR_CLASS_COLUMN in rows:
+                self.failed[i] += int((rows[ERROR_CLASS_COLUMN] != 0).sum())
+            rows = successful_rows(rows)
+            self.aggregators[i].update(rows['StartTime'], {self.column: rows[self.column]})
+
+    def result(self):
+        stages = []
+        for window, aggregator, failures, responses in zip(self.windows, self.aggregators, self.failed, self.completed):
+            seconds = (window['end'] - window['start']) / NS_PER_SECOND
+            stage = {
+                'name': window['name'],
+                'level': window['level'],
+                'mean_level': window['mean_level'],
+                'ramp': window['ramp'],
+                'seconds': seconds,
+                'successful_requests': aggregator.rows,
+                'failed_requests': failures,
+                'requests_per_second': responses / seconds,
+                'error_rate': failures / max(aggregator.rows + failures, 1),
+                'mean': None,
+                'p50': None,
+                'p99': None,
+            }
+            if aggregator.rows > 0:
+                description = aggregator.describe(self.column)
+                stage['mean'], stage['p50'], stage['p99'] = description['mean'], description['50%'], description['99%']
+            stages.append(stage)
+        return stages
+
+
+def describe_stages(chunks, windows, column, histogram_digits=None):
+    # every stage window summarized from one pass over the raw chunks
+    aggregator = StageAggregator(windows, column, histogram_digits)
+    for chunk in chunks:
+        aggregator.update(chunk)
+    return aggregator.result()
+
+
+def find_knee(stages):
+    # the maximum sustainable throughput of the described stages: {'stage' (index of
+    # the last sustainable stage, None when even the lowest load was not), 'saturated'
+    # (a stage past the knee was run), 'saturation_stage', 'requests_per_second'};
+    # None without at least two stages at increasing load levels
+    order = sorted((i for i, stage in enumerate(stages) if stage['successful_requests'] > 0 or stage['failed_requests'] > 0),
+                   key=lambda i: (stages[i]['mean_level'], i))
+    # one stage per level, the first one run
+    levels = []
+    for i in order:
+        if not levels or stages[i]['mean_level'] > stages[levels[-1]]['mean_level']:
+            levels.append(i)
+    if len(levels) < 2:
+        return None
+    knee = {'stage': None, 'saturated': False, 'saturation_stage': None, 'requests_per_second': None}
+    previous = None
+    for i in levels:
+        stage = stages[i]
+        saturated = stage['error_rate'] > KNEE_MAX_ERROR_RATE or stage['p99'] is None
+        if previous is not None and not saturated:
+            load_growth = stage['mean_level'] / previous['mean_level'] - 1 if previous['mean_level'] > 0 else float('inf')
+            throughput_growth = stage['requests_per_second'] / previous['requests_per_second'] - 1 if previous['requests_per_second'] > 0 else float('inf')
+            latency_growth = stage['p99'] / previous['p99'] - 1 if previous['p99'] > 0 else 0
+            saturated = (throughput_growth < KNEE_MIN_EFFICIENCY * load_growth and latency_growth > KNEE_LATENCY_GROWTH) or latency_growth > KNEE_MAX_LATENCY_GROWTH
+        if saturated:
+            knee['saturated'] = True
+            knee['saturation_stage'] = i
+            break
+        knee['stage'] = i
+        knee['requests_per_second'] = stage['requests_per_second']
+        previous = stage
+    if not knee['saturated']:
+        # never saturated: the highest throughput measured is a lower bound
+        best = max(levels, key=lambda i: stages[i]['requests_per_second'])
+        knee['stage'] = best
+        knee['requests_per_second'] = stages[best]['requests_per_second']
+    return knee
@@ -0,0 +1,120 @@
+import numpy as np
+from aggregates import NS_PER_SECOND, merge_value_counts, percentile_label
+from histogram import LatencyHistogram
+
+# Warm-up detection and rolling (time windowed) latency percentiles.
+#
+# Rolling percentiles: every row is counted in a log-bucketed histogram of the
+# step (half a window) its StartTime falls in. The counts are kept sparse, as
+# sorted (step, bucket) keys, so memory grows with the number of distinct
+# latencies per step, not with the number of rows, and rows can arrive in any
+# order and in any number of chunks. A window is two consecutive steps; the
+# percentiles of every window are read at once from the cumulative counts.
+# Values are the highest value of the bucket holding the percentile, within
+# 2^-(sub_bucket_bits - 1) (< 1% with 2 significant digits) of the exact one.
+#
+# Warm-up: MSER-5 (White 1997) on the per-second mean latencies. The means are
+# grouped in batches of 5 seconds and the run is truncated at the batch d that
+# minimizes the variance of the mean of the remaining batches,
+# sum((Y[d:] - mean(Y[d:]))^2) / (n - d)^2, searched over the first half.
+ROLLING_WINDOW_SECONDS = 10
+ROLLING_SIGNIFICANT_DIGITS = 2
+ROLLING_PERCENTILES = [.5, .95, .99]
+MSER_BATCH_SECONDS = 5
+# below this many batches there is not enough data to tell warm-up from noise
+MSER_MIN_BATCHES = 10
+# keys are step * KEY_STRIDE + bucket, buckets of 2 digit histograms stay far below it
+KEY_STRIDE = 1 << 20
+
+
+class WindowedPercentiles:
+
+    def __init__(self, window_seconds=ROLLING_WINDOW_SECONDS, significant_digits=ROLLING_SIGNIFICANT_DIGITS):
+        self.window_seconds = window_seconds
+        self.step_seconds = max(window_seconds // 2, 1)
+        self.buckets = LatencyHistogram(significant_digits)
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def update(self, start_times, values):
+        start_times = np.asarray(start_times, dtype=np.int64)
+        if len(start_times) == 0:
+            return
+        steps = start_times // NS_PER_SECOND // self.step_seconds
+        keys, counts = np.unique(steps * KEY_STRIDE + self.buckets.bucket_indexes(values), return_counts=True)
+        self.keys, self.counts = merge_value_counts(self.keys, self.counts, keys, counts)
+
+    def percentiles(self, quantiles=ROLLING_PERCENTILES):
+        # (window start in unix seconds, {quantile: value per window}), windows without rows are left out
+        if len(self.keys) == 0:
+            return np.zeros(0, dtype=np.int64), {q: np.zeros(0, dtype=np.int64) for q in quantiles}
+        steps = self.keys // KEY_STRIDE
+        if steps[-1] > steps[0]:
+            # every step is the second half of the window starting one step earlier;
+            # windows starting before the first or at the last step would be half empty
+            keys = np.concatenate((self.keys, self.keys - KEY_STRIDE))
+            keys, inverse = np.unique(keys, return_inverse=True)
+            counts = np.bincount(inverse, weights=np.concatenate((self.counts, self.counts))).astype(np.int64)
+            windows = keys // KEY_STRIDE
+            full = (windows >= steps[0]) & (windows < steps[-1])
+            keys, counts, windows = keys[full], counts[full], windows[full]
+        else:
+            keys, counts, windows = self.keys, self.counts, steps
+        starts = np.flatnonzero(np.r_[True, windows[1:] != windows[:-1]])
+        cumulative = np.cumsum(counts)
+        before = cumulative[starts] - counts[starts]
+        totals = np.add.reduceat(counts, starts)
+        values = {}
+        for q in quantiles:
+            ranks = np.maximum(np.ceil(q * totals), 1).astype(np.int64)
+            indexes = np.searchsorted(cumulative, before + ranks, side='left')
+            _, highest = self.buckets.bucket_ranges(keys[indexes] % KEY_STRIDE)
+            values[q] = highest
+        return windows[starts] * self.step_seconds, values
+
+
+def mser_truncation(values, weights=None, batch=MSER_BATCH_SECONDS, min_batches=MSER_MIN_BATCHES):
+    # number of leading values to drop as warm-up (a multiple of batch), 0 when
+    # the series is too short. NaN values (seconds without requests) are skipped
+    values = np.asarray(values, dtype=np.float64)
+    weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=np.float64)
+    valid = ~np.isnan(values)
+    batches = len(values) // batch
+    if batches < min_batches:
+        return 0
+    # weighted batch means, a batch of only NaN values is left out
+    weighted = np.where(valid, values * weights, 0.0)[:batches * batch].reshape(batches, batch).sum(axis=1)
+    total_weight = np.where(valid, weights, 0.0)[:batches * batch].reshape(batches, batch).sum(axis=1)
+    present = np.flatnonzero(total_weight > 0)
+    if len(present) < min_batches:
+        return 0
+    means = weighted[present] / total_weight[present]
+    # shifting does not change the variance, it keeps the sums below small
+    means = means - means.mean()
+    n = len(means)
+    # sums over means[d:] for every d, from reversed cumulative sums
+    tail_sum = np.cumsum(means[::-1])[::-1]
+    tail_squares = np.cumsum((means * means)[::-1])[::-1]
+    remaining = n - np.arange(n)
+    mser = (tail_squares - tail_sum * tail_sum / remaining) / (remaining * remaining)
+    d = int(np.argmin(mser[:n // 2 + 1]))
+    return int(present[d]) * batch
+
+
+def warmup_seconds(counts, sums, columns=None):
+    # seconds from the first request until every duration column reached steady state.
+    # columns: the duration columns of sums (all of them when None), other metrics such
+    # as response sizes may drift without the run warming up
+    columns = sums.keys() if columns is None else columns
+    return max((mser_truncation(np.where(counts > 0, sums[column] / np.maximum(counts, 1), np.nan), counts) for column in columns), default=0)
+
+
+def rolling_percentiles(windowed, first_second):
+    # chart data of WindowedPercentiles: window centers in seconds since the first
+    # request and one list per percentile
+    window_starts, values = windowed.percentiles(ROLLING_PERCENTILES)
+    return {
+        'window_seconds': windowed.window_seconds,
+        'x': (window_starts - first_second + windowed.window_seconds / 2).tolist(),
+        'percentiles': {percentile_label(q): values[q].tolist() for q in ROLLING_PERCENTILES},
+    }
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+from aggregates import StreamingAggregator, compute_aggregates, LATENCY_COLUMNS, PERCENTILES, NS_PER_SECOND
+
+START = 1700000000 * NS_PER_SECOND
+
+
+def run(rows=20000, seed=0):
+    # sorted start times over ~100 seconds with two seconds without requests, and
+    # latencies with many ties, like microsecond durations recorded in nanoseconds
+    rng = np.random.default_rng(seed)
+    start_times = np.sort(START + rng.integers(0, 100 * NS_PER_SECOND, rows))
+    gap = (start_times >= START + 40 * NS_PER_SECOND) & (start_times < START + 42 * NS_PER_SECOND)
+    start_times = start_times[~gap]
+    columns = {column: (rng.lognormal(7, 0.5, len(start_times)).astype(np.int64) * 1000) for column in LATENCY_COLUMNS}
+    return start_times, columns
+
+
+def reference(start_times, columns):
+    # the pandas code the aggregates replaced: describe() of every column and
+    # resample('1s') of the rows indexed by their start time
+    df = pd.DataFrame(columns, index=pd.to_datetime(start_times, unit='ns'))
+    resampled = df.resample('1s')
+    return {
+        'description': {column: df[column].describe(percentiles=PERCENTILES).to_dict() for column in columns},
+        'requests_per_second': resampled.size().to_numpy(),
+        'mean_per_second': {column: resampled[column].mean().to_numpy() for column in columns},
+    }
+
+
+def assert_matches(aggregates, expected):
+    np.testing.assert_array_equal(aggregates['requests_per_second'], expected['requests_per_second'])
+    for column, means in expected['mean_per_second'].items():
+        np.testing.assert_allclose(aggregates['mean_per_second'][column], means, rtol=1e-12)
+    for column, description in expected['description'].items():
+        assert aggregates['description'][column].keys() == description.keys()
+        for statistic, value in description.items():
+            # percentiles, count, min and max are exact, mean and std up to float64 rounding
+            expected_value = pytest.approx(value, rel=1e-12) if statistic in ('mean', 'std') else value
+            assert aggregates['description'][column][statistic] == expected_value, (column, statistic)
+
+
+def test_single_pass_matches_pandas():
+    start_times, columns = run()
+    assert_matches(compute_aggregates(start_times, columns), reference(start_times, columns))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 997, 100000])
+def test_chunks_match_pandas(chunk_size):
+    start_times, columns = run(5000 if chunk_size == 1 else 20000, seed=chunk_size)
+    aggregator = StreamingAggregator(LATENCY_COLUMNS)
+    for start in range(0, len(start_times), chunk_size):
+        aggregator.update(start_times[start:start + chunk_size], {column: data[start:start + chunk_size] for column, data in columns.items()})
+    assert_matches(aggregator.result(), reference(start_times, columns))
+
+
+def test_unsorted_chunks_match_pandas():
+    # parts of distributed runs overlap in time, their chunks come one part after the other
+    start_times, columns = run(seed=3)
+    order = np.random.default_rng(3).permutation(len(start_times))
+    aggregator = StreamingAggregator(LATENCY_COLUMNS)
+    for rows in np.array_split(order, 7):
+        aggregator.update(start_times[rows], {column: data[rows] for column, data in columns.items()})
+    assert_matches(aggregator.result(), reference(start_times, columns))
@@ -0,0 +1,85 @@
+import json
+import os
+import numpy as np
+import analyzer
+from analyzer import Analyzer
+from cache import AnalysisCache, prune
+from rawdata import RawDataFile, RawDataWriter
+from selfbench import generate_run, SYNTHETIC_START_TIME
+
+
+def write_run(rows, blocks):
+    # data/grow/ from the self-benchmark's run: slower first seconds (a warm-up),
+    # two stages and the rows split in blocks; returns the bytes of data.bin
+    generate_run('base', rows, seed=1)
+    with open('data/base/benchmark.json') as f:
+        meta = json.load(f)
+    columns = {name: np.array(values) for name, values in RawDataFile('data/base/data.bin').block(0).items()}
+    seconds = (int(columns['StartTime'][-1]) - SYNTHETIC_START_TIME) / 1e9 + 1
+    warmup = columns['StartTime'] < SYNTHETIC_START_TIME + seconds * 0.2 * 1e9
+    for name in ('QueryDuration', 'RequestDuration'):
+        columns[name][warmup] *= 3
+    meta['stages'] = [{'name': 'low', 'duration': seconds / 2, 'concurrent_requests': 5}, {'name': 'high', 'duration': seconds / 2, 'concurrent_requests': 10}]
+    os.makedirs('data/grow')
+    with open('data/grow/benchmark.json', 'w') as f:
+        json.dump(meta, f)
+    with RawDataWriter('data/grow/data.bin', list(columns)) as writer:
+        for start in range(0, rows, rows // blocks):
+            writer.write_block({name: values[start:start + rows // blocks] for name, values in columns.items()})
+    with open('data/grow/data.bin', 'rb') as f:
+        return f.read()
+
+
+def load(cached):
+    run = Analyzer('grow')
+    run.load_data(streaming=True, use_cache=cached)
+    return run.aggregates
+
+
+def test_appended_rows_resume_every_summary(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data = write_run(100000, 10)
+    end = RawDataFile('data/grow/data.bin').blocks[9][0]
+    with open('data/grow/data.bin', 'wb') as f:
+        f.write(data[:end])
+    load(True)
+    with open('data/grow/data.bin', 'ab') as f:
+        f.write(data[end:])
+    # the same warm-up: nothing is read again from the start
+    passes = []
+    iter_raw_chunks = analyzer.Analyzer.iter_raw_chunks
+    monkeypatch.setattr(analyzer.Analyzer, 'iter_raw_chunks', lambda self, *args: passes.append(1) or iter_raw_chunks(self, *args))
+    resumed = load(True)
+    assert passes == []
+    monkeypatch.setattr(analyzer.Analyzer, 'iter_raw_chunks', iter_raw_chunks)
+    full = load(False)
+    assert resumed['warmup_seconds'] == full['warmup_seconds'] > 0
+    assert resumed['steady_description'] == full['steady_description']
+    assert resumed['stages'] == full['stages']
+    assert resumed['description'] == full['description']
+
+
+def test_rewritten_raw_data_is_analyzed_again(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data = write_run(20000, 4)
+    first = load(True)
+    # a new run: the same first rows, later ones changed and more of them
+    with open('data/grow/data.bin', 'r+b') as f:
+        f.seek(len(data) - 8)
+        f.write(np.int64(1).tobytes())
+        f.seek(len(data))
+        f.write(data[RawDataFile('data/grow/data.bin').blocks[3][0]:])
+    cached, full = load(True), load(False)
+    assert cached['description'] == full['description'] != first['description']
+
+
+def test_put_prunes_only_its_own_test(tmp_path):
+    other, own = AnalysisCache(str(tmp_path) + '/other/', 10000), AnalysisCache(str(tmp_path) + '/own/', 1000)
+    other.put('a', b'x' * 2000)
+    own.put('b', b'x' * 600)
+    own.put('c', b'x' * 600)
+    # the least recently used entry went, pruned files are read as misses
+    assert own.get('b') is None and own.get('c') is not None
+    assert other.get('a') is not None
+    assert prune(str(tmp_path), 1000) < 1000
+    assert other.get('a') is None
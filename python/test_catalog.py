@@ -0,0 +1,106 @@
+import json
+import os
+import sqlite3
+import catalog
+from catalog import CATALOG_PATH, SCHEMA_VERSION, connect, index_runs, latest_runs, top_regressions, trend
+
+START_TIME = 1700000000 * 1000000000
+
+
+def write_run(test_name, run, p99, report=True):
+    # data/<test_name>/ holding its run-th run, its report written when report is set
+    os.makedirs('data/' + test_name, exist_ok=True)
+    meta = {
+        'test_unique_name': test_name,
+        'test_display_name': test_name.title(),
+        'test_start_time': START_TIME + run * 3600 * 1000000000,
+        'test_mode': 'concurrent',
+        'test_duration': 60,
+        'total_requests': 1000,
+        'successful_requests': 1000,
+        'failed_requests': 0,
+        'requests_per_second': 100.0 + run,
+        'metric_stats': {'RequestDuration': {'avg': p99 / 2, 'p99': p99}, 'ResponseBytes': {'p99': 512}},
+        'raw_data_schema': {'metrics': [{'name': 'RequestDuration', 'unit': 'ns'}, {'name': 'ResponseBytes', 'unit': 'bytes'}]},
+    }
+    with open('data/' + test_name + '/benchmark.json', 'w') as f:
+        json.dump(meta, f)
+    if report:
+        with open('data/' + test_name + '/report.html', 'w') as f:
+            f.write('<html></html>')
+
+
+def run_ids():
+    return [row['run_id'] for row in catalog.query('SELECT run_id FROM runs ORDER BY run_id')]
+
+
+def test_existing_runs_added_on_first_open(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_run('search', 0, 2000000)
+    write_run('login', 0, 1000000)
+    # no report: the run did not finish
+    write_run('running', 0, 1000000, report=False)
+    # older runs only have the legacy statistics
+    with open('data/login/benchmark.json') as f:
+        meta = json.load(f)
+    del meta['metric_stats'], meta['raw_data_schema']
+    meta['request_duration_stats'] = {'p99': 1500000}
+    with open('data/login/benchmark.json', 'w') as f:
+        json.dump(meta, f)
+    os.makedirs('data/broken')
+    with open('data/broken/benchmark.json', 'w') as f:
+        json.dump({'test_unique_name': 'broken'}, f)
+    with open('data/broken/report.html', 'w') as f:
+        f.write('')
+    assert run_ids() == ['login-' + str(START_TIME), 'search-' + str(START_TIME)]
+    assert trend('login') == [{'run_id': 'login-' + str(START_TIME), 'start_time': START_TIME, 'value': 1500000, 'unit': 'ns'}]
+    # the runs are only added once, later ones by index_runs
+    write_run('checkout', 0, 1000000)
+    assert len(run_ids()) == 2
+
+
+def test_older_catalog_is_initialized(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_run('search', 1, 2000000)
+    # a catalog file from before user_version was set, with a run of its own
+    os.makedirs('data', exist_ok=True)
+    connection = sqlite3.connect(CATALOG_PATH)
+    connection.executescript(catalog.SCHEMA)
+    connection.execute("INSERT INTO runs (run_id, test_name, start_time, requests_per_second) VALUES ('search-1', 'search', 1, 50)")
+    connection.commit()
+    connection.close()
+    connection = connect()
+    assert connection.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+    connection.close()
+    assert run_ids() == ['search-1', 'search-' + str(START_TIME + 3600 * 1000000000)]
+
+
+def test_latest_runs_and_trends(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data')
+    p99s = [1000000, 1100000, 900000, 1000000, 1000000, 1500000]
+    for run, p99 in enumerate(p99s):
+        write_run('search', run, p99)
+        index_runs(['search'])
+    write_run('login', 0, 500000)
+    index_runs(['login'])
+    # indexing the same run again replaces it
+    index_runs(['login'])
+
+    latest = latest_runs()
+    assert [(row['test_name'], row['runs'], row['start_time']) for row in latest] == [
+        ('login', 1, START_TIME), ('search', 6, START_TIME + 5 * 3600 * 1000000000)]
+    assert latest[1]['requests_per_second'] == 105
+
+    # oldest first, the last limit runs
+    series = trend('search', limit=4)
+    assert [point['value'] for point in series] == p99s[2:]
+    assert [point['start_time'] for point in series] == sorted(point['start_time'] for point in series)
+    assert {point['unit'] for point in trend('search', 'ResponseBytes')} == {'bytes'}
+    assert [point['value'] for point in trend('search', 'RequestsPerSecond', 'mean')] == [100, 101, 102, 103, 104, 105]
+    assert trend('search', 'Missing') == []
+
+    # the last run of search is 50% slower than the 5 before it, login has one run
+    regressions = top_regressions()
+    assert [(regression['test_name'], regression['baseline_runs']) for regression in regressions] == [('search', 5)]
+    assert abs(regressions[0]['change'] - 0.5) < 1e-9
@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+from downsample import downsample, downsample_chart_data, max_points, minmax_indexes
+
+
+def spiky_series(n, seed=7):
+    rng = np.random.default_rng(seed)
+    y = rng.lognormal(0, 0.3, n)
+    spikes = rng.choice(n, 20, replace=False)
+    y[spikes] *= 50
+    y[rng.choice(n, 20, replace=False)] = 0
+    return y
+
+
+def interior_buckets(n, limit):
+    # the buckets minmax_indexes splits the points between the first and the last in
+    buckets = (limit - 2) // 2
+    edges = np.linspace(0, n - 2, buckets + 1).astype(np.int64) + 1
+    return zip(edges[:-1], edges[1:])
+
+
+@pytest.mark.parametrize('n,limit', [(10000, 100), (12345, 2000), (5001, 37)])
+def test_minmax_keeps_extremes_of_every_bucket(n, limit):
+    y = spiky_series(n)
+    kept = set(minmax_indexes(y, limit).tolist())
+    assert {0, n - 1} <= kept
+    for start, end in interior_buckets(n, limit):
+        values = y[start:end]
+        kept_values = [y[i] for i in kept if start <= i < end]
+        assert min(kept_values) == values.min()
+        assert max(kept_values) == values.max()
+    # so the extremes of the whole series are always kept
+    assert y[sorted(kept)].max() == y.max() and y[sorted(kept)].min() == y.min()
+
+
+def test_series_that_fit_are_kept_whole():
+    y = spiky_series(100)
+    assert minmax_indexes(y, 100).tolist() == list(range(100))
+    x = list(range(100))
+    assert downsample(x, y.tolist(), 100) == (x, y.tolist())
+
+
+def test_nan_gaps_survive():
+    n, limit = 10000, 100
+    y = spiky_series(n)
+    # seconds without requests, wider than a bucket, and a single missing second
+    y[3000:4000] = np.nan
+    y[7777] = np.nan
+    x, downsampled = downsample(list(range(n)), y.tolist(), limit)
+    downsampled = np.asarray(downsampled)
+    gap = (np.asarray(x) >= 3000) & (np.asarray(x) < 4000)
+    assert gap.any() and np.isnan(downsampled[gap]).all()
+    # buckets with some requests report their real extremes, not NaN
+    for start, end in interior_buckets(n, limit):
+        values = y[start:end]
+        if np.isnan(values).all():
+            continue
+        inside = (np.asarray(x) >= start) & (np.asarray(x) < end)
+        assert np.nanmax(downsampled[inside]) == np.nanmax(values)
+        assert np.nanmin(downsampled[inside]) == np.nanmin(values)
+
+
+def test_report_max_points_caps_every_series(monkeypatch):
+    monkeypatch.setenv('REPORT_MAX_POINTS', '50')
+    limit = max_points()
+    assert limit == 50
+    n = 5000
+    y = spiky_series(n).tolist()
+    chart_data = {
+        'average_data_per_second_chart_data': {'x': list(range(n)), 'y': list(y)},
+        'rolling_percentiles_chart_data': {'lines': [{'x': list(range(n)), 'y': list(y)}]},
+        'extra_lines': [{'x': list(range(n)), 'y': list(y)}],
+    }
+    full_resolution = downsample_chart_data(chart_data, limit)
+    assert full_resolution == {'x': list(range(n)), 'y': y}
+    series = chart_data['average_data_per_second_chart_data']
+    assert len(series['x']) == len(series['y']) <= limit
+    assert series['full_resolution_points'] == n
+    assert len(chart_data['rolling_percentiles_chart_data']['lines'][0]['y']) <= limit
+    assert len(chart_data['extra_lines'][0]['y']) <= limit
+    # nothing to do for charts that already fit
+    assert downsample_chart_data({'average_data_per_second_chart_data': {'x': [0, 1], 'y': [1.0, 2.0]}}, limit) is None
+
+
+def test_report_statistics_come_from_full_resolution(tmp_path, monkeypatch):
+    from analyzer import Analyzer
+    from rawdata import RawDataFile
+    from selfbench import generate_run
+    monkeypatch.chdir(tmp_path)
+    generate_run('downsampled', 20000, seed=3)
+    analyzer = Analyzer('downsampled')
+    analyzer.max_points = 20
+    analyzer.load_data(use_cache=False)
+    analyzer.analyze_latency('QueryDuration', 'Query Duration')
+    graph = analyzer.graphs[-1]
+    analyzed = graph['analyzed_data']
+
+    columns = RawDataFile('data/downsampled/data.bin').read_columns()
+    ok = columns['ErrorClass'] == 0
+    query, starts = columns['QueryDuration'][ok], columns['StartTime'][ok]
+    # percentiles of every successful request after the warm-up, and of the whole run, in milliseconds
+    first_second = starts.min() // 1000000000
+    steady = starts >= (first_second + analyzer.aggregates['warmup_seconds']) * 1000000000
+    expected = np.percentile(query[steady], [25, 50, 75, 90, 95, 99]).astype(np.int64) / 1e6
+    assert analyzed['data_description_chart_data']['y'] == pytest.approx(expected.tolist(), rel=1e-12)
+    whole_run = np.percentile(query, [25, 50, 75, 90, 95, 99]) / 1e6
+    assert analyzed['steady_state']['full_run_chart_data']['y'] == pytest.approx(whole_run.tolist(), rel=1e-12)
+
+    # the drawn series is downsampled, the saved one is the full per-second mean
+    seconds = starts // 1000000000 - first_second
+    means = np.bincount(seconds, weights=query) / np.bincount(seconds) / 1e6
+    full = graph['full_resolution']
+    assert len(full['y']) == len(means) > analyzer.max_points
+    assert full['y'] == pytest.approx(means.tolist(), rel=1e-9)
+    series = analyzed['average_data_per_second_chart_data']
+    assert len(series['y']) <= analyzer.max_points
+    assert max(series['y']) == max(full['y']) and min(series['y']) == min(full['y'])
+
+    # rolling lines are computed from every request, then only their points are dropped
+    rolling = analyzer.aggregates['rolling']['QueryDuration']
+    for line, values in zip(analyzed['rolling_percentiles_chart_data']['lines'], rolling['percentiles'].values()):
+        assert len(line['y']) <= analyzer.max_points
+        full_line = dict(zip(rolling['x'], (np.asarray(values) / 1e6).tolist()))
+        for x, y in zip(line['x'], line['y']):
+            assert y == pytest.approx(full_line[x], nan_ok=True)
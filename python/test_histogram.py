@@ -0,0 +1,97 @@
+import json
+import math
+import os
+import numpy as np
+import pytest
+from histogram import LatencyHistogram, merge_histograms
+
+# bucket indexes shared with internal/models/histogram_test.go, so both sides bucket alike
+BUCKETS_FIXTURE = os.path.join(os.path.dirname(__file__), '..', 'internal', 'models', 'testdata', 'histogram_buckets.json')
+QUANTILES = [0, 0.001, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 0.999, 1]
+DIGITS = [1, 2, 3, 4]
+
+
+def samples(name, n=50000):
+    rng = np.random.default_rng(42)
+    if name == 'lognormal':
+        return rng.lognormal(np.log(2e6), 1.0, n).astype(np.int64)
+    # heavy tail, a few values many orders of magnitude above the median
+    return (1e5 * (1 + rng.pareto(1.2, n))).astype(np.int64)
+
+
+def exact_quantile(values, q):
+    # lower nearest rank, as documented in histogram.py
+    ordered = np.sort(values)
+    rank = max(math.ceil(q * len(ordered)), 1)
+    return int(ordered[rank - 1])
+
+
+def reference_index(value, sub_bucket_bits):
+    # bucket index from the definition, with exact integer bit lengths
+    half = 1 << (sub_bucket_bits - 1)
+    magnitude = max(value.bit_length() - sub_bucket_bits, 0)
+    return magnitude * half + (value >> magnitude)
+
+
+@pytest.mark.parametrize('distribution', ['lognormal', 'pareto'])
+@pytest.mark.parametrize('digits', DIGITS)
+def test_quantiles_within_documented_bound(distribution, digits):
+    values = samples(distribution)
+    histogram = LatencyHistogram(digits)
+    histogram.record_array(values)
+    bound = 2.0 ** -(histogram.sub_bucket_bits - 1)
+    assert bound < 10 ** -digits
+    for q in QUANTILES:
+        exact = exact_quantile(values, q)
+        reported = histogram.value_at_quantile(q)
+        # never below the exact quantile, at most bound above it
+        assert exact <= reported
+        assert reported - exact <= bound * exact
+
+
+@pytest.mark.parametrize('digits', DIGITS)
+def test_merge_of_split_histograms_equals_whole(digits):
+    values = np.concatenate([samples('lognormal'), samples('pareto')])
+    whole = LatencyHistogram(digits)
+    whole.record_array(values)
+    parts = []
+    for part in np.array_split(values, 7):
+        histogram = LatencyHistogram(digits)
+        histogram.record_array(part)
+        parts.append(histogram)
+    merged = merge_histograms(parts)
+    length = max(len(whole.counts), len(merged.counts))
+    assert np.array_equal(np.pad(whole.counts, (0, length - len(whole.counts))), np.pad(merged.counts, (0, length - len(merged.counts))))
+    assert (merged.total_count, merged.min, merged.max) == (whole.total_count, whole.min, whole.max)
+    assert merged.mean == pytest.approx(whole.mean, rel=1e-12)
+    assert merged.std == pytest.approx(whole.std, rel=1e-9)
+    assert merged.values_at_quantiles(QUANTILES) == whole.values_at_quantiles(QUANTILES)
+
+
+def test_merge_rejects_other_precision():
+    with pytest.raises(ValueError):
+        LatencyHistogram(2).merge(LatencyHistogram(3))
+
+
+def test_bucket_indexes_match_fixture():
+    with open(BUCKETS_FIXTURE) as f:
+        fixture = json.load(f)
+    values = fixture['values']
+    for case in fixture['cases']:
+        histogram = LatencyHistogram(case['significant_digits'])
+        assert histogram.sub_bucket_bits == case['sub_bucket_bits']
+        assert histogram.bucket_indexes(values).tolist() == case['indexes']
+        assert case['indexes'] == [reference_index(value, case['sub_bucket_bits']) for value in values]
+        # every value is inside the range of its bucket
+        low, high = histogram.bucket_ranges(case['indexes'])
+        assert all(l <= v <= h for l, v, h in zip(low.tolist(), values, high.tolist()))
+
+
+def test_saved_histogram_round_trips(tmp_path):
+    histogram = LatencyHistogram(3)
+    histogram.record_array(samples('pareto'))
+    histogram.save(str(tmp_path) + '/', 'QueryDuration')
+    with open(tmp_path / 'QueryDuration.histogram.json') as f:
+        loaded = LatencyHistogram.from_dict(json.load(f))
+    assert np.array_equal(loaded.counts, histogram.counts)
+    assert loaded.describe() == histogram.describe()
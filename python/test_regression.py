@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from regression import bootstrap, compare_runs, compare_samples, run_verdict, CONFIDENCE, RESAMPLES, THRESHOLD
+
+
+def latencies(n, seed, scale=1.0):
+    # ~2ms with a heavy tail, like selfbench.py's synthetic runs
+    rng = np.random.default_rng(seed)
+    values = rng.lognormal(np.log(2e6), 0.4, n)
+    tail = rng.random(n) < 0.01
+    values[tail] += 1e7 * rng.pareto(2.5, tail.sum())
+    return (values * scale).astype(np.int64).astype(np.float64)
+
+
+def verdicts(base, candidate, higher_is_better=False):
+    rng = np.random.default_rng(0)
+    result = compare_samples(base, bootstrap(base, RESAMPLES, rng), candidate, bootstrap(candidate, RESAMPLES, rng), CONFIDENCE, THRESHOLD, higher_is_better)
+    return {statistic: values['verdict'] for statistic, values in result['statistics'].items()}, result
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_shift_of_the_threshold_regresses(seed):
+    # a shift of exactly the threshold: point estimates fall on both sides of it,
+    # each interval misses it 2.5% of the time
+    statistics, result = verdicts(latencies(100000, seed), latencies(100000, seed + 100, 1 + THRESHOLD))
+    assert result['significant']
+    assert run_verdict({'QueryDuration': result}) == 'regressed'
+    assert list(statistics.values()).count('regressed') >= 3
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_same_distribution_is_unchanged(seed):
+    statistics, _ = verdicts(latencies(100000, seed), latencies(100000, seed + 100))
+    assert set(statistics.values()) == {'unchanged'}
+
+
+def test_change_shown_below_threshold_is_unchanged():
+    # clearly slower, by less than the threshold
+    statistics, result = verdicts(latencies(200000, 1), latencies(200000, 2, 1.02))
+    assert result['significant']
+    low, high = result['statistics']['50%']['confidence_interval']
+    assert 0 < low and high < THRESHOLD
+    assert statistics['50%'] == 'unchanged'
+
+
+def test_faster_run_improves_and_higher_is_better():
+    statistics, _ = verdicts(latencies(100000, 1), latencies(100000, 2, 0.9))
+    assert statistics['mean'] == statistics['50%'] == 'improved'
+    # fewer requests per second is worse
+    statistics, _ = verdicts(latencies(100000, 1), latencies(100000, 2, 0.9), higher_is_better=True)
+    assert statistics['mean'] == 'regressed'
+
+
+def test_intervals_without_significant_distribution_difference_are_unchanged():
+    # the same values in a different order: identical distributions, whatever the intervals say
+    base = latencies(50000, 3)
+    _, result = verdicts(base, np.random.default_rng(4).permutation(base))
+    assert not result['significant']
+    assert set(values['verdict'] for values in result['statistics'].values()) == {'unchanged'}
+
+
+def test_gate_catches_selfbench_candidate(tmp_path, monkeypatch):
+    # the self-benchmark's candidate run, CANDIDATE_SLOWDOWN slower, against its baseline
+    from selfbench import generate_run, CANDIDATE_SLOWDOWN
+    assert CANDIDATE_SLOWDOWN - 1 >= THRESHOLD
+    monkeypatch.chdir(tmp_path)
+    generate_run('base', 100000, seed=100000)
+    generate_run('slower', 100000, seed=100001, slowdown=CANDIDATE_SLOWDOWN)
+    generate_run('same', 100000, seed=100002)
+    verdict = compare_runs(['base', 'slower', 'same'])
+    assert verdict['verdict'] == 'regressed'
+    slower, same = verdict['runs']
+    assert slower['verdict'] == 'regressed'
+    assert slower['metrics']['QueryDuration']['significant']
+    assert same['verdict'] == 'unchanged'
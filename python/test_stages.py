@@ -0,0 +1,98 @@
+import json
+import os
+import numpy as np
+import pytest
+from analyzer import Analyzer, STAGES_ANALYSIS
+from rawdata import RawDataWriter
+from selfbench import generate_run, SYNTHETIC_COLUMNS, SYNTHETIC_START_TIME
+from stages import find_knee
+
+STAGE_SECONDS = 10
+
+
+def described(level, requests_per_second, p99, error_rate=0.0):
+    return {'name': 'stage ' + str(level), 'level': level, 'mean_level': level, 'ramp': False, 'seconds': 8,
+            'successful_requests': 100, 'failed_requests': int(error_rate * 100), 'requests_per_second': requests_per_second,
+            'error_rate': error_rate, 'mean': p99 / 2, 'p50': p99 / 2, 'p99': p99}
+
+
+def test_knee_where_throughput_flattens():
+    stages = [described(1, 100, 10), described(2, 200, 10.5), described(4, 250, 16), described(8, 255, 32)]
+    assert find_knee(stages) == {'stage': 1, 'saturated': True, 'saturation_stage': 2, 'requests_per_second': 200}
+
+
+def test_knee_in_order_of_load():
+    # stages run from the highest load down
+    stages = [described(8, 255, 32), described(4, 250, 16), described(2, 200, 10.5), described(1, 100, 10)]
+    assert find_knee(stages) == {'stage': 2, 'saturated': True, 'saturation_stage': 1, 'requests_per_second': 200}
+
+
+def test_knee_from_latency_or_errors_alone():
+    # open loop: the throughput follows the load, requests queue
+    assert find_knee([described(100, 100, 10), described(200, 200, 12), described(300, 300, 30)])['saturation_stage'] == 2
+    assert find_knee([described(100, 100, 10), described(200, 200, 10, error_rate=0.05)])['saturation_stage'] == 1
+    assert find_knee([described(100, 100, 10, error_rate=0.05), described(200, 200, 10)])['stage'] is None
+
+
+def test_no_knee():
+    knee = find_knee([described(1, 100, 10), described(2, 200, 10), described(4, 390, 11)])
+    assert knee == {'stage': 2, 'saturated': False, 'saturation_stage': None, 'requests_per_second': 390}
+    assert find_knee([described(1, 100, 10), described(1, 100, 10)]) is None
+
+
+def write_staged_run(levels, capacity):
+    # a closed-loop run against a server of 10ms requests that serves at most capacity
+    # requests per second: past it, the throughput stays at capacity and every worker
+    # waits longer (level / capacity seconds per request)
+    generate_run('base', 1000)
+    with open('data/base/benchmark.json') as f:
+        meta = json.load(f)
+    meta['test_unique_name'] = 'staged'
+    meta['stages'] = [{'name': 'stage ' + str(level), 'duration': STAGE_SECONDS, 'concurrent_requests': level} for level in levels]
+    blocks = []
+    for i, level in enumerate(levels):
+        requests_per_second = min(level * 100, capacity)
+        latency = int(level / requests_per_second * 1e9)
+        start = SYNTHETIC_START_TIME + i * STAGE_SECONDS * 10**9
+        start_times = start + (np.arange(STAGE_SECONDS * requests_per_second) * 1e9 / requests_per_second).astype(np.int64)
+        rng = np.random.default_rng(i)
+        durations = latency + rng.integers(-latency // 20, latency // 20, len(start_times))
+        block = {column: np.zeros(len(start_times), dtype=np.int64) for column in SYNTHETIC_COLUMNS}
+        block.update({'StartTime': start_times, 'EndTime': start_times + durations, 'IntendedStartTime': start_times,
+                      'QueryDuration': durations // 2, 'RequestDuration': durations, 'TimeToFirstByte': durations, 'StatusCode': np.full(len(start_times), 200)})
+        blocks.append(block)
+    rows = sum(len(block['StartTime']) for block in blocks)
+    meta.update({'total_requests': rows, 'successful_requests': rows, 'failed_requests': 0, 'test_duration': STAGE_SECONDS * len(levels)})
+    os.makedirs('data/staged')
+    with open('data/staged/benchmark.json', 'w') as f:
+        json.dump(meta, f)
+    with RawDataWriter('data/staged/data.bin', SYNTHETIC_COLUMNS) as writer:
+        for block in blocks:
+            writer.write_block(block)
+
+
+def analyze_stages():
+    run = Analyzer('staged')
+    run.load_data(streaming=True)
+    run.analyze_stages()
+    return run.graphs[-1]['analyzed_data']
+
+
+def test_analyze_stages_finds_knee(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_staged_run([1, 2, 4, 8, 16], 250)
+    analyzed = analyze_stages()
+    assert analyzed['name'] == STAGES_ANALYSIS
+    knee = analyzed['knee']
+    # 200 requests per second at 2 workers, 250 at 4 with 16ms requests
+    assert knee['saturated'] and knee['stage'] == 1 and knee['saturation_stage'] == 2
+    assert knee['requests_per_second'] == pytest.approx(200, rel=0.01)
+    assert [stage['requests_per_second'] for stage in analyzed['stages']] == pytest.approx([100, 200, 250, 250, 250], rel=0.01)
+
+
+def test_analyze_stages_below_capacity(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_staged_run([1, 2, 4], 1000)
+    knee = analyze_stages()['knee']
+    assert not knee['saturated'] and knee['stage'] == 2
+    assert knee['requests_per_second'] == pytest.approx(400, rel=0.01)
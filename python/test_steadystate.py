@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from aggregates import compute_aggregates, NS_PER_SECOND
+from steadystate import WindowedPercentiles, mser_truncation, rolling_percentiles, warmup_seconds
+
+START_SECOND = 1700000000
+
+
+def step(seconds, warmup, rng):
+    # per-second means three times higher during the first warmup seconds, with noise
+    return np.where(np.arange(seconds) < warmup, 3000.0, 1000.0) + rng.normal(0, 20, seconds)
+
+
+@pytest.mark.parametrize('warmup', [0, 15, 40])
+def test_mser_finds_warmup_step(warmup):
+    assert mser_truncation(step(120, warmup, np.random.default_rng(warmup))) == warmup
+
+
+def test_mser_skips_seconds_without_requests():
+    values = step(120, 20, np.random.default_rng(1))
+    weights = np.full(120, 50.0)
+    values[60:70] = np.nan
+    weights[60:70] = 0
+    assert mser_truncation(values, weights) == 20
+
+
+def test_mser_needs_enough_batches():
+    assert mser_truncation(step(49, 20, np.random.default_rng(2))) == 0
+
+
+def test_warmup_only_from_duration_columns():
+    rng = np.random.default_rng(3)
+    counts = np.full(120, 10)
+    # the response size grows steadily, the durations do not warm up
+    sums = {'RequestDuration': (step(120, 0, rng) * 10).astype(np.int64), 'ResponseBytes': (np.linspace(5000, 100, 120) * 10).astype(np.int64)}
+    assert warmup_seconds(counts, sums) > 0
+    assert warmup_seconds(counts, sums, ['RequestDuration']) == 0
+    assert warmup_seconds(counts, sums, []) == 0
+    sums['QueryDuration'] = (step(120, 25, rng) * 10).astype(np.int64)
+    assert warmup_seconds(counts, sums, ['RequestDuration', 'QueryDuration']) == 25
+
+
+def test_compute_aggregates_warmup_columns():
+    rng = np.random.default_rng(4)
+    start_times = START_SECOND * NS_PER_SECOND + np.sort(rng.integers(0, 100 * NS_PER_SECOND, 20000))
+    seconds = (start_times // NS_PER_SECOND - START_SECOND).astype(np.float64)
+    columns = {
+        'RequestDuration': rng.integers(900000, 1100000, len(start_times)),
+        'ResponseBytes': (100000 - seconds * 900).astype(np.int64),
+    }
+    assert compute_aggregates(start_times, columns)['warmup_seconds'] > 0
+    aggregates = compute_aggregates(start_times, columns, warmup_columns=['RequestDuration'])
+    assert aggregates['warmup_seconds'] == 0
+    assert aggregates['steady_description'] == aggregates['description']
+
+
+def windowed_run(seed):
+    # 30 seconds, the latencies of every second drawn around a level of their own
+    rng = np.random.default_rng(seed)
+    seconds = np.repeat(np.arange(30), 200)
+    start_times = (START_SECOND + seconds) * NS_PER_SECOND + rng.integers(0, NS_PER_SECOND, len(seconds))
+    values = (rng.lognormal(7, 0.8, len(seconds)) * (1 + seconds)).astype(np.int64) * 1000
+    return start_times, values
+
+
+def test_window_percentiles_bound_the_exact_ones():
+    start_times, values = windowed_run(5)
+    windowed = WindowedPercentiles(window_seconds=10)
+    # chunks in any order
+    order = np.random.default_rng(5).permutation(len(values))
+    for rows in np.array_split(order, 4):
+        windowed.update(start_times[rows], values[rows])
+    quantiles = [.5, .95, .99, 1]
+    starts, percentiles = windowed.percentiles(quantiles)
+    # 10 second windows every 5 seconds, the half empty one at the end left out
+    np.testing.assert_array_equal(starts, START_SECOND + np.arange(0, 25, 5))
+    for i, start in enumerate(starts):
+        in_window = (start_times >= start * NS_PER_SECOND) & (start_times < (start + 10) * NS_PER_SECOND)
+        for q in quantiles:
+            exact = np.percentile(values[in_window], q * 100, method='inverted_cdf')
+            # the highest value of the bucket holding the exact percentile
+            assert exact <= percentiles[q][i] <= exact * 1.01, (start, q)
+
+
+def test_rolling_percentiles_centers_windows():
+    start_times, values = windowed_run(6)
+    windowed = WindowedPercentiles()
+    windowed.update(start_times, values)
+    chart = rolling_percentiles(windowed, START_SECOND)
+    assert chart['window_seconds'] == 10
+    assert chart['x'] == [5, 10, 15, 20, 25]
+    assert list(chart['percentiles']) == ['50%', '95%', '99%']
+    _, percentiles = windowed.percentiles([.99])
+    assert chart['percentiles']['99%'] == percentiles[.99].tolist()
+    # latencies grow with every second
+    assert chart['percentiles']['50%'] == sorted(chart['percentiles']['50%'])
@@ -0,0 +1,72 @@
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import worker
+from worker import Worker
+
+run_job = worker.run_job
+
+
+def sleeping_run_job(job, args, options):
+    # 'sleep' jobs take args[0] seconds, the others are the real ones
+    if job == 'sleep':
+        time.sleep(args[0])
+        return args[0], os.getpid()
+    return run_job(job, args, options)
+
+
+def serve(lines, workers=2):
+    out = io.StringIO()
+    Worker(out, workers).serve(lines)
+    return [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def test_pool_is_started_before_the_first_job():
+    pool = Worker(io.StringIO(), 2)
+    assert len(pool.executor._processes) == 2
+    pool.serve([])
+
+
+def test_replies_in_completion_order(monkeypatch):
+    monkeypatch.setattr(worker, 'run_job', sleeping_run_job)
+    replies = serve([
+        json.dumps({'id': 1, 'job': 'sleep', 'args': [1.0]}),
+        json.dumps({'id': 2, 'job': 'sleep', 'args': [0.1]}),
+        '',
+    ])
+    assert [reply['id'] for reply in replies] == [2, 1]
+    assert all(reply['error'] is None and reply['result'] != os.getpid() for reply in replies)
+    assert replies[1]['seconds'] == 1.0
+
+
+def test_error_replies(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir('data')
+    replies = serve([
+        'not json',
+        json.dumps({'id': 1, 'job': 'nope'}),
+        json.dumps({'id': 2}),
+        json.dumps({'id': 3, 'job': 'catalog', 'args': ['nope']}),
+        json.dumps({'id': 4, 'job': 'catalog', 'args': ['list']}),
+    ])
+    by_id = {reply['id']: reply for reply in replies}
+    assert len(replies) == 5
+    assert by_id[None]['error'] and by_id[None]['seconds'] == 0
+    assert by_id[1]['error'] == 'ValueError: Unknown job nope'
+    assert by_id[2]['error'] == "'job'"
+    assert by_id[3]['error'] == 'ValueError: Unknown catalog command nope'
+    assert by_id[4]['error'] is None and by_id[4]['result'] == []
+
+
+def test_ready_line_comes_first(tmp_path):
+    os.mkdir(tmp_path / 'data')
+    lines = json.dumps({'id': 7, 'job': 'catalog', 'args': ['list']}) + '\n'
+    process = subprocess.run([sys.executable, os.path.abspath(worker.__file__), '--workers', '1'], input=lines,
+                             capture_output=True, text=True, cwd=tmp_path, timeout=120)
+    assert process.returncode == 0, process.stderr
+    ready, reply = [json.loads(line) for line in process.stdout.splitlines()]
+    assert ready['ready'] is True and 'analyzer' in ready['import_seconds']
+    assert reply == {'id': 7, 'error': None, 'seconds': reply['seconds'], 'result': []}
@@ -0,0 +1,148 @@
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Long lived analysis worker used by the Go runner instead of starting a new
+# interpreter for every report (see internal/analysis/worker.go).
+#
+# Jobs are read from stdin as JSON lines and answered on stdout, one line each,
+# in completion order:
+#   {"id": 1, "job": "report", "args": ["simple_search"], "options": {"use_cache": true}}
+#   {"id": 2, "job": "compare", "args": ["simple_search", "concurrent_search"]}
+#   {"id": 3, "job": "live", "args": ["simple_search"]} (returns when the test is over)
+#   {"id": 4, "job": "catalog", "args": ["trend", "simple_search", "QueryDuration", "p99"]}
+#   -> {"id": 1, "error": null, "seconds": 0.42, "result": null}
+# result is what the job returned, the runs or series of catalog queries.
+# The first line written is {"ready": true, "import_seconds": {...}} once the
+# heavy modules are imported. Jobs run in a pool of processes forked after the
+# imports, so they start warm and independent tests are analyzed on separate
+# cores. Catalog jobs are small SQLite reads and writes, they run on threads of
+# the worker itself instead, so listing runs and trends never wait behind
+# reports or live analyses. Everything the jobs print goes to stderr.
+# usage: python3 worker.py [--workers N] | python3 worker.py --import-times
+
+# threads answering catalog jobs
+CATALOG_THREADS = 2
+# imported before the pool is forked, in this order, timed one by one
+PREWARM_MODULES = ['numpy', 'pandas', 'plotly.graph_objs', 'plotly.subplots', 'analyzer', 'generate_report', 'compare', 'live', 'catalog']
+
+
+def import_times(modules=PREWARM_MODULES):
+    # seconds spent importing each module on top of the ones before it
+    seconds = {}
+    for module in modules:
+        start = time.perf_counter()
+        __import__(module)
+        seconds[module] = round(time.perf_counter() - start, 4)
+    return seconds
+
+
+def prewarm_plotly():
+    # plotly loads its validators on the first figure, pay for it once here
+    import plotly.graph_objs as go
+    from plotly.subplots import make_subplots
+    start = time.perf_counter()
+    fig = make_subplots(rows=1, cols=2)
+    fig.add_trace(go.Scatter(x=[0], y=[0]), row=1, col=1)
+    fig.add_trace(go.Bar(x=[0], y=[0]), row=1, col=2)
+    fig.to_html(full_html=False, include_plotlyjs='cdn')
+    return round(time.perf_counter() - start, 4)
+
+
+def run_job(job, args, options):
+    start = time.perf_counter()
+    result = None
+    if job == 'report':
+        from generate_report import generate_report
+        generate_report(args[0], **options)
+    elif job == 'compare':
+        from compare import compare
+        compare(args)
+    elif job == 'live':
+        from live import follow
+        follow(args[0], **options)
+    elif job == 'catalog':
+        from catalog import command
+        result = command(args)
+    else:
+        raise ValueError("Unknown job " + str(job))
+    return time.perf_counter() - start, result
+
+
+class Worker:
+
+    def __init__(self, out, workers=None):
+        self.out = out
+        self.lock = threading.Lock()
+        workers = workers or os.cpu_count() or 1
+        # forked, so the pool processes share the modules imported before
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+        # the pool only forks on its first job: do it now, while this process has no
+        # other thread a child could inherit a held lock from
+        for future in [self.executor.submit(os.getpid) for _ in range(workers)]:
+            future.result()
+        # catalog jobs, next to the pool instead of in it
+        self.catalog = ThreadPoolExecutor(max_workers=CATALOG_THREADS)
+
+    def reply(self, message):
+        with self.lock:
+            self.out.write(json.dumps(message) + '\n')
+            self.out.flush()
+
+    def submit(self, line):
+        request = None
+        try:
+            request = json.loads(line)
+            job_id = request.get('id')
+            executor = self.catalog if request['job'] == 'catalog' else self.executor
+            future = executor.submit(run_job, request['job'], request.get('args', []), request.get('options', {}))
+        except Exception as e:
+            self.reply({'id': None if not isinstance(request, dict) else request.get('id'), 'error': str(e), 'seconds': 0})
+            return
+        future.add_done_callback(lambda future: self.done(job_id, future))
+
+    def done(self, job_id, future):
+        error = future.exception()
+        if error is None:
+            seconds, result = future.result()
+            self.reply({'id': job_id, 'error': None, 'seconds': seconds, 'result': result})
+        else:
+            self.reply({'id': job_id, 'error': type(error).__name__ + ': ' + str(error), 'seconds': 0})
+
+    def serve(self, lines):
+        for line in lines:
+            if line.strip():
+                self.submit(line)
+        # stdin closed: finish the running jobs, then exit
+        self.executor.shutdown(wait=True)
+        self.catalog.shutdown(wait=True)
+
+
+def main():
+    if '--import-times' in sys.argv[1:]:
+        seconds = import_times()
+        seconds['first figure'] = prewarm_plotly()
+        for module, value in seconds.items():
+            print(f"{module:>20}: {value:.3f}s")
+        print(f"{'total':>20}: {sum(seconds.values()):.3f}s")
+        return
+    workers = int(sys.argv[sys.argv.index('--workers') + 1]) if '--workers' in sys.argv[1:] else None
+    # keep stdout for the protocol, anything printed by the analysis goes to stderr
+    out = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    seconds = import_times()
+    seconds['first figure'] = prewarm_plotly()
+    # the caches of all tests are bounded here, before any job writes to them
+    from cache import prune
+    prune()
+    worker = Worker(out, workers)
+    worker.reply({'ready': True, 'import_seconds': seconds})
+    worker.serve(sys.stdin)
+
+
+if __name__ == "__main__":
+    main()